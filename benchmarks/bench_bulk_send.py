@@ -0,0 +1,67 @@
+"""
+Sends a batch of tenant reminders that each CC their landlord, as the reminder workers do, to a local SES
+stub: one raw email per reminder against send_bulk_tenant_summary_emails, which puts each reminder's CCs in
+its own bulk destination and sends up to 50 reminders per SendBulkTemplatedEmail call.
+
+Usage: python benchmarks/bench_bulk_send.py [reminders]
+"""
+import logging
+import os
+import sys
+import time
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'functions')))
+
+from ses_stub import SesStub
+
+CREDENTIALS = {"AWS_ACCESS_KEY_ID": "benchmark-key", "AWS_SECRET_ACCESS_KEY": "benchmark-secret"}
+SES_LATENCY_SECONDS = 0.02
+# A quota high enough that the rate limiter does not pace either mode
+SES_MAX_SEND_RATE = 10000
+
+
+def reminder(i):
+    return {
+        'tenant_consolidated_info': {
+            'tenant_info': {'tenant_id': f"tenant_{i}", 'name': f"Tenant {i}", 'email': f"tenant{i}@example.com"},
+            'due_rentals': [{'property_name': 'Unit 1', 'rent_amount': 1000, 'dueDate': '31/12/2025', 'company_id': f"company_{i % 10}"}],
+        },
+        'invoice_url': f"https://example.com/get_invoice?tenantId=tenant_{i}",
+        'cc_recipients': [f"landlord{i % 10}@example.com"],
+    }
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    os.environ['TESTING_MODE'] = 'false'
+    with patch('google.cloud.secretmanager.SecretManagerServiceClient'):
+        import services.email_service as email_service
+        from utils.template_renderer import template_env
+    patch.object(email_service, 'access_secret_version', side_effect=lambda secret_id: CREDENTIALS[secret_id]).start()
+    reminders = [reminder(i) for i in range(count)]
+    print(f"{count} reminders, each CC'ing its landlord, to an SES stub with {SES_LATENCY_SECONDS * 1000:.0f} ms latency")
+
+    results = {}
+    for name in ('raw per reminder', 'bulk templated'):
+        stub = SesStub(max_send_rate=SES_MAX_SEND_RATE, latency_seconds=SES_LATENCY_SECONDS)
+        os.environ['SES_ENDPOINT_URL'] = stub.url
+        ses_client = email_service.create_ses_client()
+        start = time.perf_counter()
+        if name == 'raw per reminder':
+            sent = [email_service.send_tenant_summary_email(r['tenant_consolidated_info'], template_env, invoice_url=r['invoice_url'],
+                                                           cc_recipients=r['cc_recipients'], ses_client=ses_client) for r in reminders]
+        else:
+            sent = email_service.send_bulk_tenant_summary_emails(reminders, template_env, ses_client)
+        results[name] = time.perf_counter() - start
+        send_calls = stub.calls.get('SendRawEmail', 0) + stub.calls.get('SendBulkTemplatedEmail', 0)
+        print(f"  {name:<17} {results[name] * 1000:8.1f} ms, {send_calls:4d} SES send calls, {sent.count(True)} sent")
+        stub.close()
+        email_service.clear_ses_clients()
+    print(f"  speedup: {results['raw per reminder'] / results['bulk templated']:.1f}x")
+    patch.stopall()
+
+
+if __name__ == '__main__':
+    main()
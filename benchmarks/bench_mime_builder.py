@@ -0,0 +1,62 @@
+"""
+Compares building a reminder email the way each send function used to (reading and encoding the logo
+from disk for every email, serializing with as_string) with the shared build_mime_message builder.
+
+Usage: python benchmarks/bench_mime_builder.py [emails]
+"""
+import logging
+import os
+import sys
+import timeit
+from email.mime.image import MIMEImage
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'functions')))
+
+LOGO_PATH = os.path.normpath(os.path.join(os.path.dirname(__file__), '..', 'functions', 'templates', 'assets', 'apple-touch-icon.png'))
+HTML_BODY = "<html><body>" + "<tr><td>Unit</td><td>ZMW 1000</td><td>31/12/2025</td></tr>" * 20 + "</body></html>"
+TEXT_BODY = "Hi Tenant,\n\n" + "- Property: Unit, Amount: ZMW 1000, Due Date: 31/12/2025\n" * 20
+
+
+def build_per_email(subject, sender_email, recipient_email, html_body, text_body, cc_recipients=None):
+    """The MIME construction each send function carried before the shared builder."""
+    msg = MIMEMultipart('mixed')
+    msg['Subject'] = subject
+    msg['From'] = sender_email
+    msg['To'] = recipient_email
+    if cc_recipients:
+        msg['Cc'] = ', '.join(cc_recipients)
+    msg_related = MIMEMultipart('related')
+    msg.attach(msg_related)
+    msg_alternative = MIMEMultipart('alternative')
+    msg_related.attach(msg_alternative)
+    msg_alternative.attach(MIMEText(text_body, 'plain'))
+    msg_alternative.attach(MIMEText(html_body, 'html'))
+    with open(LOGO_PATH, 'rb') as f:
+        logo_data = f.read()
+    logo = MIMEImage(logo_data, 'png')
+    logo.add_header('Content-ID', '<logo>')
+    msg_related.attach(logo)
+    return msg.as_string()
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    emails = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with patch('google.cloud.secretmanager.SecretManagerServiceClient'):
+        from services.email_service import build_mime_message
+    args = ("Reminder", "noreply@example.com", "tenant@example.com", HTML_BODY, TEXT_BODY, ["landlord@example.com"])
+    print(f"{emails} reminder emails, logo {os.path.getsize(LOGO_PATH)} bytes")
+
+    results = {}
+    for name, build in (('per-email build', build_per_email), ('shared builder', build_mime_message)):
+        best = min(timeit.repeat(lambda: build(*args), number=emails, repeat=5))
+        results[name] = best / emails
+        print(f"  {name:<16} {results[name] * 1e6:8.1f} us/email")
+    print(f"  speedup: {results['per-email build'] / results['shared builder']:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Compares the five per-bucket scans the scheduler used to run (vendored in legacy_notification_logic.py)
+with a single classify_payments pass.
+
+Usage: python benchmarks/bench_notification_logic.py [num_companies] [payments_per_company]
+"""
+import logging
+import os
+import sys
+import timeit
+from datetime import date
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'functions')))
+
+from logic.notification_logic import classify_payments
+from legacy_notification_logic import (
+    get_due_rentals_by_tenant,
+    get_payments_to_move_to_due,
+    get_payments_to_move_to_overdue,
+    get_payments_to_move_from_due_to_overdue,
+    get_due_rentals_by_landlord,
+)
+from synthetic_portfolio import build_portfolio
+
+DAYS_WINDOW = 7
+
+
+def run_separate_scans(statistics, tenants, companies):
+    get_due_rentals_by_tenant(statistics, tenants, DAYS_WINDOW)
+    get_payments_to_move_to_due(statistics, DAYS_WINDOW)
+    get_payments_to_move_to_overdue(statistics)
+    get_payments_to_move_from_due_to_overdue(statistics)
+    get_due_rentals_by_landlord(statistics, tenants, companies, DAYS_WINDOW)
+
+
+def run_single_pass(statistics, tenants, companies):
+    classify_payments(statistics, tenants, DAYS_WINDOW, companies=companies)
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    num_companies = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    payments_per_company = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    statistics, tenants, companies = build_portfolio(num_companies, payments_per_company, date.today())
+    total_payments = num_companies * payments_per_company
+    print(f"Portfolio: {num_companies} companies, {total_payments} payments")
+
+    results = {}
+    benchmarks = (
+        ('five separate scans', run_separate_scans),
+        ('single classify pass', run_single_pass),
+    )
+    for name, fn in benchmarks:
+        best = min(timeit.repeat(lambda: fn(statistics, tenants, companies), number=1, repeat=5))
+        results[name] = best
+        print(f"  {name:<22} {best * 1000:9.1f} ms  ({best / total_payments * 1e6:.2f} us/payment)")
+
+    print(f"  speedup of single classify pass: {results['five separate scans'] / results['single classify pass']:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Measures the per-email overhead of building a new SES client for every send (the old behaviour)
+against reusing the client from email_service's registry, against a local SES stub. The stub speaks plain
+HTTP, so the TLS handshakes a reused client also saves against real SES are not included.
+
+Usage: python benchmarks/bench_ses_client.py [emails]
+"""
+import logging
+import os
+import sys
+import time
+from unittest.mock import patch
+
+import boto3
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'functions')))
+
+from ses_stub import SesStub
+
+CREDENTIALS = {"AWS_ACCESS_KEY_ID": "benchmark-key", "AWS_SECRET_ACCESS_KEY": "benchmark-secret"}
+MESSAGE = "Subject: benchmark\r\n\r\nbody"
+
+
+def send_with_new_client(stub_url):
+    ses_client = boto3.client(
+        'ses',
+        region_name="us-east-1",
+        aws_access_key_id=CREDENTIALS["AWS_ACCESS_KEY_ID"],
+        aws_secret_access_key=CREDENTIALS["AWS_SECRET_ACCESS_KEY"],
+        endpoint_url=stub_url,
+    )
+    ses_client.send_raw_email(Source="noreply@example.com", Destinations=["tenant@example.com"], RawMessage={'Data': MESSAGE})
+
+
+def send_with_registry_client(email_service):
+    ses_client = email_service.create_ses_client()
+    ses_client.send_raw_email(Source="noreply@example.com", Destinations=["tenant@example.com"], RawMessage={'Data': MESSAGE})
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    emails = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    stub = SesStub()
+    os.environ['SES_ENDPOINT_URL'] = stub.url
+    with patch('google.cloud.secretmanager.SecretManagerServiceClient'):
+        import services.email_service as email_service
+    patch.object(email_service, 'access_secret_version', side_effect=lambda secret_id: CREDENTIALS[secret_id]).start()
+    print(f"{emails} emails to a local SES stub")
+
+    results = {}
+    for name, send in (
+        ('new client per email', lambda: send_with_new_client(stub.url)),
+        ('registry client', lambda: send_with_registry_client(email_service)),
+    ):
+        send()  # warm up botocore's loaders and the registry
+        start = time.perf_counter()
+        for _ in range(emails):
+            send()
+        results[name] = (time.perf_counter() - start) / emails
+        print(f"  {name:<22} {results[name] * 1000:7.2f} ms/email")
+    print(f"  overhead saved per email: {(results['new client per email'] - results['registry client']) * 1000:.2f} ms")
+
+    patch.stopall()
+    stub.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Sends a burst of emails from several threads to a local SES stub that throttles above its MaxSendRate,
+as when many send_email_worker tasks land at once. Compares plain sends (botocore's default retries,
+failures left to a task retry) with email_service's rate-limited send_raw_email, which paces the sends
+from the account quota and retries only the throttled SES call.
+
+Usage: python benchmarks/bench_ses_rate_limit.py [emails] [max_send_rate] [threads]
+"""
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import boto3
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'functions')))
+
+from ses_stub import SesStub
+
+CREDENTIALS = {"AWS_ACCESS_KEY_ID": "benchmark-key", "AWS_SECRET_ACCESS_KEY": "benchmark-secret"}
+SES_LATENCY_SECONDS = 0.02
+
+
+def message(i):
+    return {
+        'source': "noreply@example.com",
+        'recipient_email': f"tenant{i}@example.com",
+        'cc_recipients': [],
+        'destinations': [f"tenant{i}@example.com"],
+        'raw_message': f"Subject: benchmark {i}\r\n\r\nbody".encode(),
+    }
+
+
+def send_unlimited(ses_client, i):
+    """The send as it was: any error is logged and the task is retried as a whole."""
+    try:
+        ses_client.send_raw_email(Source="noreply@example.com", Destinations=[f"tenant{i}@example.com"], RawMessage={'Data': message(i)['raw_message']})
+        return True
+    except Exception:
+        return False
+
+
+def run(stub, send, emails, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(send, range(emails)))
+    return time.perf_counter() - start, results.count(False)
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    emails = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    max_send_rate = float(sys.argv[2]) if len(sys.argv) > 2 else 50
+    threads = int(sys.argv[3]) if len(sys.argv) > 3 else 16
+    with patch('google.cloud.secretmanager.SecretManagerServiceClient'):
+        import services.email_service as email_service
+    patch.object(email_service, 'access_secret_version', side_effect=lambda secret_id: CREDENTIALS[secret_id]).start()
+    print(f"{emails} emails from {threads} threads to an SES stub allowing {max_send_rate:.0f}/s")
+
+    stub = SesStub(max_send_rate=max_send_rate, latency_seconds=SES_LATENCY_SECONDS)
+    ses_client = boto3.client('ses', region_name="us-east-1", endpoint_url=stub.url,
+                              aws_access_key_id=CREDENTIALS["AWS_ACCESS_KEY_ID"], aws_secret_access_key=CREDENTIALS["AWS_SECRET_ACCESS_KEY"])
+    seconds, failed = run(stub, lambda i: send_unlimited(ses_client, i), emails, threads)
+    print(f"  unlimited     {stub.sent / seconds:6.1f} sent/s, {stub.throttled:4d} throttled responses, {failed:4d} sends failed (whole task retried)")
+    stub.close()
+
+    stub = SesStub(max_send_rate=max_send_rate, latency_seconds=SES_LATENCY_SECONDS)
+    os.environ['SES_ENDPOINT_URL'] = stub.url
+    ses_client = email_service.create_ses_client()
+    seconds, failed = run(stub, lambda i: email_service.send_raw_email(message(i), ses_client), emails, threads)
+    print(f"  rate-limited  {stub.sent / seconds:6.1f} sent/s, {stub.throttled:4d} throttled responses, {failed:4d} sends failed")
+    stub.close()
+    patch.stopall()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Runs the scheduler end to end on one box: run_scheduler enqueues the tenant reminders on the in-memory
+task backend (TASK_BACKEND=memory), whose workers call send_notification_worker in-process. Invoice PDFs
+are really rendered; RTDB, Storage and SES calls are replaced by sleeps of typical latency. Reports
+throughput and per-task queue wait and handler latency for several worker concurrencies.
+
+Usage: python benchmarks/bench_task_pipeline.py [num_companies] [payments_per_company] [reminder_batch_size]
+"""
+import logging
+import os
+import sys
+import time
+from datetime import date
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'functions')))
+
+from synthetic_portfolio import build_portfolio
+
+DAYS_WINDOW = 7
+CONCURRENCIES = (1, 4, 16)
+# Simulated round trips of the external services, in seconds
+RTDB_READ_SECONDS = 0.02
+RTDB_WRITE_SECONDS = 0.01
+STORAGE_UPLOAD_SECONDS = 0.05
+SES_SEND_SECONDS = 0.08
+
+
+def sleeping(seconds, result=None):
+    def call(*args, **kwargs):
+        time.sleep(seconds)
+        return result
+    return call
+
+
+def import_main():
+    """Imports main without Google Cloud credentials."""
+    with patch('google.cloud.logging.Client'), patch('google.cloud.secretmanager.SecretManagerServiceClient'), \
+            patch('firebase_admin.initialize_app'), patch('firebase_admin.get_app'):
+        import main
+    return main
+
+
+def stub_external_services(main, statistics, tenants, companies):
+    for name, stub in (
+        ('get_payment_tracking', sleeping(RTDB_READ_SECONDS, statistics)),
+        ('get_all_tenants', sleeping(RTDB_READ_SECONDS, tenants)),
+        ('get_all_companies', sleeping(RTDB_READ_SECONDS, companies)),
+        ('get_company_contact_emails', sleeping(RTDB_READ_SECONDS, {company_id: company['contactEmail'] for company_id, company in companies.items()})),
+        ('get_completed_companies', sleeping(RTDB_READ_SECONDS, set())),
+        ('apply_payment_transitions', sleeping(RTDB_WRITE_SECONDS)),
+        ('complete_scheduler_run', sleeping(RTDB_WRITE_SECONDS)),
+        ('save_scheduler_cursor', sleeping(RTDB_WRITE_SECONDS)),
+        ('upload_to_storage', sleeping(STORAGE_UPLOAD_SECONDS, "invoices/benchmark.pdf")),
+        ('send_raw_email', sleeping(SES_SEND_SECONDS, True)),
+        ('create_ses_client', lambda *args, **kwargs: MagicMock()),
+    ):
+        patch.object(main, name, stub).start()
+    reference = MagicMock()
+    reference.set.side_effect = sleeping(RTDB_WRITE_SECONDS)
+    patch.object(main.db, 'reference', return_value=reference).start()
+
+
+def run_pipeline(main, cloud_tasks_service, concurrency, run_id):
+    os.environ['TASK_QUEUE_CONCURRENCY'] = str(concurrency)
+    cloud_tasks_service._local_task_queues.clear()
+
+    start = time.perf_counter()
+    main.run_scheduler(run_id, DAYS_WINDOW)
+    enqueued = time.perf_counter()
+    local_queue = cloud_tasks_service.get_local_task_queue(cloud_tasks_service.TASK_BACKEND_MEMORY)
+    local_queue.join()
+    finished = time.perf_counter()
+    local_queue.shutdown()
+    return enqueued - start, finished - start, local_queue.summary()
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    num_companies = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    payments_per_company = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    reminder_batch_size = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    os.environ['TASK_BACKEND'] = 'memory'
+    os.environ['REMINDER_BATCH_SIZE'] = str(reminder_batch_size)
+
+    statistics, tenants, companies = build_portfolio(num_companies, payments_per_company, date.today())
+    main_module = import_main()
+    import services.cloud_tasks_service as cloud_tasks_service
+    stub_external_services(main_module, statistics, tenants, companies)
+    print(f"Portfolio: {num_companies} companies, {num_companies * payments_per_company} payments, reminder batch size {reminder_batch_size}")
+
+    for concurrency in CONCURRENCIES:
+        scheduler_seconds, total_seconds, summary = run_pipeline(main_module, cloud_tasks_service, concurrency, f"bench-{concurrency}")
+        print(
+            f"  {concurrency:>2} workers: {summary['tasks']} tasks in {total_seconds:6.2f} s "
+            f"(scheduler {scheduler_seconds:5.2f} s, {summary['tasks'] / total_seconds:6.1f} tasks/s)  "
+            f"wait p50/p95 {summary['queue_wait_p50'] * 1000:7.1f}/{summary['queue_wait_p95'] * 1000:7.1f} ms  "
+            f"latency p50/p95 {summary['latency_p50'] * 1000:6.1f}/{summary['latency_p95'] * 1000:6.1f} ms  "
+            f"statuses {summary['statuses']}"
+        )
+    patch.stopall()
+
+
+if __name__ == '__main__':
+    main()
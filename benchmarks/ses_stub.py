@@ -0,0 +1,96 @@
+"""
+A local stand-in for the SES query API, for benchmarks. Answers SendRawEmail, SendBulkTemplatedEmail,
+GetSendQuota and the template calls with canned responses. With `max_send_rate` it throttles like SES
+when more messages per second arrive than that rate.
+"""
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+SES_NAMESPACE = "http://ses.amazonaws.com/doc/2010-12-01/"
+
+
+class SesStub:
+    def __init__(self, max_send_rate: float = None, latency_seconds: float = 0.0):
+        self.max_send_rate = max_send_rate
+        self.latency_seconds = latency_seconds
+        self.sent = 0
+        self.throttled = 0
+        self.calls = {}
+        self._lock = threading.Lock()
+        self._tokens = max_send_rate or 0
+        self._refilled_at = time.monotonic()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode()
+                status, response = stub.handle(parse_qs(body))
+                payload = response.encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/xml')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _take(self, messages: int) -> bool:
+        if not self.max_send_rate:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.max_send_rate, self._tokens + (now - self._refilled_at) * self.max_send_rate)
+            self._refilled_at = now
+            if self._tokens < messages:
+                return False
+            self._tokens -= messages
+            return True
+
+    def handle(self, params: dict) -> tuple:
+        action = params.get('Action', [''])[0]
+        with self._lock:
+            self.calls[action] = self.calls.get(action, 0) + 1
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        request_id = uuid.uuid4()
+
+        if action in ('SendRawEmail', 'SendBulkTemplatedEmail'):
+            messages = 1
+            if action == 'SendBulkTemplatedEmail':
+                messages = sum(1 for key in params if key.endswith('.Destination.ToAddresses.member.1'))
+            if not self._take(messages):
+                with self._lock:
+                    self.throttled += 1
+                return 400, (
+                    f'<ErrorResponse xmlns="{SES_NAMESPACE}"><Error><Type>Sender</Type><Code>Throttling</Code>'
+                    f'<Message>Maximum sending rate exceeded.</Message></Error><RequestId>{request_id}</RequestId></ErrorResponse>'
+                )
+            with self._lock:
+                self.sent += messages
+            if action == 'SendRawEmail':
+                result = f"<MessageId>{uuid.uuid4()}</MessageId>"
+            else:
+                result = "<Status>" + "".join(
+                    f"<member><Status>Success</Status><MessageId>{uuid.uuid4()}</MessageId></member>" for _ in range(messages)
+                ) + "</Status>"
+        elif action == 'GetSendQuota':
+            result = f"<Max24HourSend>200000.0</Max24HourSend><SentLast24Hours>{float(self.sent)}</SentLast24Hours><MaxSendRate>{float(self.max_send_rate or 14)}</MaxSendRate>"
+        else:
+            result = ""
+        return 200, (
+            f'<{action}Response xmlns="{SES_NAMESPACE}"><{action}Result>{result}</{action}Result>'
+            f'<ResponseMetadata><RequestId>{request_id}</RequestId></ResponseMetadata></{action}Response>'
+        )
@@ -0,0 +1,44 @@
+"""
+Builds synthetic Statistics/Tenants trees shaped like the HomeHive RTDB for benchmarks.
+"""
+import random
+from datetime import date, timedelta
+
+
+def build_portfolio(num_companies: int, payments_per_company: int, today: date, seed: int = 42) -> tuple[dict, dict, dict]:
+    """
+    Returns (statistics, tenants, companies) with pending and due payments spread from 60 days
+    before to 90 days after `today`.
+    """
+    rng = random.Random(seed)
+    statistics, tenants, companies = {}, {}, {}
+
+    for company_index in range(num_companies):
+        company_id = f"-Company{company_index:05d}"
+        companies[company_id] = {'contactEmail': f"landlord{company_index}@example.com"}
+        tenant_ids = [f"tenant{company_index:05d}{t:04d}" for t in range(max(1, payments_per_company // 4))]
+        tenants[company_id] = {
+            'active': {
+                tenant_id: {'email': f"{tenant_id}@example.com", 'mobileNumber': '0970000000', 'idNumber': tenant_id[-8:]}
+                for tenant_id in tenant_ids
+            }
+        }
+
+        pending, due = {}, {}
+        for payment_index in range(payments_per_company):
+            tenant_id = rng.choice(tenant_ids)
+            due_date = today + timedelta(days=rng.randint(-60, 90))
+            payment = {
+                'amount': rng.choice([1500, 2500, 4000, 8000]),
+                'dueDate': due_date.strftime('%d/%m/%Y'),
+                'paymentType': rng.choice([0, 0, 0, 1]),
+                'tenantId': tenant_id,
+                'tenantName': f"Tenant {tenant_id}",
+                'propertyName': f"Property {payment_index % 50}",
+            }
+            payment_id = f"payment{company_index:05d}{payment_index:06d}"
+            (due if rng.random() < 0.2 else pending)[payment_id] = payment
+
+        statistics[company_id] = {'paymentTracking': {'pending': pending, 'due': due}}
+
+    return statistics, tenants, companies
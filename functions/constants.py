@@ -1,7 +1,11 @@
 # functions/constants.py
 
 DATABASE_URL = 'https://homehive-dev-89916-default-rtdb.firebaseio.com/'
+PROPERTY_MANAGEMENT_PATH = '/HomeHive/PropertyManagement'
 TENANTS_PATH = '/HomeHive/PropertyManagement/Tenants'
 STATISTICS_PATH = '/HomeHive/PropertyManagement/Statistics'
 ACCOUNTS_PATH = '/HomeHive/PropertyManagement/Accounts'
 COMPANIES_PATH = '/HomeHive/PropertyManagement/Companies'
+PAYMENTS_BY_DUE_DATE_PATH = '/HomeHive/PropertyManagement/PaymentsByDueDate'
+SCHEDULER_RUNS_PATH = '/HomeHive/PropertyManagement/SchedulerRuns'
+OUTBOX_PATH = '/HomeHive/PropertyManagement/Outbox'
@@ -13,136 +13,207 @@ def _flatten_tenants(tenants: dict) -> dict:
         for tenant_id, tenant_data in status_group.items()
     }
 
-def get_due_rentals_by_tenant(statistics: dict, tenants: dict, exact_days_from_today: int) -> dict:
+# Buckets of classify_payments that move a payment to another paymentTracking node,
+# with the (source, target) tracking nodes of the move
+TRANSITION_NODES = {
+    'pending_to_due': ('pending', 'due'),
+    'pending_to_overdue': ('pending', 'overdue'),
+    'due_to_overdue': ('due', 'overdue'),
+}
+TRANSITION_BUCKETS = tuple(TRANSITION_NODES)
+
+def _empty_classification() -> dict:
+    """Creates the result structure returned by classify_payments."""
+    return {
+        'tenant_reminders': {},
+        'pending_to_due': [],
+        'pending_to_overdue': [],
+        'due_to_overdue': [],
+        'landlord_digest': {},
+        'company_totals': {},
+    }
+
+def _payment_amount(payment_details: dict) -> float:
+    """Returns the payment amount as a float, treating missing or invalid amounts as 0."""
+    try:
+        return float(payment_details.get('amount', 0))
+    except (ValueError, TypeError):
+        return 0.0
+
+def _new_tenant_reminder(tenant_id: str, payment_details: dict, tenant_details: dict) -> dict:
+    """Creates a tenant's consolidated reminder, before its due rentals are added."""
+    return {
+        'tenant_info': {
+            'tenant_id': tenant_id,
+            'name': payment_details.get('tenantName', ''),
+            'email': tenant_details.get('email'),
+            'mobileNumber': tenant_details.get('mobileNumber'),
+            'idNumber': tenant_details.get('idNumber'),
+        },
+        'due_rentals': []
+    }
+
+def _due_rental(company_id: str, payment_id: str, payment_details: dict, due_date: date) -> dict:
+    """Creates the entry of a rental payment in a tenant's consolidated reminder."""
+    return {
+        'dueDate': due_date.strftime('%d/%m/%Y'),
+        'rent_amount': payment_details.get('amount'),
+        'property_name': payment_details.get('propertyName', ''),
+        'payment_id': payment_id,
+        'company_id': company_id
+    }
+
+def classify_payments(statistics: dict, tenants: dict, exact_days_from_today: int, companies: dict = None, today: date = None) -> dict:
     """
-    Identifies rental payments due exactly `exact_days_from_today` from today, grouped by tenant ID.
-    Returns a dictionary where keys are tenant IDs and values are dicts containing tenant_info and a list of their due rentals.
+    Walks every pending and due payment once, parsing each due date a single time, and sorts the payments
+    into every bucket the scheduler acts on:
+      - 'tenant_reminders': rental payments due within `exact_days_from_today`, grouped by tenant ID
+      - 'pending_to_due': pending payments (all types) due within `exact_days_from_today`
+      - 'pending_to_overdue': pending payments whose due date has passed
+      - 'due_to_overdue': due payments whose due date has passed
+      - 'landlord_digest': rental payments due within the window, grouped by landlord email
+        (only built when `companies` is given)
+      - 'company_totals': per company, the summed amount of each transition bucket
     """
-    today = date.today()
+    if today is None:
+        today = date.today()
     target_due_date = today + timedelta(days=exact_days_from_today)
     all_tenants_flat = _flatten_tenants(tenants)
-    
-    grouped_due_rentals_by_tenant = {} 
+    parsed_due_dates = {} # Many payments share a due date, so each distinct string is parsed once
+
+    classification = _empty_classification()
+    tenant_reminders = classification['tenant_reminders']
+    landlord_digest = classification['landlord_digest']
+    company_totals = classification['company_totals']
 
     for company_id, company_stats in statistics.items():
-        pending_payments = company_stats.get('paymentTracking', {}).get('pending', {})
-        for payment_id, payment_details in pending_payments.items():
-            # Only consider rental payments (paymentType == 0)
-            if payment_details.get('paymentType') != 0:
-                continue
+        payment_tracking = company_stats.get('paymentTracking', {})
+
+        landlord_email = None
+        if companies is not None:
+            landlord_email = companies.get(company_id, {}).get('contactEmail')
+            if not landlord_email:
+                log.warning(f"No contact email found for company ID: {company_id}. Skipping landlord notification.")
+
+        for tracking_node in ('pending', 'due'):
+            for payment_id, payment_details in payment_tracking.get(tracking_node, {}).items():
+                rent_due_date_str = (payment_details.get('dueDate') or '').strip()
+                if not rent_due_date_str:
+                    continue
+
+                if rent_due_date_str not in parsed_due_dates:
+                    try:
+                        parsed_due_dates[rent_due_date_str] = datetime.strptime(rent_due_date_str, '%d/%m/%Y').date()
+                    except (ValueError, TypeError):
+                        parsed_due_dates[rent_due_date_str] = None
+                due_date = parsed_due_dates[rent_due_date_str]
+                if due_date is None:
+                    log.warning(f"Could not parse date '{rent_due_date_str}' for payment {payment_id}")
+                    continue
+
+                payment = {
+                    'company_id': company_id,
+                    'payment_id': payment_id,
+                    'payment_details': payment_details
+                }
 
-            rent_due_date_str = payment_details.get('dueDate').strip()
-            if not rent_due_date_str:
-                continue
+                if due_date < today:
+                    bucket = f'{tracking_node}_to_overdue'
+                elif tracking_node == 'pending' and due_date <= target_due_date:
+                    bucket = 'pending_to_due'
+                else:
+                    continue
+
+                classification[bucket].append(payment)
+                totals = company_totals.setdefault(company_id, {name: 0.0 for name in TRANSITION_BUCKETS})
+                totals[bucket] += _payment_amount(payment_details)
+
+                if bucket != 'pending_to_due':
+                    continue
+
+                # Only rental payments (paymentType == 0) of known tenants are included in reminders
+                if payment_details.get('paymentType') != 0:
+                    continue
+                tenant_id = payment_details.get('tenantId')
+                tenant_details_from_db = all_tenants_flat.get(tenant_id)
+                if not tenant_details_from_db:
+                    continue
+
+                if tenant_id not in tenant_reminders:
+                    tenant_reminders[tenant_id] = _new_tenant_reminder(tenant_id, payment_details, tenant_details_from_db)
+                tenant_reminders[tenant_id]['due_rentals'].append(_due_rental(company_id, payment_id, payment_details, due_date))
+
+                if landlord_email:
+                    landlord_digest.setdefault(landlord_email, []).append({
+                        'tenant_name': payment_details.get('tenantName', ''),
+                        'property_name': payment_details.get('propertyName', ''),
+                        'amount': payment_details.get('amount'),
+                        'due_date': due_date.strftime('%d/%m/%Y'),
+                    })
+
+    return classification
 
+def group_transitions_by_company(classification: dict) -> dict:
+    """
+    Turns the transition buckets of a classification into per-company transition lists,
+    in the format expected by db_service.apply_payment_transitions.
+    """
+    transitions_by_company = {}
+    for bucket, (source_tracking_node, target_tracking_node) in TRANSITION_NODES.items():
+        for payment in classification[bucket]:
+            transitions_by_company.setdefault(payment['company_id'], []).append({
+                'payment_id': payment['payment_id'],
+                'payment_details': payment['payment_details'],
+                'source_tracking_node': source_tracking_node,
+                'target_tracking_node': target_tracking_node,
+            })
+    return transitions_by_company
+
+def build_tenant_reminder(company_id: str, tenant_id: str, tenants: dict, payment_tracking: dict, due_date: date) -> dict | None:
+    """
+    Builds one tenant's consolidated reminder for their rental payments in a company due on `due_date`,
+    whether still pending or already moved to due, in the format of classify_payments' tenant_reminders.
+    Returns None if the tenant is unknown or has no such payments.
+    """
+    tenant_details = _flatten_tenants(tenants).get(tenant_id)
+    if not tenant_details:
+        return None
+
+    reminder = None
+    for tracking_node in ('pending', 'due'):
+        for payment_id, payment_details in (payment_tracking.get(tracking_node) or {}).items():
+            if payment_details.get('paymentType') != 0 or payment_details.get('tenantId') != tenant_id:
+                continue
             try:
-                due_date = datetime.strptime(rent_due_date_str, '%d/%m/%Y').date()
-                if today <= due_date <= target_due_date: # Check for exact due date
-                    tenant_id = payment_details.get('tenantId')
-                    tenant_details_from_db = all_tenants_flat.get(tenant_id)
-                    if tenant_details_from_db:
-                        if tenant_id not in grouped_due_rentals_by_tenant:
-                            grouped_due_rentals_by_tenant[tenant_id] = {
-                                'tenant_info': {
-                                    'tenant_id': tenant_id,
-                                    'name': payment_details.get('tenantName', ''),
-                                    'email': tenant_details_from_db.get('email'),
-                                    'mobileNumber': tenant_details_from_db.get('mobileNumber'),
-                                    'idNumber': tenant_details_from_db.get('idNumber'),
-                                },
-                                'due_rentals': []
-                            }
-                        
-                        # Add individual rental details to the tenant's list
-                        grouped_due_rentals_by_tenant[tenant_id]['due_rentals'].append({
-                            'dueDate': due_date.strftime('%d/%m/%Y'),
-                            'rent_amount': payment_details.get('amount'),
-                            'property_name': payment_details.get('propertyName', ''),
-                            'payment_id': payment_id,
-                            'company_id': company_id # Add company_id here
-                        })
-            except (ValueError, TypeError):
-                log.warning(f"Could not parse date '{rent_due_date_str}' for payment {payment_id}")
+                if datetime.strptime((payment_details.get('dueDate') or '').strip(), '%d/%m/%Y').date() != due_date:
+                    continue
+            except ValueError:
                 continue
+            if reminder is None:
+                reminder = _new_tenant_reminder(tenant_id, payment_details, tenant_details)
+            reminder['due_rentals'].append(_due_rental(company_id, payment_id, payment_details, due_date))
+    return reminder
 
-    return grouped_due_rentals_by_tenant
+def get_due_rentals_by_tenant(statistics: dict, tenants: dict, exact_days_from_today: int) -> dict:
+    """
+    Identifies rental payments due exactly `exact_days_from_today` from today, grouped by tenant ID.
+    Returns a dictionary where keys are tenant IDs and values are dicts containing tenant_info and a list of their due rentals.
+    """
+    return classify_payments(statistics, tenants, exact_days_from_today)['tenant_reminders']
 
 def get_due_rentals_by_landlord(statistics: dict, tenants: dict, companies: dict, exact_days_from_today: int) -> dict:
     """
     Identifies rental payments due exactly `exact_days_from_today` from today, grouped by landlord email.
     Each landlord receives a summary of all due rentals for their associated properties.
     """
-    today = date.today()
-    target_due_date = today + timedelta(days=exact_days_from_today)
-    all_tenants_flat = _flatten_tenants(tenants)
-    
-    landlord_due_rentals = {} # Key: landlord_email, Value: list of rental details
-
-    for company_id, company_stats in statistics.items():
-        # Get landlord email for this company
-        landlord_email = companies.get(company_id, {}).get('contactEmail')
-        if not landlord_email:
-            log.warning(f"No contact email found for company ID: {company_id}. Skipping landlord notification.")
-            continue
-
-        pending_payments = company_stats.get('paymentTracking', {}).get('pending', {})
-        for payment_id, payment_details in pending_payments.items():
-            # Only consider rental payments (paymentType == 0)
-            if payment_details.get('paymentType') != 0:
-                continue
-
-            rent_due_date_str = payment_details.get('dueDate').strip()
-            if not rent_due_date_str:
-                continue
-
-            try:
-                due_date = datetime.strptime(rent_due_date_str, '%d/%m/%Y').date()
-                if today <= due_date <= target_due_date: # Check for exact due date
-                    tenant_id = payment_details.get('tenantId')
-                    tenant_details_from_db = all_tenants_flat.get(tenant_id)
-                    if tenant_details_from_db:
-                        rental_info = {
-                            'tenant_name': payment_details.get('tenantName', ''),
-                            'property_name': payment_details.get('propertyName', ''),
-                            'amount': payment_details.get('amount'),
-                            'due_date': due_date.strftime('%d/%m/%Y'),
-                        }
-                        if landlord_email not in landlord_due_rentals:
-                            landlord_due_rentals[landlord_email] = []
-                        landlord_due_rentals[landlord_email].append(rental_info)
-            except (ValueError, TypeError):
-                log.warning(f"Could not parse date '{rent_due_date_str}' for payment {payment_id}")
-                continue
-                
-    return landlord_due_rentals
+    return classify_payments(statistics, tenants, exact_days_from_today, companies=companies)['landlord_digest']
 
 def get_payments_to_move_to_overdue(statistics: dict) -> list:
     """
     Identifies payments that are past their due date and need to be moved to the overdue section.
     Returns a list of dictionaries, each containing company_id, payment_id, and payment_details.
     """
-    today = date.today()
-    payments_to_move = []
-
-    for company_id, company_stats in statistics.items():
-        pending_payments = company_stats.get('paymentTracking', {}).get('pending', {})
-        for payment_id, payment_details in pending_payments.items():
-            rent_due_date_str = payment_details.get('dueDate').strip()
-            if not rent_due_date_str:
-                continue
-
-            try:
-                due_date = datetime.strptime(rent_due_date_str, '%d/%m/%Y').date()
-                if due_date < today:
-                    payments_to_move.append({
-                        'company_id': company_id,
-                        'payment_id': payment_id,
-                        'payment_details': payment_details
-                    })
-            except (ValueError, TypeError):
-                log.warning(f"Could not parse date '{rent_due_date_str}' for payment {payment_id}")
-                continue
-    return payments_to_move
+    return classify_payments(statistics, {}, 0)['pending_to_overdue']
 
 def get_payments_to_move_from_due_to_overdue(statistics: dict) -> list:
     """
@@ -150,28 +221,7 @@ def get_payments_to_move_from_due_to_overdue(statistics: dict) -> list:
     and need to be moved to the 'overdue' section.
     Returns a list of dictionaries, each containing company_id, payment_id, and payment_details.
     """
-    today = date.today()
-    payments_to_move = []
-
-    for company_id, company_stats in statistics.items():
-        due_payments = company_stats.get('paymentTracking', {}).get('due', {}) # Look in 'due' payments
-        for payment_id, payment_details in due_payments.items():
-            rent_due_date_str = payment_details.get('dueDate').strip()
-            if not rent_due_date_str:
-                continue
-
-            try:
-                due_date = datetime.strptime(rent_due_date_str, '%d/%m/%Y').date()
-                if due_date < today: # If due date is in the past
-                    payments_to_move.append({
-                        'company_id': company_id,
-                        'payment_id': payment_id,
-                        'payment_details': payment_details
-                    })
-            except (ValueError, TypeError):
-                log.warning(f"Could not parse date '{rent_due_date_str}' for payment {payment_id}")
-                continue
-    return payments_to_move
+    return classify_payments(statistics, {}, 0)['due_to_overdue']
 
 def get_payments_to_move_to_due(statistics: dict, exact_days_from_today: int) -> list:
     """
@@ -179,29 +229,6 @@ def get_payments_to_move_to_due(statistics: dict, exact_days_from_today: int) ->
     Returns a list of dictionaries, each containing company_id, payment_id, and payment_details.
     Includes all payment types (rental and non-rental).
     """
-    today = date.today()
-    target_due_date = today + timedelta(days=exact_days_from_today)
-    payments_to_move = []
-
-    for company_id, company_stats in statistics.items():
-        pending_payments = company_stats.get('paymentTracking', {}).get('pending', {})
-        for payment_id, payment_details in pending_payments.items():
-            rent_due_date_str = payment_details.get('dueDate').strip()
-            if not rent_due_date_str:
-                continue
-
-            try:
-                due_date = datetime.strptime(rent_due_date_str, '%d/%m/%Y').date()
-                if today <= due_date <= target_due_date: # Check for exact due date
-                    payments_to_move.append({
-                        'company_id': company_id,
-                        'payment_id': payment_id,
-                        'payment_details': payment_details
-                    })
-            except (ValueError, TypeError):
-                log.warning(f"Could not parse date '{rent_due_date_str}' for payment {payment_id}")
-                continue
-
+    payments_to_move = classify_payments(statistics, {}, exact_days_from_today)['pending_to_due']
     log.error(f"Payments to move to due: {payments_to_move}")
     return payments_to_move
-
@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta, time
+from zoneinfo import ZoneInfo
+import logging
+
+# Set up a module-level logger
+log = logging.getLogger(__name__)
+
+# Due dates are calendar days in the landlords' timezone, the same one the daily scheduler runs in
+SCHEDULER_TIMEZONE = ZoneInfo("Africa/Johannesburg")
+
+# Cloud Tasks rejects a schedule_time more than 30 days ahead
+MAX_SCHEDULE_AHEAD = timedelta(days=30)
+
+def _local_midnight(day) -> datetime:
+    return datetime.combine(day, time.min, tzinfo=SCHEDULER_TIMEZONE)
+
+def get_transition_moments(payment_details: dict, days_window: int) -> list:
+    """
+    Returns the moments a pending payment enters the due window and becomes overdue: local midnight
+    `days_window` days before its due date and local midnight the day after it, matching the
+    classify_payments rules. Returns [] if the due date cannot be parsed.
+    """
+    due_date_str = (payment_details.get('dueDate') or '').strip()
+    try:
+        due_date = datetime.strptime(due_date_str, '%d/%m/%Y').date()
+    except ValueError:
+        log.warning(f"Could not parse date '{due_date_str}' for payment {payment_details.get('paymentId')}")
+        return []
+    return [_local_midnight(due_date - timedelta(days=days_window)), _local_midnight(due_date + timedelta(days=1))]
+
+def plan_transition_tasks(payment_details: dict, days_window: int, now: datetime, tracking_node: str = 'pending') -> list:
+    """
+    Plans the Cloud Tasks for a payment's transition moments from its current tracking node: a pending
+    payment enters the due window and becomes overdue, a due payment only becomes overdue.
+    Returns a list of {'moment': datetime, 'schedule_time': datetime, 'rearm': bool}; the moment is the
+    task's content key, so planning the same payment again yields the same tasks.
+    Moments already passed are skipped except the latest, which runs now to catch up a payment still in
+    its old node. A moment beyond the Cloud Tasks horizon is replaced by a single re-arm task at the
+    horizon, which plans the remaining moments again when it runs.
+    """
+    moments = get_transition_moments(payment_details, days_window)
+    if tracking_node == 'due':
+        moments = moments[1:]
+    passed = [moment for moment in moments if moment <= now]
+    tasks = [{'moment': passed[-1], 'schedule_time': now, 'rearm': False}] if passed else []
+    horizon = now + MAX_SCHEDULE_AHEAD
+    for moment in moments[len(passed):]:
+        if moment > horizon:
+            tasks.append({'moment': moment, 'schedule_time': horizon, 'rearm': True})
+            break
+        tasks.append({'moment': moment, 'schedule_time': moment, 'rearm': False})
+    return tasks
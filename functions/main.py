@@ -1,38 +1,57 @@
-from firebase_functions import scheduler_fn, https_fn
+from firebase_functions import scheduler_fn, https_fn, db_fn
 from firebase_functions.options import set_global_options
 from firebase_admin import initialize_app, storage, db
 import firebase_admin # Added import
 import google.cloud.logging
 
+import json
 import logging
 import os 
+import time
 import uuid
-from datetime import timedelta, datetime
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import timedelta, datetime, date, timezone
 
 from services.db_service import (
-    get_all_tenants, get_all_statistics, 
-    move_payment_to_overdue, 
+    get_all_tenants, get_payment_tracking, 
+    get_company_ids,
+    get_tenants_for_companies,
+    get_payment_tracking_for_payment,
+    get_tenant,
+    get_tenant_payment_tracking,
     get_all_companies, 
-    move_pending_to_due, 
+    get_company_contact_emails,
+    apply_payment_transitions,
     get_all_accounts,
+    get_payment_tracking_in_window,
+    sync_due_date_index,
+    backfill_due_date_index,
+    get_completed_companies,
+    mark_companies_completed,
+    save_scheduler_cursor,
+    complete_scheduler_run,
 )
-from logic.notification_logic import (
-    get_due_rentals_by_tenant, 
-    get_payments_to_move_to_overdue, 
-    get_due_rentals_by_landlord, 
-    get_payments_to_move_to_due, 
-    get_payments_to_move_from_due_to_overdue
-)
+from logic.notification_logic import classify_payments, group_transitions_by_company, build_tenant_reminder
+from logic.transition_schedule import plan_transition_tasks, SCHEDULER_TIMEZONE
 from services.cloud_tasks_service import enqueue_tasks
+from services.data_context import DataContext
 from utils.template_renderer import template_env
 from services.email_service import (
     send_tenant_summary_email, 
     send_landlord_summary_email,
-    send_email
+    send_email,
+    build_email,
+    create_ses_client,
+    build_tenant_summary_email,
+    send_raw_email,
+    send_bulk_tenant_summary_emails,
 )
-from services.invoice_service import create_invoice_pdf
+from services.invoice_service import create_invoice_pdf, invoice_content_hash
 from services.storage_service import upload_to_storage
+from services.secret_manager_service import prefetch_secrets
+from services.outbox_service import outbox_enabled, spool_email, drain_outbox
 from services.receipt_service import generate_receipt_pdf
+from constants import STATISTICS_PATH
 
 
 # Set up a module-level logger
@@ -49,6 +68,161 @@ except ValueError:
     initialize_app()
 set_global_options(max_instances=1)
 
+# Warm the secret cache while the instance starts, so the first email does not wait on Secret Manager.
+# FUNCTION_TARGET is only set by the functions runtime, which keeps imports for tests and scripts offline.
+if os.environ.get('FUNCTION_TARGET'):
+    prefetch_secrets()
+
+# Seconds main and its continuations spend on a run before handing the rest to a continuation task.
+# Leaves headroom under the default 60 s function timeout.
+DEFAULT_TIME_BUDGET_SECONDS = 45
+
+# Attempts for a tenant's reminder in a batched send_notification_worker task
+NOTIFICATION_MAX_ATTEMPTS = 3
+
+# Instances allowed to work through the per-company shards of a fanned-out run in parallel
+PROCESS_COMPANIES_MAX_INSTANCES = 10
+
+# Threads that prepare a reminder's invoice, email and SES client side by side, shared by the instance's invocations
+NOTIFICATION_PIPELINE_WORKERS = 8
+_notification_pipeline = ThreadPoolExecutor(max_workers=NOTIFICATION_PIPELINE_WORKERS, thread_name_prefix="notification-pipeline")
+
+# With EMAIL_OUTBOX, emails spooled during one window are sent by a drain task that runs at the window's end
+OUTBOX_DRAIN_WINDOW_SECONDS = 10
+_kicked_outbox_window = None
+
+def _reminder_key(tenant_data: dict, run_date: str = '') -> str:
+    """
+    Content key of a tenant reminder: the tenant and the payments it covers, on a given run date.
+    """
+    payment_ids = sorted(rental.get('payment_id', '') for rental in tenant_data.get('due_rentals', []))
+    return f"{run_date}:{tenant_data['tenant_info']['tenant_id']}:{','.join(payment_ids)}"
+
+def _receipt_key(data: dict) -> str:
+    """
+    Content key of a receipt email, from the payment it acknowledges, so a retried generate_receipt
+    request does not email the tenant twice.
+    """
+    fields = ('payment_id', 'id_number', 'tenant_email', 'property_name', 'date_paid', 'amount_paid', 'additional_info')
+    return json.dumps({field: data.get(field) for field in fields}, sort_keys=True)
+
+def process_statistics(statistics: dict, tenants: dict, days_window: int, run_id: str = None, deadline: float = None, today: date = None) -> list:
+    """
+    Classifies the given payments, then, company by company, enqueues the tenant reminders and applies
+    the due/overdue moves. Used by main for a whole run and by process_companies_worker for one shard.
+    With a `run_id`, each finished company is recorded for that run. With a `deadline`
+    (time.monotonic() value), processing stops before the first company that would start after it;
+    the first company is always processed, so every invocation makes progress.
+    `today` overrides the classification date (defaults to date.today()).
+    Returns the IDs of the companies left unprocessed, in processing order (empty when done).
+    """
+    # One pass over the payments produces every bucket acted on below
+    classification = classify_payments(statistics, tenants, days_window, today=today)
+    for company_id, totals in classification['company_totals'].items():
+        log.info(f"Company {company_id} transition totals - to due: {totals['pending_to_due']}, pending to overdue: {totals['pending_to_overdue']}, due to overdue: {totals['due_to_overdue']}")
+    grouped_due_rentals_by_tenant = classification['tenant_reminders']
+    payments_to_move_to_due = classification['pending_to_due']
+    payments_to_move_to_overdue = classification['pending_to_overdue']
+    payments_to_move_from_due_to_overdue = classification['due_to_overdue']
+    # landlord_due_rentals = classification['landlord_digest'] (requires classify_payments(..., companies=companies))
+
+    if grouped_due_rentals_by_tenant:
+        log.info(f"Found {len(grouped_due_rentals_by_tenant)} tenants with rent due exactly {days_window} days from now.")
+    else:
+        log.info(f"No tenants found with rent due exactly {days_window} days from now.")
+
+    # if landlord_due_rentals:
+    #     log.error(f"Found {len(landlord_due_rentals)} landlords with due rentals exactly {days_window} days from now.")
+    #     for landlord_email, rentals_list in landlord_due_rentals.items():
+    #         log.info(f"  - Sending summary email to landlord {landlord_email} for {len(rentals_list)} due rentals.")
+    #         log.error(f"Landlord email: {landlord_email}, Rentals: {rentals_list}, template_env: {template_env}")
+    #         send_landlord_summary_email(landlord_email, rentals_list, template_env)
+    # else:
+    #     log.info("No landlords found with due rentals for notification.")
+    
+    # --- Log the moves: pending to due, pending to overdue, due to overdue ---
+    if payments_to_move_to_due:
+        log.warning(f"Found {len(payments_to_move_to_due)} payments to move to due:")
+        for payment in payments_to_move_to_due:
+            log.warning(f"  - Payment: {payment['payment_id']} for company {payment['company_id']}, Due: {payment['payment_details'].get('dueDate')} (moving to due)")
+    else:
+        log.info("No payments to move to dueSoon.")
+
+    if payments_to_move_to_overdue:
+        log.warning(f"Found {len(payments_to_move_to_overdue)} payments to move to overdue:")
+        for payment in payments_to_move_to_overdue:
+            log.warning(f"  - Payment: {payment['payment_id']} for company {payment['company_id']}, Due: {payment['payment_details'].get('dueDate')}")
+    else:
+        log.info("No payments to move to overdue.")
+
+    if payments_to_move_from_due_to_overdue:
+        log.warning(f"Found {len(payments_to_move_from_due_to_overdue)} payments to move from due to overdue:")
+        for payment in payments_to_move_from_due_to_overdue:
+            log.warning(f"  - Payment: {payment['payment_id']} for company {payment['company_id']}, Due: {payment['payment_details'].get('dueDate')} (moving from due to overdue)")
+    else:
+        log.info("No payments to move from due to overdue.")
+
+    # A tenant's consolidated reminder belongs to the company of its rentals
+    reminders_by_company = {}
+    for tenant_data in grouped_due_rentals_by_tenant.values():
+        reminders_by_company.setdefault(tenant_data['due_rentals'][0]['company_id'], []).append(tenant_data)
+    transitions_by_company = group_transitions_by_company(classification)
+
+    run_date = (today or date.today()).isoformat()
+    # Tenants per send_notification_worker task; the default of 1 keeps one task per tenant
+    reminder_batch_size = int(os.environ.get('REMINDER_BATCH_SIZE', 1))
+    reminder_options = {'batch_size': reminder_batch_size} if reminder_batch_size > 1 else {}
+    # Reminder tasks per second released by the queue across the whole run; 0 dispatches them all at once
+    reminder_dispatch_rate = float(os.environ.get('REMINDER_DISPATCH_RATE', 0))
+    reminder_dispatch_deadline = int(os.environ.get('REMINDER_DISPATCH_DEADLINE_SECONDS', 0))
+    if reminder_dispatch_deadline:
+        reminder_options['dispatch_deadline_seconds'] = reminder_dispatch_deadline
+    next_dispatch_time = None # Where the next company's reminders continue the paced schedule
+
+    company_ids = list(statistics.keys())
+    idle_company_ids = [] # Companies with nothing to send or move; recorded in one write at the end
+    for position, company_id in enumerate(company_ids):
+        if deadline is not None and position > 0 and time.monotonic() >= deadline:
+            if run_id:
+                mark_companies_completed(run_id, idle_company_ids)
+            return company_ids[position:]
+
+        reminders = reminders_by_company.get(company_id)
+        transitions = transitions_by_company.get(company_id)
+        if not reminders and not transitions:
+            idle_company_ids.append(company_id)
+            continue
+
+        if reminders:
+            reminder_pacing = {}
+            if reminder_dispatch_rate > 0:
+                now = datetime.now(SCHEDULER_TIMEZONE)
+                next_dispatch_time = max(next_dispatch_time or now, now)
+                reminder_pacing = {'schedule_time': next_dispatch_time, 'dispatch_rate': reminder_dispatch_rate}
+                task_count = -(-len(reminders) // reminder_batch_size) if reminder_batch_size > 1 else len(reminders)
+                next_dispatch_time += timedelta(seconds=task_count / reminder_dispatch_rate)
+            # Enqueue each tenant's consolidated reminder as a single task
+            results = enqueue_tasks(
+                reminders, 
+                target_function="send_notification_worker", 
+                task_name_prefix="send-notification-",
+                task_key=lambda tenant_data: _reminder_key(tenant_data, run_date),
+                **reminder_options,
+                **reminder_pacing,
+            )
+            for tenant_data, result in zip(reminders, results):
+                if result['status'] == 'failed':
+                    log.error(f"  - Failed to enqueue reminder for Tenant ID: {tenant_data['tenant_info']['tenant_id']}: {result['error']}")
+                else:
+                    log.info(f"  - Enqueued consolidated reminder for Tenant ID: {tenant_data['tenant_info']['tenant_id']}, Name: {tenant_data['tenant_info']['name']}")
+
+        # --- Apply all of the company's moves in one multi-location write ---
+        apply_payment_transitions(company_id, transitions or [], run_id=run_id)
+
+    if run_id:
+        mark_companies_completed(run_id, idle_company_ids)
+    return []
+
 @scheduler_fn.on_schedule(
     schedule="0 3 * * *",
     timezone=scheduler_fn.Timezone("Africa/Johannesburg"),
@@ -59,155 +233,645 @@ def main(event: scheduler_fn.ScheduledEvent) -> None:
     """
     log.info("Starting scheduled processing function.")
     days_window = int(os.environ.get('DUE_DATE_WINDOW_DAYS', 7))
+    if os.environ.get('EVENT_DRIVEN_TRANSITIONS', 'false').lower() == 'true':
+        # Each pending payment has Cloud Tasks scheduled for its own transition moments
+        log.info("Transitions are event-driven; skipping the daily scan.")
+        return
+
+    fanout_batch_size = int(os.environ.get('SCHEDULER_FANOUT_BATCH_SIZE', 0))
+    if fanout_batch_size > 0:
+        # Coordinator mode: the companies are processed by process_companies_worker instances
+        fan_out_companies(fanout_batch_size)
+        return
+
+    run_scheduler(date.today().isoformat(), days_window)
+
+def run_scheduler(run_id: str, days_window: int, sequence: int = 0) -> bool:
+    """
+    Loads the scheduler data and processes every company not yet finished in the run `run_id`.
+    If the time budget runs out first, the cursor is saved and a continuation task is enqueued
+    to continue_scheduler_run, which calls this again with the same run_id and the next `sequence`
+    number (0 for the run started by main).
+    Returns False if a needed continuation could not be enqueued, so the caller can have it retried.
+    """
+    deadline = time.monotonic() + float(os.environ.get('SCHEDULER_TIME_BUDGET_SECONDS', DEFAULT_TIME_BUDGET_SECONDS))
+    use_due_date_index = os.environ.get('USE_DUE_DATE_INDEX', 'false').lower() == 'true'
     
-    statistics = get_all_statistics()
-    tenants = get_all_tenants()
-    companies = get_all_companies() # Fetch company data
-    accounts = get_all_accounts()
-    log.info(f"Fetched data - Statistics: {len(statistics)}, Tenants: {bool(tenants)}, Companies: {bool(companies)}, Accounts: {bool(accounts)}")
-    if statistics and tenants and companies and accounts:
-        grouped_due_rentals_by_tenant = get_due_rentals_by_tenant(statistics, tenants, days_window)
-        payments_to_move_to_due = get_payments_to_move_to_due(statistics, days_window)
-        payments_to_move_to_overdue = get_payments_to_move_to_overdue(statistics)
-        # landlord_due_rentals = get_due_rentals_by_landlord(statistics, tenants, companies, days_window)
-
-        if grouped_due_rentals_by_tenant:
-            log.info(f"Found {len(grouped_due_rentals_by_tenant)} tenants with rent due exactly {days_window} days from now:")
-            # Enqueue each tenant's consolidated reminder as a single task
-            enqueue_tasks(
-                list(grouped_due_rentals_by_tenant.values()), 
-                target_function="send_notification_worker", 
-                task_name_prefix="send-notification-",
+    if use_due_date_index:
+        # Read only the payments due on or before the end of the reminder window from the index
+        load_statistics = lambda: get_payment_tracking_in_window(date.today() + timedelta(days=days_window))
+    else:
+        # Only pending/due payment tracking is needed; the rest of the Statistics tree is never read here.
+        load_statistics = get_payment_tracking
+    loaders = {
+        'statistics': load_statistics,
+        'tenants': get_all_tenants,
+        'companies': get_all_companies,
+        'accounts': get_all_accounts, # Loaded only if something asks for it
+        'completed_companies': lambda: get_completed_companies(run_id),
+    }
+    with DataContext(loaders) as data:
+        # The subtrees every run needs are read concurrently
+        data.prefetch('statistics', 'tenants', 'companies', 'completed_companies')
+        statistics = data['statistics']
+        tenants = data['tenants']
+        companies = data['companies']
+        completed_companies = data['completed_companies']
+    log.info(f"Fetched data - Statistics: {len(statistics)}, Tenants: {bool(tenants)}, Companies: {bool(companies)}")
+    if completed_companies:
+        # Companies finished earlier in this run were already reminded and transitioned
+        statistics = {company_id: stats for company_id, stats in statistics.items() if company_id not in completed_companies}
+        log.info(f"Resuming run {run_id}: skipping {len(completed_companies)} completed companies, {len(statistics)} left.")
+        if not statistics:
+            complete_scheduler_run(run_id)
+            log.info(f"Scheduler run {run_id} was already complete.")
+            return True
+    if statistics and tenants and companies:
+        remaining_company_ids = process_statistics(statistics, tenants, days_window, run_id=run_id, deadline=deadline)
+        if remaining_company_ids:
+            save_scheduler_cursor(run_id, remaining_company_ids[0], len(remaining_company_ids))
+            # Named after its place in the chain, so it never matches the task running now, while a
+            # retried invocation of this step still enqueues the same continuation only once
+            results = enqueue_tasks(
+                [{'run_id': run_id, 'sequence': sequence + 1}],
+                target_function="continue_scheduler_run",
+                task_name_prefix="continue-scheduler-run-",
+                task_key=lambda payload: f"{run_id}:{payload['sequence']}",
             )
-            for tenant_id, tenant_data in grouped_due_rentals_by_tenant.items():
-                log.info(f"  - Enqueued consolidated reminder for Tenant ID: {tenant_id}, Name: {tenant_data['tenant_info']['name']}")
+            if results[0]['status'] == 'failed':
+                log.error(f"Time budget used up in run {run_id}; {len(remaining_company_ids)} companies left, but the continuation could not be enqueued: {results[0]['error']}")
+                return False
+            log.warning(f"Time budget used up in run {run_id}; {len(remaining_company_ids)} companies left, continuation {sequence + 1} enqueued.")
         else:
-            log.info(f"No tenants found with rent due exactly {days_window} days from now.")
-
-        # if landlord_due_rentals:
-        #     log.error(f"Found {len(landlord_due_rentals)} landlords with due rentals exactly {days_window} days from now.")
-        #     for landlord_email, rentals_list in landlord_due_rentals.items():
-        #         log.info(f"  - Sending summary email to landlord {landlord_email} for {len(rentals_list)} due rentals.")
-        #         log.error(f"Landlord email: {landlord_email}, Rentals: {rentals_list}, template_env: {template_env}")
-        #         send_landlord_summary_email(landlord_email, rentals_list, template_env)
-        # else:
-        #     log.info("No landlords found with due rentals for notification.")
-        
-        # --- Move pending to due ---
-        if payments_to_move_to_due:
-            log.warning(f"Found {len(payments_to_move_to_due)} payments to move to due:")
-            for payment in payments_to_move_to_due:
-                log.warning(f"  - Payment: {payment['payment_id']} for company {payment['company_id']}, Due: {payment['payment_details'].get('dueDate')} (moving to due)")
-                move_pending_to_due(payment['company_id'], payment['payment_id'], payment['payment_details'], payment['payment_details']['tenantId'])
-        else:
-            log.info("No payments to move to dueSoon.")
-
-        # --- Move payments from pending to overdue ---
-        if payments_to_move_to_overdue:
-            log.warning(f"Found {len(payments_to_move_to_overdue)} payments to move to overdue:")
-            for payment in payments_to_move_to_overdue:
-                log.warning(f"  - Payment: {payment['payment_id']} for company {payment['company_id']}, Due: {payment['payment_details'].get('dueDate')}")
-                move_payment_to_overdue(payment['company_id'], payment['payment_id'], payment['payment_details'], source_tracking_node='pending')
-        else:
-            log.info("No payments to move to overdue.")
-
-        # --- Move payments from due to overdue ---
-        payments_to_move_from_due_to_overdue = get_payments_to_move_from_due_to_overdue(statistics)
-        if payments_to_move_from_due_to_overdue:
-            log.warning(f"Found {len(payments_to_move_from_due_to_overdue)} payments to move from due to overdue:")
-            for payment in payments_to_move_from_due_to_overdue:
-                log.warning(f"  - Payment: {payment['payment_id']} for company {payment['company_id']}, Due: {payment['payment_details'].get('dueDate')} (moving from due to overdue)")
-                move_payment_to_overdue(payment['company_id'], payment['payment_id'], payment['payment_details'], source_tracking_node='due')
-        else:
-            log.info("No payments to move from due to overdue.")
-
+            complete_scheduler_run(run_id)
+            log.info(f"Scheduler run {run_id} complete.")
     else:
         log.info("No statistics, tenants, or companies data found in the database. Exiting.")
+    return True
 
 @https_fn.on_request()
-def send_notification_worker(req: https_fn.Request) -> https_fn.Response:
+def continue_scheduler_run(req: https_fn.Request) -> https_fn.Response:
     """
-    HTTP-triggered function that receives a tenant's consolidated info and sends a notification.
+    HTTP-triggered function that resumes a scheduler run that ran out of time.
+    Receives {'run_id': ..., 'sequence': n} from run_scheduler.
     """
-    tenant_id_for_logging = "UNKNOWN_TENANT" # Initialize for logging
+    payload = req.get_json(silent=True) or {}
+    run_id = payload.get('run_id')
+    if not run_id:
+        log.error("No run_id in request body.")
+        return https_fn.Response("No run_id received", status=400)
+
     try:
-        tenant_consolidated_info = req.get_json(silent=True)
-        if not tenant_consolidated_info:
-            log.error("No tenant data in request body.")
-            return https_fn.Response("No data received", status=400)
-        
-        tenant_info = tenant_consolidated_info.get('tenant_info', {})
-        tenant_id_for_logging = tenant_info.get('tenant_id', "UNKNOWN_TENANT_ID_IN_PAYLOAD")
-        id_number = tenant_info.get('idNumber')
+        if not run_scheduler(run_id, int(os.environ.get('DUE_DATE_WINDOW_DAYS', 7)), sequence=payload.get('sequence', 1)):
+            # Let Cloud Tasks retry this step; completed companies are skipped on the retry
+            return https_fn.Response("Failed to enqueue the next continuation.", status=500)
+        return https_fn.Response("Run continued.", status=200)
+    except Exception as e:
+        log.error(f"An unexpected error occurred in continue_scheduler_run for run {run_id}: {e}")
+        return https_fn.Response("An error occurred.", status=500)
 
-        if not id_number:
-            log.error(f"Missing idNumber for tenant {tenant_id_for_logging}. Cannot upload invoice.")
-            # Decide if you want to stop or continue without the PDF
-            return https_fn.Response("Missing idNumber for tenant.", status=400)
+def fan_out_companies(batch_size: int) -> None:
+    """
+    Lists the company IDs and enqueues one process_companies_worker task per batch of companies.
+    """
+    company_ids = get_company_ids()
+    if not company_ids:
+        log.info("No companies found in the database. Exiting.")
+        return
+
+    batches = [{'company_ids': company_ids[i:i + batch_size]} for i in range(0, len(company_ids), batch_size)]
+    run_date = date.today().isoformat()
+    enqueue_tasks(
+        batches,
+        target_function="process_companies_worker",
+        task_name_prefix="process-companies-",
+        task_key=lambda batch: f"{run_date}:{','.join(batch['company_ids'])}",
+    )
+    log.info(f"Enqueued {len(batches)} tasks for {len(company_ids)} companies ({batch_size} per task).")
+
+@https_fn.on_request(max_instances=PROCESS_COMPANIES_MAX_INSTANCES)
+def process_companies_worker(req: https_fn.Request) -> https_fn.Response:
+    """
+    HTTP-triggered function that runs classification, reminders and transitions for one shard of companies.
+    Receives {'company_ids': [...]} from the main coordinator.
+    """
+    payload = req.get_json(silent=True)
+    company_ids = (payload or {}).get('company_ids')
+    if not company_ids:
+        log.error("No company_ids in request body.")
+        return https_fn.Response("No company_ids received", status=400)
 
-        # Fetch companies data to get landlord emails for CC
-        all_companies = get_all_companies()
-        cc_recipients = set() # Use a set to store unique CC emails
-        
-        for rental in tenant_consolidated_info.get('due_rentals', []):
-            company_id = rental.get('company_id')
-            if company_id and all_companies and all_companies.get(company_id):
-                landlord_email = all_companies[company_id].get('contactEmail')
-                if landlord_email:
-                    cc_recipients.add(landlord_email)
+    try:
+        days_window = int(os.environ.get('DUE_DATE_WINDOW_DAYS', 7))
+        loaders = {
+            'statistics': lambda: get_payment_tracking(company_ids),
+            'tenants': lambda: get_tenants_for_companies(company_ids),
+        }
+        with DataContext(loaders) as data:
+            data.prefetch('statistics', 'tenants')
+            statistics = data['statistics']
+            tenants = data['tenants']
+        log.info(f"Processing shard of {len(company_ids)} companies - Statistics: {len(statistics)}, Tenants: {len(tenants)}")
+        if statistics and tenants:
+            process_statistics(statistics, tenants, days_window)
+        return https_fn.Response("Shard processed.", status=200)
 
-        # Create the consolidated invoice PDF
-        invoice_pdf_bytes, invoice_number = create_invoice_pdf(tenant_consolidated_info)
+    except Exception as e:
+        log.error(f"An unexpected error occurred in process_companies_worker for companies {company_ids}: {e}")
+        return https_fn.Response("An error occurred.", status=500)
+
+@scheduler_fn.on_schedule(
+    schedule="0 2 * * 0",
+    timezone=scheduler_fn.Timezone("Africa/Johannesburg"),
+)
+def rebuild_due_date_index(event: scheduler_fn.ScheduledEvent) -> None:
+    """
+    Weekly job that rebuilds the PaymentsByDueDate index from the payment tracking nodes and, with
+    EVENT_DRIVEN_TRANSITIONS, re-arms the payments' transition tasks.
+    Run it manually once before enabling USE_DUE_DATE_INDEX or EVENT_DRIVEN_TRANSITIONS.
+    """
+    indexed_count = backfill_due_date_index()
+    log.info(f"Due-date index rebuild complete: {indexed_count} payments indexed.")
+
+    if os.environ.get('EVENT_DRIVEN_TRANSITIONS', 'false').lower() == 'true':
+        # Re-arm every pending and due payment; this also arms payments written before the flag was enabled.
+        # The tasks are keyed by their moment, so the ones still queued from earlier runs are not created again.
+        days_window = int(os.environ.get('DUE_DATE_WINDOW_DAYS', 7))
+        now = datetime.now(SCHEDULER_TIMEZONE)
+        planned = []
+        payment_count = 0
+        for company_id, company_stats in get_payment_tracking().items():
+            for tracking_node, payments in company_stats['paymentTracking'].items():
+                for payment_id, payment_details in payments.items():
+                    planned.extend(_plan_payment_transitions(company_id, payment_id, payment_details, tracking_node, days_window, now))
+                    payment_count += 1
+        results = _enqueue_payment_transitions(planned)
+        created_count = sum(1 for result in results if result['status'] == 'created')
+        log.info(f"Re-armed transition tasks for {payment_count} payments: {created_count} of {len(planned)} tasks created.")
+
+@db_fn.on_value_written(reference=STATISTICS_PATH + "/{companyId}/paymentTracking/pending/{paymentId}")
+def index_pending_payment(event: db_fn.Event[db_fn.Change]) -> None:
+    """
+    Keeps the due-date index in step with writes to pending payments.
+    """
+    sync_due_date_index(event.params['companyId'], event.params['paymentId'], 'pending', event.data.before, event.data.after)
 
-        # Create the consolidated invoice PDF
-        invoice_pdf_bytes, invoice_number = create_invoice_pdf(tenant_consolidated_info)
+@db_fn.on_value_written(reference=STATISTICS_PATH + "/{companyId}/paymentTracking/due/{paymentId}")
+def index_due_payment(event: db_fn.Event[db_fn.Change]) -> None:
+    """
+    Keeps the due-date index in step with writes to due payments.
+    """
+    sync_due_date_index(event.params['companyId'], event.params['paymentId'], 'due', event.data.before, event.data.after)
 
-        # Upload the invoice PDF to storage
-        cloud_storage_path = upload_to_storage(invoice_pdf_bytes, id_number, invoice_number, file_type="invoices")
-        if not cloud_storage_path:
-            log.error(f"Failed to upload invoice PDF for tenant {tenant_id_for_logging}.")
-            return https_fn.Response("Failed to upload invoice PDF.", status=500)
+def _plan_payment_transitions(company_id: str, payment_id: str, payment_details: dict, tracking_node: str, days_window: int, now: datetime) -> list:
+    """
+    Returns the (payload, schedule_time) pairs of a payment's payment_transition_worker tasks, see plan_transition_tasks.
+    """
+    return [
+        ({'company_id': company_id, 'payment_id': payment_id, 'moment': task['moment'].isoformat(), 'rearm': task['rearm']}, task['schedule_time'])
+        for task in plan_transition_tasks(payment_details, days_window, now, tracking_node)
+    ]
 
-        # --- Store invoice info in the payment node ---
-        # We will use the first due rental's info to identify the payment node
-        if not tenant_consolidated_info.get('due_rentals'):
-            log.error(f"No due rentals found for tenant {tenant_id_for_logging}. Cannot store invoice info.")
-            return https_fn.Response("No due rentals for invoice.", status=400)
+def _enqueue_payment_transitions(planned: list) -> list:
+    """
+    Enqueues planned (payload, schedule_time) pairs in one enqueue_tasks call and returns its results.
+    """
+    if not planned:
+        return []
+    payloads, schedule_times = (list(values) for values in zip(*planned))
+    results = enqueue_tasks(
+        payloads,
+        target_function="payment_transition_worker",
+        task_name_prefix="payment-transition-",
+        schedule_time=schedule_times,
+        # Planning the same payment again schedules the same tasks only once
+        task_key=lambda payload: f"{payload['company_id']}:{payload['payment_id']}:{payload['moment']}:{payload['rearm']}",
+    )
+    for payload, schedule_time, result in zip(payloads, schedule_times, results):
+        if result['status'] == 'failed':
+            log.error(f"Failed to schedule transition task for payment {payload['payment_id']} of company {payload['company_id']}: {result['error']}")
+        elif result['status'] == 'created':
+            log.info(f"Scheduled {'re-arm' if payload['rearm'] else 'transition'} task for payment {payload['payment_id']} of company {payload['company_id']} at {schedule_time.isoformat()}")
+    return results
+
+def schedule_payment_transitions(company_id: str, payment_id: str, payment_details: dict, tracking_node: str = 'pending') -> None:
+    """
+    Enqueues payment_transition_worker tasks for the moments a payment enters the due window and becomes overdue.
+    """
+    days_window = int(os.environ.get('DUE_DATE_WINDOW_DAYS', 7))
+    now = datetime.now(SCHEDULER_TIMEZONE)
+    _enqueue_payment_transitions(_plan_payment_transitions(company_id, payment_id, payment_details, tracking_node, days_window, now))
 
-        first_rental = tenant_consolidated_info['due_rentals'][0]
-        company_id_for_payment = first_rental.get('company_id')
-        payment_id_for_payment = first_rental.get('payment_id')
-        tenant_id_for_payment = tenant_info.get('tenant_id') # Use the tenantId from tenant_info
+@db_fn.on_value_written(reference=STATISTICS_PATH + "/{companyId}/paymentTracking/pending/{paymentId}")
+def schedule_pending_payment_transitions(event: db_fn.Event[db_fn.Change]) -> None:
+    """
+    With EVENT_DRIVEN_TRANSITIONS, schedules a pending payment's due/overdue transitions when it is
+    created or its due date changes. Tasks for a payment that is later paid or moved are ignored by the worker.
+    """
+    if os.environ.get('EVENT_DRIVEN_TRANSITIONS', 'false').lower() != 'true':
+        return
+    before, after = event.data.before, event.data.after
+    if not after:
+        return
+    if before and before.get('dueDate') == after.get('dueDate'):
+        return
+    schedule_payment_transitions(event.params['companyId'], event.params['paymentId'], after)
 
-        if not company_id_for_payment or not payment_id_for_payment or not tenant_id_for_payment:
-            log.error(f"Missing identifiers for payment node for tenant {tenant_id_for_logging}. Cannot store invoice info.")
-            return https_fn.Response("Missing payment identifiers.", status=400)
+@https_fn.on_request()
+def payment_transition_worker(req: https_fn.Request) -> https_fn.Response:
+    """
+    HTTP-triggered function that applies whatever transition is due for one payment right now.
+    Receives {'company_id', 'payment_id', 'rearm'} from schedule_payment_transitions. The payment is
+    re-read and classified as of today, so stale tasks (payment paid, moved or rescheduled) do nothing.
+    A rental payment entering its reminder window schedules its tenant's reminder for that due date.
+    """
+    payload = req.get_json(silent=True) or {}
+    company_id = payload.get('company_id')
+    payment_id = payload.get('payment_id')
+    if not company_id or not payment_id:
+        log.error("Missing company_id or payment_id in request body.")
+        return https_fn.Response("Missing identifiers.", status=400)
 
-        rt_db_path = f"HomeHive/PropertyManagement/Accounts/{company_id_for_payment}/{tenant_id_for_payment}/payments/{payment_id_for_payment}/invoice"
-        ref = db.reference(rt_db_path)
+    try:
+        payment_tracking = get_payment_tracking_for_payment(company_id, payment_id)
+        if not payment_tracking:
+            log.info(f"Payment {payment_id} of company {company_id} is no longer pending or due. Ignoring task.")
+            return https_fn.Response("Nothing to do.", status=200)
+
+        days_window = int(os.environ.get('DUE_DATE_WINDOW_DAYS', 7))
+        today = datetime.now(SCHEDULER_TIMEZONE).date()
+        # Tenants are not needed to classify the move; the reminder looks up its own tenant
+        classification = classify_payments({company_id: {'paymentTracking': payment_tracking}}, {}, days_window, today=today)
+        # The reminder is scheduled before the move, so a retry after a failed enqueue still sees the payment pending
+        for payment in classification['pending_to_due']:
+            if not _schedule_tenant_reminder(company_id, payment['payment_details']):
+                return https_fn.Response("Failed to schedule the tenant reminder.", status=500)
+        transitions = group_transitions_by_company(classification).get(company_id)
+        if transitions:
+            apply_payment_transitions(company_id, transitions)
+
+        if payload.get('rearm'):
+            for tracking_node, payments in payment_tracking.items():
+                schedule_payment_transitions(company_id, payment_id, payments[payment_id], tracking_node)
+        return https_fn.Response("Payment processed.", status=200)
+
+    except Exception as e:
+        log.error(f"An unexpected error occurred in payment_transition_worker for payment {payment_id}: {e}")
+        return https_fn.Response("An error occurred.", status=500)
+
+def _schedule_tenant_reminder(company_id: str, payment_details: dict) -> bool:
+    """
+    Enqueues the tenant_reminder_worker task for a rental payment's tenant and due date. The task is
+    named after the tenant and due date, so the payments a tenant has due on the same day share one
+    consolidated reminder, as in the daily scan. Returns False if the task could not be enqueued.
+    """
+    tenant_id = payment_details.get('tenantId')
+    if payment_details.get('paymentType') != 0 or not tenant_id:
+        return True
+    due_date = datetime.strptime(payment_details['dueDate'].strip(), '%d/%m/%Y').date().isoformat()
+    results = enqueue_tasks(
+        [{'company_id': company_id, 'tenant_id': tenant_id, 'due_date': due_date}],
+        target_function="tenant_reminder_worker",
+        task_name_prefix="tenant-reminder-",
+        task_key=lambda payload: f"{payload['company_id']}:{payload['tenant_id']}:{payload['due_date']}",
+    )
+    if results[0]['status'] == 'failed':
+        log.error(f"Failed to enqueue the reminder for tenant {tenant_id} of company {company_id} due {due_date}: {results[0]['error']}")
+        return False
+    log.info(f"Enqueued the reminder for tenant {tenant_id} of company {company_id} due {due_date} ({results[0]['status']})")
+    return True
+
+@https_fn.on_request()
+def tenant_reminder_worker(req: https_fn.Request) -> https_fn.Response:
+    """
+    HTTP-triggered function that sends one tenant a consolidated reminder for all their rental payments
+    in a company due on a date, pending or already moved to due.
+    Receives {'company_id', 'tenant_id', 'due_date' (ISO date)} from payment_transition_worker. Only that
+    tenant's record and payments are read.
+    """
+    payload = req.get_json(silent=True) or {}
+    company_id = payload.get('company_id')
+    tenant_id = payload.get('tenant_id')
+    due_date = payload.get('due_date')
+    if not company_id or not tenant_id or not due_date:
+        log.error("Missing company_id, tenant_id or due_date in request body.")
+        return https_fn.Response("Missing identifiers.", status=400)
+
+    try:
+        # The landlord emails are only needed by the email, so they are looked up in the background
+        contact_emails = _notification_pipeline.submit(get_company_contact_emails, [company_id])
+        tenant_future = _notification_pipeline.submit(get_tenant, company_id, tenant_id)
+        payment_tracking = get_tenant_payment_tracking(company_id, tenant_id)
+        reminder = build_tenant_reminder(company_id, tenant_id, tenant_future.result(), payment_tracking, date.fromisoformat(due_date))
+        if not reminder:
+            log.info(f"Tenant {tenant_id} of company {company_id} has no rental payments due {due_date}. Ignoring task.")
+            return https_fn.Response("Nothing to do.", status=200)
+
+        status, message = _send_tenant_notification(reminder, contact_emails)
+        return https_fn.Response(message, status=status)
+
+    except Exception as e:
+        log.error(f"An unexpected error occurred in tenant_reminder_worker for tenant {tenant_id}: {e}")
+        return https_fn.Response("An error occurred.", status=500)
+
+def _render_and_store_invoice(ref, tenant_consolidated_info: dict, content_hash: str) -> bytes | None:
+    """
+    Renders a tenant's consolidated invoice, uploads it to Storage and records its path and content hash
+    in the payment's invoice node `ref`. Returns the PDF bytes, or None if the upload failed.
+    """
+    invoice_pdf_bytes, invoice_number = create_invoice_pdf(tenant_consolidated_info)
+    id_number = tenant_consolidated_info.get('tenant_info', {}).get('idNumber')
+    cloud_storage_path = upload_to_storage(invoice_pdf_bytes, id_number, invoice_number, file_type="invoices")
+    if not cloud_storage_path:
+        return None
+
+    ref.set({
+        'cloudStoragePath': cloud_storage_path,
+        'invoice_number': invoice_number,
+        'contentHash': content_hash,
+        'created_at': datetime.now().isoformat()
+    })
+    return invoice_pdf_bytes
+
+def _timed(timings: dict, stage: str, fn, *args, **kwargs):
+    """Calls fn and records how long it took under `stage` in `timings`."""
+    start = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        timings[stage] = time.perf_counter() - start
+
+def _store_invoice(rt_db_path: str, tenant_consolidated_info: dict) -> bool:
+    """
+    Makes sure the payment's invoice node at `rt_db_path` holds the tenant's current invoice.
+    Returns False if the invoice could not be uploaded.
+    """
+    ref = db.reference(rt_db_path)
+
+    # A retry or duplicate task finds the invoice it already stored and skips rendering and upload
+    content_hash = invoice_content_hash(tenant_consolidated_info)
+    existing_invoice = ref.get()
+    if existing_invoice and existing_invoice.get('contentHash') == content_hash and (existing_invoice.get('cloudStoragePath') or existing_invoice.get('invoiceInputs')):
+        log.info(f"Invoice at {rt_db_path} is unchanged; reusing it")
+    elif os.environ.get('LAZY_INVOICE_GENERATION', 'false').lower() == 'true':
+        # Only the inputs are stored; get_invoice renders the PDF when the tenant first opens the link
         ref.set({
-            'cloudStoragePath': cloud_storage_path,
-            'invoice_number': invoice_number,
+            'invoiceInputs': tenant_consolidated_info,
+            'contentHash': content_hash,
             'created_at': datetime.now().isoformat()
         })
+        log.info(f"Stored invoice inputs in RTDB at: {rt_db_path}")
+    else:
+        if not _render_and_store_invoice(ref, tenant_consolidated_info, content_hash):
+            return False
         log.info(f"Stored invoice info in RTDB at: {rt_db_path}")
+    return True
+
+def _cc_recipients(tenant_consolidated_info: dict, contact_emails: dict) -> list:
+    """Returns the landlord emails to CC on a tenant's reminder, one per company."""
+    cc_recipients = set() # Use a set to store unique CC emails
+    for rental in tenant_consolidated_info.get('due_rentals', []):
+        landlord_email = contact_emails.get(rental.get('company_id'))
+        if landlord_email:
+            cc_recipients.add(landlord_email)
+    return sorted(cc_recipients)
+
+def _build_reminder_email(tenant_consolidated_info: dict, contact_emails, invoice_url: str) -> dict | None:
+    """
+    Builds the tenant's reminder email, CCing the landlords of its rentals.
+    `contact_emails` is a {company_id: email} dict, or a Future of one that is still being looked up.
+    """
+    if isinstance(contact_emails, Future):
+        contact_emails = contact_emails.result()
+    return build_tenant_summary_email(tenant_consolidated_info, template_env, invoice_url=invoice_url, cc_recipients=_cc_recipients(tenant_consolidated_info, contact_emails))
 
-        # Construct the URL to the get_invoice Cloud Function
-        cloud_function_base_url = os.environ.get('CLOUD_FUNCTION_BASE_URL', 'https://us-central1-homehive-8c7d4.cloudfunctions.net')
-        invoice_url = f"{cloud_function_base_url}/get_invoice?companyId={company_id_for_payment}&tenantId={tenant_id_for_payment}&paymentId={payment_id_for_payment}"
+def _invoice_location(tenant_consolidated_info: dict) -> tuple:
+    """
+    Finds where a tenant's consolidated invoice is stored and linked from.
+    Returns (error, rt_db_path, invoice_url); error is a (4xx status, message) pair if the payload cannot be used, else None.
+    """
+    tenant_info = tenant_consolidated_info.get('tenant_info', {})
+    tenant_id_for_logging = tenant_info.get('tenant_id', "UNKNOWN_TENANT_ID_IN_PAYLOAD")
+    id_number = tenant_info.get('idNumber')
+
+    if not id_number:
+        log.error(f"Missing idNumber for tenant {tenant_id_for_logging}. Cannot upload invoice.")
+        # Decide if you want to stop or continue without the PDF
+        return (400, "Missing idNumber for tenant."), None, None
+
+    # --- Store invoice info in the payment node ---
+    # We will use the first due rental's info to identify the payment node
+    if not tenant_consolidated_info.get('due_rentals'):
+        log.error(f"No due rentals found for tenant {tenant_id_for_logging}. Cannot store invoice info.")
+        return (400, "No due rentals for invoice."), None, None
+
+    first_rental = tenant_consolidated_info['due_rentals'][0]
+    company_id_for_payment = first_rental.get('company_id')
+    payment_id_for_payment = first_rental.get('payment_id')
+    tenant_id_for_payment = tenant_info.get('tenant_id') # Use the tenantId from tenant_info
+
+    if not company_id_for_payment or not payment_id_for_payment or not tenant_id_for_payment:
+        log.error(f"Missing identifiers for payment node for tenant {tenant_id_for_logging}. Cannot store invoice info.")
+        return (400, "Missing payment identifiers."), None, None
+
+    rt_db_path = f"HomeHive/PropertyManagement/Accounts/{company_id_for_payment}/{tenant_id_for_payment}/payments/{payment_id_for_payment}/invoice"
+
+    # Construct the URL to the get_invoice Cloud Function
+    cloud_function_base_url = os.environ.get('CLOUD_FUNCTION_BASE_URL', 'https://us-central1-homehive-8c7d4.cloudfunctions.net')
+    invoice_url = f"{cloud_function_base_url}/get_invoice?companyId={company_id_for_payment}&tenantId={tenant_id_for_payment}&paymentId={payment_id_for_payment}"
+    return None, rt_db_path, invoice_url
+
+def _kick_outbox_drainer() -> None:
+    """
+    Makes sure a drain_outbox_worker task runs at the end of the current OUTBOX_DRAIN_WINDOW_SECONDS window.
+    The task is named after the window, so every instance spooling in it shares one task, and a warm
+    instance enqueues it only once per window.
+    """
+    global _kicked_outbox_window
+    window = int(time.time() // OUTBOX_DRAIN_WINDOW_SECONDS)
+    if window == _kicked_outbox_window:
+        return
+    results = enqueue_tasks(
+        [{'window': window}],
+        target_function="drain_outbox_worker",
+        task_name_prefix="drain-outbox-",
+        schedule_time=datetime.fromtimestamp((window + 1) * OUTBOX_DRAIN_WINDOW_SECONDS, tz=timezone.utc),
+        task_key=lambda payload: str(payload['window']),
+    )
+    if results[0]['status'] != 'failed':
+        _kicked_outbox_window = window
+
+def _deliver_email(message: dict, ses_client=None, key: str = None) -> bool:
+    """
+    Sends a built message through SES, or with EMAIL_OUTBOX spools it for drain_outbox_worker and returns
+    without waiting on SES. `key` makes spooling idempotent (see spool_email).
+    Returns True if the message was sent or spooled.
+    """
+    if outbox_enabled():
+        if spool_email(message, key) is None:
+            return False
+        _kick_outbox_drainer()
+        return True
 
+    if ses_client is None:
+        ses_client = create_ses_client()
+    return ses_client is not None and send_raw_email(message, ses_client)
 
-        # Call the email service to send the reminder with the consolidated invoice attached
-        success = send_tenant_summary_email(tenant_consolidated_info, template_env, invoice_url=invoice_url, cc_recipients=list(cc_recipients))
+def _send_tenant_notification(tenant_consolidated_info: dict, contact_emails, ses_client=None) -> tuple:
+    """
+    Creates, stores and emails one tenant's consolidated invoice reminder.
+    `contact_emails` is the {company_id: landlord email} lookup, or a Future of it.
+    Returns (HTTP status code, message); 4xx means the payload itself is unusable and retrying won't help.
+    """
+    tenant_id_for_logging = "UNKNOWN_TENANT" # Initialize for logging
+    try:
+        tenant_id_for_logging = tenant_consolidated_info.get('tenant_info', {}).get('tenant_id', "UNKNOWN_TENANT_ID_IN_PAYLOAD")
+        error, rt_db_path, invoice_url = _invoice_location(tenant_consolidated_info)
+        if error:
+            return error
+
+        # The invoice, the email and the SES credentials don't depend on each other, so they are prepared
+        # concurrently; the email only goes out once the invoice it links to is stored.
+        # With the outbox the email is spooled instead, and the drainer brings its own SES client.
+        use_outbox = outbox_enabled()
+        timings = {}
+        start = time.perf_counter()
+        invoice_future = _notification_pipeline.submit(_timed, timings, 'invoice', _store_invoice, rt_db_path, tenant_consolidated_info)
+        email_future = _notification_pipeline.submit(_timed, timings, 'email', _build_reminder_email, tenant_consolidated_info, contact_emails, invoice_url)
+        ses_client_future = None
+        if ses_client is None and not use_outbox:
+            ses_client_future = _notification_pipeline.submit(_timed, timings, 'ses_client', create_ses_client)
+
+        invoice_stored = invoice_future.result()
+        message = email_future.result()
+        if ses_client_future is not None:
+            ses_client = ses_client_future.result()
+
+        if not invoice_stored:
+            log.error(f"Failed to upload invoice PDF for tenant {tenant_id_for_logging}.")
+            return 500, "Failed to upload invoice PDF."
 
+        # Send the reminder with the link to the consolidated invoice
+        success = message is not None and (use_outbox or ses_client is not None) and _timed(
+            timings, 'send', _deliver_email, message, ses_client, _reminder_key(tenant_consolidated_info, date.today().isoformat())
+        )
+        timings['total'] = time.perf_counter() - start
+        log.info(f"Notification stages for tenant {tenant_id_for_logging}: " + ", ".join(f"{stage}={seconds * 1000:.0f} ms" for stage, seconds in timings.items()))
 
         if success:
-            return https_fn.Response("Email sent successfully.", status=200)
+            return 200, "Email sent successfully."
         else:
-            return https_fn.Response("Failed to send email.", status=500)
+            return 500, "Failed to send email."
 
     except Exception as e:
         log.error(f"An unexpected error occurred in send_notification_worker for tenant {tenant_id_for_logging}: {e}")
+        return 500, "An error occurred."
+
+def _send_bulk_notifications(batch: list, contact_emails, ses_client) -> list:
+    """
+    Stores the invoices of a batch of tenants concurrently, then emails them with SES bulk templated sends
+    (see send_bulk_tenant_summary_emails). Returns a (status, message) pair per tenant, like _send_tenant_notification.
+    """
+    statuses = [None] * len(batch)
+    invoice_futures = []
+    for index, tenant_consolidated_info in enumerate(batch):
+        error, rt_db_path, invoice_url = _invoice_location(tenant_consolidated_info)
+        if error:
+            statuses[index] = error
+        else:
+            invoice_futures.append((index, invoice_url, _notification_pipeline.submit(_store_invoice, rt_db_path, tenant_consolidated_info)))
+
+    if isinstance(contact_emails, Future):
+        contact_emails = contact_emails.result()
+    reminders, reminder_indexes = [], []
+    for index, invoice_url, invoice_future in invoice_futures:
+        try:
+            invoice_stored = invoice_future.result()
+        except Exception as e:
+            log.error(f"An unexpected error occurred storing the invoice of tenant {batch[index].get('tenant_info', {}).get('tenant_id')}: {e}")
+            invoice_stored = False
+        if not invoice_stored:
+            statuses[index] = (500, "Failed to upload invoice PDF.")
+            continue
+        reminders.append({
+            'tenant_consolidated_info': batch[index],
+            'invoice_url': invoice_url,
+            'cc_recipients': _cc_recipients(batch[index], contact_emails),
+        })
+        reminder_indexes.append(index)
+
+    sent = [False] * len(reminders)
+    if reminders and ses_client is not None:
+        sent = send_bulk_tenant_summary_emails(reminders, template_env, ses_client)
+    for index, success in zip(reminder_indexes, sent):
+        statuses[index] = (200, "Email sent successfully.") if success else (500, "Failed to send email.")
+    return statuses
+
+def _send_notification_batch(batch: list, attempt: int, contact_emails) -> https_fn.Response:
+    """
+    Sends the reminders of a batch of tenants, sharing the landlord email lookup (a dict or a Future of one)
+    and one SES client.
+    Tenants that failed with a retryable error are re-enqueued as a new batch, so only they are retried.
+    With EMAIL_OUTBOX the reminders are spooled one by one, and the drainer sends them.
+    """
+    if outbox_enabled():
+        statuses = [_send_tenant_notification(tenant_consolidated_info, contact_emails) for tenant_consolidated_info in batch]
+    elif os.environ.get('BULK_EMAIL_SENDING', 'false').lower() == 'true':
+        ses_client = create_ses_client()
+        statuses = _send_bulk_notifications(batch, contact_emails, ses_client)
+    else:
+        ses_client = create_ses_client()
+        statuses = [_send_tenant_notification(tenant_consolidated_info, contact_emails, ses_client=ses_client) for tenant_consolidated_info in batch]
+    results = []
+    for tenant_consolidated_info, (status, message) in zip(batch, statuses):
+        tenant_id = tenant_consolidated_info.get('tenant_info', {}).get('tenant_id')
+        results.append({'tenant_id': tenant_id, 'status': status, 'message': message})
+
+    retryable = [tenant for tenant, result in zip(batch, results) if result['status'] >= 500]
+    log.info(f"Notification batch (attempt {attempt}): {len(batch) - len(retryable)} of {len(batch)} tenants done, {len(retryable)} to retry.")
+    if retryable:
+        if attempt >= NOTIFICATION_MAX_ATTEMPTS:
+            log.error(f"Giving up on {len(retryable)} tenants after {attempt} attempts: {[r['tenant_id'] for r in results if r['status'] >= 500]}")
+        else:
+            retry_results = enqueue_tasks(
+                [{'batch': retryable, 'attempt': attempt + 1}],
+                target_function="send_notification_worker",
+                task_name_prefix="send-notification-retry-",
+                task_key=lambda payload: f"{attempt + 1}:" + '|'.join(_reminder_key(tenant) for tenant in payload['batch']),
+            )
+            if retry_results[0]['status'] == 'failed':
+                # Let Cloud Tasks retry the whole batch rather than drop the failed tenants
+                return https_fn.Response(json.dumps(results), status=500, headers={'Content-Type': 'application/json'})
+    return https_fn.Response(json.dumps(results), status=200, headers={'Content-Type': 'application/json'})
+
+@https_fn.on_request()
+def send_notification_worker(req: https_fn.Request) -> https_fn.Response:
+    """
+    HTTP-triggered function that receives a tenant's consolidated info and sends a notification.
+    Also accepts {'batch': [tenant consolidated info, ...], 'attempt': n}, which sends every tenant
+    in one invocation and reports the per-tenant results.
+    """
+    try:
+        payload = req.get_json(silent=True)
+        if not payload:
+            log.error("No tenant data in request body.")
+            return https_fn.Response("No data received", status=400)
+
+        # Look up the landlord emails to CC for just the companies in this payload, in the background:
+        # only the email needs them, so the invoice work starts without waiting for the lookup
+        tenants = payload['batch'] if 'batch' in payload else [payload]
+        contact_emails = _notification_pipeline.submit(
+            get_company_contact_emails, [rental.get('company_id') for tenant in tenants for rental in tenant.get('due_rentals', [])]
+        )
+
+        if 'batch' in payload:
+            return _send_notification_batch(payload['batch'], payload.get('attempt', 1), contact_emails)
+
+        status, message = _send_tenant_notification(payload, contact_emails)
+        return https_fn.Response(message, status=status)
+
+    except Exception as e:
+        log.error(f"An unexpected error occurred in send_notification_worker: {e}")
         return https_fn.Response("An error occurred.", status=500)
 
 @https_fn.on_request()
@@ -242,14 +906,26 @@ def send_email_worker(req: https_fn.Request) -> https_fn.Response:
         if cc_recipients and isinstance(cc_recipients, str):
             cc_recipients = [cc_recipients]  # Convert single email to list
 
-        success = send_email(
-            recipient_email=email_payload["recipient_email"],
-            subject=email_payload["subject"],
-            template_name=email_payload["template_name"],
-            template_env=template_env,
-            context=email_payload["context"],
-            cc_recipients=cc_recipients
-        )
+        if outbox_enabled():
+            message = build_email(
+                recipient_email=email_payload["recipient_email"],
+                subject=email_payload["subject"],
+                template_name=email_payload["template_name"],
+                template_env=template_env,
+                context=email_payload["context"],
+                cc_recipients=cc_recipients
+            )
+            # A retried task carries the same task name, so it does not spool the email twice
+            success = message is not None and _deliver_email(message, key=req.headers.get('X-CloudTasks-TaskName'))
+        else:
+            success = send_email(
+                recipient_email=email_payload["recipient_email"],
+                subject=email_payload["subject"],
+                template_name=email_payload["template_name"],
+                template_env=template_env,
+                context=email_payload["context"],
+                cc_recipients=cc_recipients
+            )
 
         if success:
             return https_fn.Response("Email sent successfully.", status=200, headers=headers)
@@ -261,6 +937,38 @@ def send_email_worker(req: https_fn.Request) -> https_fn.Response:
         return https_fn.Response("An error occurred.", status=500, headers=headers)
 
 
+@https_fn.on_request(max_instances=1)
+def drain_outbox_worker(req: https_fn.Request) -> https_fn.Response:
+    """
+    HTTP-triggered function that sends the spooled emails (see drain_outbox) within the time budget,
+    over one SES client. If it runs out of time with emails still waiting, it enqueues another drain.
+    """
+    try:
+        ses_client = create_ses_client()
+        if ses_client is None:
+            return https_fn.Response("SES client unavailable.", status=500)
+
+        summary = drain_outbox(ses_client, deadline=time.monotonic() + DEFAULT_TIME_BUDGET_SECONDS)
+        if summary['remaining']:
+            _kick_outbox_drainer()
+        return https_fn.Response(json.dumps(summary), status=200, headers={'Content-Type': 'application/json'})
+
+    except Exception as e:
+        log.error(f"An unexpected error occurred in drain_outbox_worker: {e}")
+        return https_fn.Response("An error occurred.", status=500)
+
+@scheduler_fn.on_schedule(
+    schedule="every 5 minutes",
+    timezone=scheduler_fn.Timezone("Africa/Johannesburg"),
+)
+def sweep_outbox(event: scheduler_fn.ScheduledEvent) -> None:
+    """
+    With EMAIL_OUTBOX, starts a drain every few minutes, so emails waiting for a retry or spooled
+    when a drain task could not be enqueued still go out.
+    """
+    if outbox_enabled():
+        _kick_outbox_drainer()
+
 @https_fn.on_request()
 def get_invoice(req: https_fn.Request) -> https_fn.Response:
     """
@@ -290,6 +998,15 @@ def get_invoice(req: https_fn.Request) -> https_fn.Response:
         cloud_storage_path = data.get('cloudStoragePath')
         invoice_number = data.get('invoice_number') # Not strictly needed here, but good for logs
 
+        if not cloud_storage_path and data.get('invoiceInputs'):
+            # Lazily generated invoice opened for the first time: render it now and keep it in Storage
+            pdf_content = _render_and_store_invoice(ref, data['invoiceInputs'], data.get('contentHash'))
+            if not pdf_content:
+                log.error(f"Failed to generate invoice for payment {payment_id} from {rt_db_path}")
+                return https_fn.Response("Failed to generate invoice.", status=500)
+            log.info(f"Generated invoice PDF for payment {payment_id} on first request.")
+            return https_fn.Response(pdf_content, headers={"Content-Type": "application/pdf"}, status=200)
+
         if not cloud_storage_path:
             log.error(f"Missing cloudStoragePath in RTDB at: {rt_db_path}")
             return https_fn.Response("Invoice path not found.", status=500)
@@ -385,6 +1102,7 @@ def generate_receipt(req: https_fn.Request) -> https_fn.Response:
                     [email_payload],
                     target_function="send_email_worker",
                     task_name_prefix="send-email-",
+                    task_key=lambda payload: _receipt_key(data),
                 )
                 log.info(f"Receipt generated and email queued for {data['tenant_email']}")
             else:
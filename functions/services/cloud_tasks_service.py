@@ -1,8 +1,17 @@
+import hashlib
 import json
 import logging
 import os
+import random
+import threading
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from google.api_core import exceptions as api_exceptions
 from google.cloud import tasks_v2
+from google.protobuf import duration_pb2, timestamp_pb2
+from .local_task_queue import LocalTaskQueue, DEFAULT_CONCURRENCY
 
 # Set up a module-level logger
 log = logging.getLogger(__name__)
@@ -12,19 +21,170 @@ PROJECT = os.environ.get('GCP_PROJECT') or os.environ.get('GCLOUD_PROJECT') or '
 QUEUE = 'notification-queue'
 LOCATION = 'us-central1'
 
-def enqueue_tasks(payloads: list, target_function: str, task_name_prefix: str = "task-"):
+# create_task calls in flight at once for one enqueue_tasks call
+ENQUEUE_MAX_WORKERS = 16
+# Attempts per task for transient errors, with full-jitter exponential backoff between them
+ENQUEUE_MAX_ATTEMPTS = 4
+RETRY_BASE_DELAY_SECONDS = 0.2
+RETRYABLE_ERRORS = (
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.DeadlineExceeded,
+    api_exceptions.InternalServerError,
+    api_exceptions.TooManyRequests,
+    api_exceptions.ResourceExhausted,
+    api_exceptions.Aborted,
+)
+
+# TASK_BACKEND selects where enqueue_tasks sends tasks: the Cloud Tasks API (default), an in-process
+# queue served by worker threads ('memory'), or straight to the handler in the calling thread ('inline')
+TASK_BACKEND_CLOUD_TASKS = 'cloud_tasks'
+TASK_BACKEND_MEMORY = 'memory'
+TASK_BACKEND_INLINE = 'inline'
+
+_tasks_client = None
+_tasks_client_lock = threading.Lock()
+_local_task_queues = {}
+_local_task_queues_lock = threading.Lock()
+
+def get_tasks_client() -> tasks_v2.CloudTasksClient:
     """
-    Enqueues tasks to Cloud Tasks.
+    Returns the module's Cloud Tasks client, creating it on first use.
+    The client is thread-safe and reused by every enqueue_tasks call in the instance.
     """
-    tasks_client = tasks_v2.CloudTasksClient()
-    parent = tasks_client.queue_path(PROJECT, LOCATION, QUEUE)
+    global _tasks_client
+    if _tasks_client is None:
+        with _tasks_client_lock:
+            if _tasks_client is None:
+                _tasks_client = tasks_v2.CloudTasksClient()
+    return _tasks_client
 
-    for payload_data in payloads:
-        url = f"https://{LOCATION}-{PROJECT}.cloudfunctions.net/{target_function}"
-        payload = json.dumps(payload_data)
+def _resolve_local_handler(target_function: str):
+    """Looks up the HTTP function a local task targets in this process's main module."""
+    import main
+    return getattr(main, target_function)
+
+def get_local_task_queue(backend: str) -> LocalTaskQueue:
+    """
+    Returns the process-wide queue for a local backend, creating it on first use.
+    The memory queue runs TASK_QUEUE_CONCURRENCY workers; the inline queue has none and runs each task on submit.
+    """
+    with _local_task_queues_lock:
+        if backend not in _local_task_queues:
+            concurrency = 0
+            if backend == TASK_BACKEND_MEMORY:
+                concurrency = int(os.environ.get('TASK_QUEUE_CONCURRENCY', DEFAULT_CONCURRENCY))
+            _local_task_queues[backend] = LocalTaskQueue(_resolve_local_handler, concurrency)
+        return _local_task_queues[backend]
+
+def _create_task(tasks_client, parent: str, task: dict) -> dict:
+    """
+    Creates one task, retrying transient errors with jittered backoff.
+    A task whose name already exists (409) was enqueued before and counts as a success.
+    Returns {'name', 'status': 'created' | 'duplicate' | 'failed', 'attempts', 'error'}.
+    """
+    for attempt in range(1, ENQUEUE_MAX_ATTEMPTS + 1):
+        try:
+            response = tasks_client.create_task(parent=parent, task=task)
+            log.info(f"Created task {response.name}")
+            return {'name': task['name'], 'status': 'created', 'attempts': attempt, 'error': None}
+        except api_exceptions.AlreadyExists:
+            log.info(f"Task {task['name']} already exists; skipping duplicate")
+            return {'name': task['name'], 'status': 'duplicate', 'attempts': attempt, 'error': None}
+        except RETRYABLE_ERRORS as e:
+            if attempt == ENQUEUE_MAX_ATTEMPTS:
+                log.error(f"Error creating task {task['name']} after {attempt} attempts: {e}")
+                return {'name': task['name'], 'status': 'failed', 'attempts': attempt, 'error': str(e)}
+            delay = random.uniform(0, RETRY_BASE_DELAY_SECONDS * 2 ** (attempt - 1))
+            log.warning(f"Transient error creating task {task['name']} (attempt {attempt}), retrying in {delay:.2f}s: {e}")
+            time.sleep(delay)
+        except Exception as e:
+            log.error(f"Error creating task {task['name']}: {e}")
+            return {'name': task['name'], 'status': 'failed', 'attempts': attempt, 'error': str(e)}
 
+def _task_name(task_name_prefix: str, payload_data: dict, task_key=None) -> str:
+    """
+    Names a task after its content key, so enqueueing the same work twice yields the same name and
+    Cloud Tasks drops the repeat. Without a key the name gets a random suffix and is always unique.
+    """
+    if task_key is None:
         # Add UUID to make task name unique and avoid 409 errors
-        task_name = f"{task_name_prefix}{payload_data.get('tenant_id', '')}-{payload_data.get('email_type', '')}-{uuid.uuid4().hex[:8]}"
+        return f"{task_name_prefix}{payload_data.get('tenant_id', '')}-{payload_data.get('email_type', '')}-{uuid.uuid4().hex[:8]}"
+    return f"{task_name_prefix}{hashlib.sha256(task_key(payload_data).encode()).hexdigest()[:32]}"
+
+def dispatch_schedule(task_count: int, start: datetime = None, dispatch_rate: float = None, dispatch_window_seconds: float = None) -> list:
+    """
+    Spreads `task_count` dispatch times from `start` (default now): `dispatch_rate` tasks per second,
+    or evenly over `dispatch_window_seconds`. With both, the rate is kept unless the tasks would not
+    fit in the window, in which case they are spread over the whole window instead.
+    """
+    start = start or datetime.now(timezone.utc)
+    spacing = 0.0
+    if dispatch_rate:
+        spacing = 1.0 / dispatch_rate
+    if dispatch_window_seconds and task_count > 1:
+        window_spacing = dispatch_window_seconds / task_count
+        if not dispatch_rate or spacing > window_spacing:
+            if dispatch_rate:
+                log.warning(f"{task_count} tasks at {dispatch_rate}/s do not fit in {dispatch_window_seconds}s; spreading them over the window")
+            spacing = window_spacing
+    return [start + timedelta(seconds=i * spacing) for i in range(task_count)]
+
+def enqueue_tasks(payloads: list, target_function: str, task_name_prefix: str = "task-", schedule_time: datetime | list = None, batch_size: int = 1, task_key=None,
+                  dispatch_rate: float = None, dispatch_window_seconds: float = None, dispatch_deadline_seconds: int = None) -> list:
+    """
+    Enqueues tasks to Cloud Tasks, or to an in-process queue when TASK_BACKEND is 'memory' or 'inline'.
+    The tasks are created concurrently on a bounded thread pool with a shared client.
+    If `schedule_time` (a timezone-aware datetime) is given, the tasks are not dispatched before it; a list
+    of datetimes gives each payload its own schedule time (not combined with `batch_size` or dispatch pacing).
+    With `batch_size` > 1, up to that many payloads are sent together as one {'batch': [...]} task.
+    `task_key(payload) -> str` gives each task a deterministic name derived from that content key,
+    making the enqueue idempotent: a repeat is reported as 'duplicate' instead of being created again.
+    Returns one result dict per payload, in payload order (see _create_task), so callers can see
+    which enqueues failed; payloads sent in the same batch share their task's result.
+    `dispatch_rate` (tasks per second) and/or `dispatch_window_seconds` stagger the tasks' schedule
+    times from `schedule_time` (default now), see dispatch_schedule, so the queue releases them at a
+    pace the workers and SES can absorb. `dispatch_deadline_seconds` sets how long Cloud Tasks waits
+    for each handler before treating the attempt as failed.
+    """
+    if not payloads:
+        return []
+
+    if batch_size > 1:
+        batches = [payloads[i:i + batch_size] for i in range(0, len(payloads), batch_size)]
+        batch_key = None
+        if task_key is not None:
+            batch_key = lambda batch_payload: '|'.join(task_key(payload_data) for payload_data in batch_payload['batch'])
+        batch_results = enqueue_tasks(
+            [{'batch': batch} for batch in batches], target_function, task_name_prefix, schedule_time, task_key=batch_key,
+            dispatch_rate=dispatch_rate, dispatch_window_seconds=dispatch_window_seconds, dispatch_deadline_seconds=dispatch_deadline_seconds,
+        )
+        return [result for batch, result in zip(batches, batch_results) for _ in batch]
+
+    if isinstance(schedule_time, list):
+        schedule_times = schedule_time
+    else:
+        schedule_times = [schedule_time] * len(payloads)
+    if not isinstance(schedule_time, list) and (dispatch_rate or dispatch_window_seconds):
+        schedule_times = dispatch_schedule(len(payloads), schedule_time, dispatch_rate, dispatch_window_seconds)
+
+    backend = os.environ.get('TASK_BACKEND', TASK_BACKEND_CLOUD_TASKS).lower()
+    if backend in (TASK_BACKEND_MEMORY, TASK_BACKEND_INLINE):
+        local_queue = get_local_task_queue(backend)
+        results = []
+        for payload_data, task_schedule_time in zip(payloads, schedule_times):
+            task_name = _task_name(task_name_prefix, payload_data, task_key)
+            status = local_queue.submit(task_name, target_function, payload_data, task_schedule_time)
+            results.append({'name': task_name, 'status': status, 'attempts': 1, 'error': None})
+        return results
+
+    tasks_client = get_tasks_client()
+    parent = tasks_client.queue_path(PROJECT, LOCATION, QUEUE)
+    url = f"https://{LOCATION}-{PROJECT}.cloudfunctions.net/{target_function}"
+
+    tasks = []
+    for payload_data, task_schedule_time in zip(payloads, schedule_times):
+        payload = json.dumps(payload_data)
+        task_name = _task_name(task_name_prefix, payload_data, task_key)
 
         task = {
             "name": tasks_client.task_path(PROJECT, LOCATION, QUEUE, task_name),
@@ -35,9 +195,18 @@ def enqueue_tasks(payloads: list, target_function: str, task_name_prefix: str =
                 "body": payload.encode(),
             }
         }
-        
-        try:
-            response = tasks_client.create_task(parent=parent, task=task)
-            log.info(f"Created task {response.name}")
-        except Exception as e:
-            log.error(f"Error creating task: {e}")
\ No newline at end of file
+        if task_schedule_time is not None:
+            timestamp = timestamp_pb2.Timestamp()
+            timestamp.FromDatetime(task_schedule_time)
+            task["schedule_time"] = timestamp
+        if dispatch_deadline_seconds:
+            task["dispatch_deadline"] = duration_pb2.Duration(seconds=int(dispatch_deadline_seconds))
+        tasks.append(task)
+
+    with ThreadPoolExecutor(max_workers=min(ENQUEUE_MAX_WORKERS, len(tasks))) as executor:
+        results = list(executor.map(lambda task: _create_task(tasks_client, parent, task), tasks))
+
+    failed = sum(1 for result in results if result['status'] == 'failed')
+    if failed:
+        log.error(f"Failed to enqueue {failed} of {len(results)} tasks for {target_function}")
+    return results
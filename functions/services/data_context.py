@@ -0,0 +1,66 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Set up a module-level logger
+log = logging.getLogger(__name__)
+
+# Upper bound on concurrent RTDB reads issued by one data context
+DATA_CONTEXT_MAX_WORKERS = 4
+
+class DataContext:
+    """
+    Loads named RTDB subtrees for a single run.
+    Each subtree is fetched at most once: prefetch() starts the named loaders concurrently on a
+    bounded thread pool, and any other subtree is loaded on first access. Every fetch is timed and logged.
+    Use it as a context manager so the pool is shut down when the run is over.
+    """
+
+    def __init__(self, loaders: dict, max_workers: int = DATA_CONTEXT_MAX_WORKERS):
+        self._loaders = loaders
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="data-context")
+        self._futures = {}
+        self._lock = threading.Lock()
+        self.timings = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def _load(self, name: str):
+        start = time.perf_counter()
+        try:
+            return self._loaders[name]()
+        finally:
+            self.timings[name] = time.perf_counter() - start
+            log.info(f"Fetched {name} in {self.timings[name] * 1000:.0f} ms")
+
+    def _future(self, name: str):
+        if name not in self._loaders:
+            raise KeyError(f"No loader registered for '{name}'")
+        with self._lock:
+            if name not in self._futures:
+                self._futures[name] = self._executor.submit(self._load, name)
+            return self._futures[name]
+
+    def prefetch(self, *names: str) -> None:
+        """Starts loading the named subtrees in the background without waiting for them."""
+        for name in names:
+            self._future(name)
+
+    def get(self, name: str):
+        """Returns the named subtree, loading it now if it has not been requested yet."""
+        return self._future(name).result()
+
+    def __getitem__(self, name: str):
+        return self.get(name)
+
+    def is_loaded(self, name: str) -> bool:
+        future = self._futures.get(name)
+        return future is not None and future.done()
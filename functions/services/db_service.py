@@ -2,11 +2,28 @@
 
 import firebase_admin.db as db
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
 
-from constants import TENANTS_PATH, STATISTICS_PATH
+from constants import (
+    PROPERTY_MANAGEMENT_PATH, TENANTS_PATH, STATISTICS_PATH, ACCOUNTS_PATH, PAYMENTS_BY_DUE_DATE_PATH,
+    SCHEDULER_RUNS_PATH, COMPANIES_PATH,
+)
+from utils.ttl_cache import TTLCache
 
 log = logging.getLogger(__name__)
 
+# Only these paymentTracking nodes are read by the scheduler; overdue and summary are never needed.
+SCHEDULER_TRACKING_NODES = ('pending', 'due')
+FETCH_MAX_WORKERS = 8
+
+# Landlord contact emails change rarely; warm instances reuse them for this long
+COMPANY_CONTACT_EMAIL_TTL_SECONDS = 600
+_company_contact_email_cache = TTLCache(COMPANY_CONTACT_EMAIL_TTL_SECONDS)
+
+# paymentStatus written to the tenant's account when a payment reaches a tracking node
+PAYMENT_STATUS_BY_TRACKING_NODE = {'due': 2, 'overdue': 3}
+
 def get_all_tenants() -> dict:
     """
     Gets all tenants from the Firebase Realtime Database.
@@ -15,6 +32,34 @@ def get_all_tenants() -> dict:
     tenants = ref.get()
     return tenants if tenants else {}
 
+def get_tenants_for_companies(company_ids: list) -> dict:
+    """
+    Gets the Tenants subtrees of the given companies concurrently.
+    Returns a dict shaped like the Tenants tree, restricted to those companies.
+    """
+    if not company_ids:
+        return {}
+
+    def fetch(company_id):
+        return db.reference(f"{TENANTS_PATH}/{company_id}").get()
+
+    with ThreadPoolExecutor(max_workers=min(FETCH_MAX_WORKERS, len(company_ids))) as executor:
+        results = executor.map(fetch, company_ids)
+        return {company_id: tenants for company_id, tenants in zip(company_ids, results) if tenants}
+
+def get_tenant(company_id: str, tenant_id: str) -> dict:
+    """
+    Gets one tenant's record from a company's Tenants subtree, whichever status group it is in.
+    Returns a dict shaped like the Tenants tree, {company_id: {status_group: {tenant_id: details}}},
+    or {} if the tenant is not found.
+    """
+    status_groups = db.reference(f"{TENANTS_PATH}/{company_id}").get(shallow=True)
+    for status_group in status_groups or {}:
+        tenant_details = db.reference(f"{TENANTS_PATH}/{company_id}/{status_group}/{tenant_id}").get()
+        if tenant_details:
+            return {company_id: {status_group: {tenant_id: tenant_details}}}
+    return {}
+
 def get_all_accounts() -> dict:
     """
     Gets all accounts from the Firebase Realtime Database.
@@ -31,6 +76,215 @@ def get_all_statistics() -> dict:
     stats = ref.get()
     return stats if stats else {}
 
+def get_company_ids() -> list:
+    """
+    Lists the company IDs under Statistics with a shallow query, without downloading their subtrees.
+    """
+    ref = db.reference(STATISTICS_PATH)
+    company_keys = ref.get(shallow=True)
+    return list(company_keys.keys()) if company_keys else []
+
+def _get_tracking_node(company_id: str, tracking_node: str) -> dict:
+    """
+    Gets a single paymentTracking node (e.g. 'pending') for a company.
+    """
+    ref = db.reference(f"{STATISTICS_PATH}/{company_id}/paymentTracking/{tracking_node}")
+    payments = ref.get()
+    return payments if payments else {}
+
+def get_payment_tracking(company_ids: list = None) -> dict:
+    """
+    Gets only the pending and due payment tracking nodes for each company.
+    Returns a dict shaped like the Statistics tree, e.g.
+    {company_id: {'paymentTracking': {'pending': {...}, 'due': {...}}}}, so it can be passed
+    anywhere the full statistics were used by the notification logic.
+    """
+    if company_ids is None:
+        company_ids = get_company_ids()
+
+    fetches = [(company_id, node) for company_id in company_ids for node in SCHEDULER_TRACKING_NODES]
+    if not fetches:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=min(FETCH_MAX_WORKERS, len(fetches))) as executor:
+        results = executor.map(lambda fetch: _get_tracking_node(*fetch), fetches)
+        payment_tracking = {company_id: {'paymentTracking': {}} for company_id in company_ids}
+        for (company_id, node), payments in zip(fetches, results):
+            payment_tracking[company_id]['paymentTracking'][node] = payments
+
+    return payment_tracking
+
+def get_payment_tracking_for_payment(company_id: str, payment_id: str) -> dict:
+    """
+    Gets one payment from the pending and due nodes of a company.
+    Returns {'pending': {payment_id: details}} or {'due': {...}} depending on where it currently is,
+    or {} if it is in neither (paid, moved to overdue or deleted).
+    """
+    payment_tracking = {}
+    for tracking_node in SCHEDULER_TRACKING_NODES:
+        payment_details = db.reference(f"{STATISTICS_PATH}/{company_id}/paymentTracking/{tracking_node}/{payment_id}").get()
+        if payment_details:
+            payment_tracking[tracking_node] = {payment_id: payment_details}
+    return payment_tracking
+
+def get_tenant_payment_tracking(company_id: str, tenant_id: str) -> dict:
+    """
+    Gets one tenant's payments from the pending and due nodes of a company with a tenantId query,
+    so only that tenant's payments are downloaded (the nodes are indexed on tenantId in the database rules).
+    Returns {'pending': {...}, 'due': {...}}, shaped like the company's paymentTracking node.
+    """
+    payment_tracking = {}
+    for tracking_node in SCHEDULER_TRACKING_NODES:
+        ref = db.reference(f"{STATISTICS_PATH}/{company_id}/paymentTracking/{tracking_node}")
+        payments = ref.order_by_child('tenantId').equal_to(tenant_id).get()
+        payment_tracking[tracking_node] = dict(payments) if payments else {}
+    return payment_tracking
+
+def _due_date_index_key(due_date_str: str) -> str | None:
+    """
+    Converts a 'dd/mm/YYYY' due date into the 'yyyymmdd' key used by the due-date index.
+    Returns None if the date cannot be parsed.
+    """
+    try:
+        return datetime.strptime(due_date_str.strip(), '%d/%m/%Y').strftime('%Y%m%d')
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+def _due_date_index_ref(date_key: str, company_id: str, payment_id: str):
+    """
+    Gets the reference of a single entry in the PaymentsByDueDate index.
+    """
+    return db.reference(f"{PAYMENTS_BY_DUE_DATE_PATH}/{date_key}/{company_id}_{payment_id}")
+
+def _due_date_index_entry(company_id: str, payment_id: str, tracking_node: str) -> dict:
+    """
+    Builds the value stored for a payment in the due-date index: only where the payment lives.
+    The scheduler reads the payment itself from its tracking node, so an entry left behind by a
+    concurrent write can never bring back a payment that was paid, moved or deleted.
+    """
+    return {
+        'companyId': company_id,
+        'paymentId': payment_id,
+        'trackingNode': tracking_node,
+    }
+
+def index_payment_by_due_date(company_id: str, payment_id: str, payment_details: dict, tracking_node: str):
+    """
+    Adds or refreshes the due-date index entry for a pending or due payment.
+    """
+    date_key = _due_date_index_key(payment_details.get('dueDate'))
+    if not date_key:
+        log.warning(f"Could not index payment {payment_id} for company {company_id}: invalid dueDate '{payment_details.get('dueDate')}'")
+        return
+    _due_date_index_ref(date_key, company_id, payment_id).set(_due_date_index_entry(company_id, payment_id, tracking_node))
+
+def unindex_payment_by_due_date(company_id: str, payment_id: str, payment_details: dict, tracking_node: str = None):
+    """
+    Removes a payment from the due-date index.
+    When `tracking_node` is given, the entry is only removed if it still points at that node, so a
+    late delete of the old 'pending' copy cannot remove the entry written for the new 'due' copy.
+    """
+    date_key = _due_date_index_key(payment_details.get('dueDate'))
+    if not date_key:
+        return
+    ref = _due_date_index_ref(date_key, company_id, payment_id)
+    if tracking_node is None:
+        ref.delete()
+        return
+    ref.transaction(lambda current: None if current and current.get('trackingNode') == tracking_node else current)
+
+def sync_due_date_index(company_id: str, payment_id: str, tracking_node: str, before: dict | None, after: dict | None):
+    """
+    Keeps the due-date index in step with a write to a pending/due payment node.
+    Called from the RTDB triggers so payments created or edited by the frontend are indexed too.
+    """
+    before_key = _due_date_index_key(before.get('dueDate')) if before else None
+    after_key = _due_date_index_key(after.get('dueDate')) if after else None
+
+    if after:
+        index_payment_by_due_date(company_id, payment_id, after, tracking_node)
+    if before and before_key and before_key != after_key:
+        unindex_payment_by_due_date(company_id, payment_id, before, tracking_node)
+
+def backfill_due_date_index() -> int:
+    """
+    Rebuilds the PaymentsByDueDate index from the pending and due payment tracking nodes.
+    The index is read before the tracking nodes and the rebuild is merged in with one multi-location
+    update: entries are only removed if they were already in the index before the payments were read, so
+    entries the triggers write for payments created or moved meanwhile are kept.
+    Returns the number of indexed payments.
+    """
+    existing_index = db.reference(PAYMENTS_BY_DUE_DATE_PATH).get() or {}
+
+    index = {}
+    for company_id, company_stats in get_payment_tracking().items():
+        for tracking_node, payments in company_stats['paymentTracking'].items():
+            for payment_id, payment_details in payments.items():
+                date_key = _due_date_index_key(payment_details.get('dueDate'))
+                if not date_key:
+                    log.warning(f"Skipping payment {payment_id} for company {company_id} in index backfill: invalid dueDate '{payment_details.get('dueDate')}'")
+                    continue
+                index[f"{date_key}/{company_id}_{payment_id}"] = _due_date_index_entry(company_id, payment_id, tracking_node)
+
+    updates = dict(index)
+    for date_key, entries in existing_index.items():
+        for entry_key in (entries or {}):
+            updates.setdefault(f"{date_key}/{entry_key}", None)
+    if updates:
+        db.reference(PAYMENTS_BY_DUE_DATE_PATH).update(updates)
+    removed_count = len(updates) - len(index)
+    log.info(f"Rebuilt due-date index with {len(index)} payments; removed {removed_count} stale entries.")
+    return len(index)
+
+def get_payment_tracking_in_window(end_date: date) -> dict:
+    """
+    Gets the pending and due payments whose due date is on or before `end_date`, using the due-date index
+    to find them. Payments leave the index when they become overdue, so the query only returns payments
+    in the reminder window plus any past-due payments that still need to be moved.
+    Each payment is then read live from its tracking node, concurrently; entries whose payment is gone
+    (paid, deleted) or whose live due date is past `end_date` are dropped, and a payment found in the
+    other tracking node than its entry says is returned from where it is now.
+    Returns the same statistics-shaped dict as get_payment_tracking().
+    """
+    ref = db.reference(PAYMENTS_BY_DUE_DATE_PATH)
+    index = ref.order_by_key().end_at(end_date.strftime('%Y%m%d')).get()
+
+    # A payment whose due date changed can briefly have entries under two dates
+    entries = {}
+    for date_entries in (index or {}).values():
+        for entry in (date_entries or {}).values():
+            entries[(entry['companyId'], entry['paymentId'])] = entry['trackingNode']
+    if not entries:
+        return {}
+
+    def fetch(item):
+        (company_id, payment_id), tracking_node = item
+        tracking_path = f"{STATISTICS_PATH}/{company_id}/paymentTracking"
+        for node in (tracking_node, *(other for other in SCHEDULER_TRACKING_NODES if other != tracking_node)):
+            payment_details = db.reference(f"{tracking_path}/{node}/{payment_id}").get()
+            if payment_details:
+                return node, payment_details
+        return None, None
+
+    with ThreadPoolExecutor(max_workers=min(FETCH_MAX_WORKERS, len(entries))) as executor:
+        live_payments = list(executor.map(fetch, entries.items()))
+
+    end_key = end_date.strftime('%Y%m%d')
+    payment_tracking = {}
+    stale_count = 0
+    for (company_id, payment_id), (tracking_node, payment_details) in zip(entries, live_payments):
+        date_key = _due_date_index_key(payment_details.get('dueDate')) if payment_details else None
+        if not date_key or date_key > end_key:
+            stale_count += 1
+            continue
+        company_stats = payment_tracking.setdefault(
+            company_id, {'paymentTracking': {node: {} for node in SCHEDULER_TRACKING_NODES}}
+        )
+        company_stats['paymentTracking'][tracking_node][payment_id] = payment_details
+    if stale_count:
+        log.info(f"Skipped {stale_count} due-date index entries whose payment is gone or no longer due by {end_key}")
+    return payment_tracking
+
 def get_all_companies() -> dict:
     """
     Gets all companies from the Firebase Realtime Database.
@@ -39,78 +293,163 @@ def get_all_companies() -> dict:
     companies = ref.get()
     return companies if companies else {}
 
+def get_company_contact_emails(company_ids) -> dict:
+    """
+    Gets the contactEmail of each given company, reading only Companies/{id}/contactEmail, concurrently.
+    Results (including companies without an email, as None) are cached for COMPANY_CONTACT_EMAIL_TTL_SECONDS
+    and shared by every invocation on a warm instance.
+    """
+    company_ids = list(dict.fromkeys(company_id for company_id in company_ids if company_id))
+    contact_emails, missing_ids = _company_contact_email_cache.get_many(company_ids)
+    if not missing_ids:
+        return contact_emails
+
+    def fetch(company_id):
+        return db.reference(f"{COMPANIES_PATH}/{company_id}/contactEmail").get()
+
+    with ThreadPoolExecutor(max_workers=min(FETCH_MAX_WORKERS, len(missing_ids))) as executor:
+        fetched = dict(zip(missing_ids, executor.map(fetch, missing_ids)))
+    _company_contact_email_cache.set_many(fetched)
+    contact_emails.update(fetched)
+    return contact_emails
+
+def _relative_path(path: str) -> str:
+    """
+    Makes an absolute PropertyManagement path relative, for use as a key in a multi-location update.
+    """
+    return path.removeprefix(PROPERTY_MANAGEMENT_PATH + '/')
+
+def _server_increment(delta: float) -> dict:
+    """
+    Builds an RTDB server value that atomically adds `delta` to the stored number.
+    """
+    return {'.sv': {'increment': delta}}
+
+def _completed_companies_path(run_id: str) -> str:
+    return f"{SCHEDULER_RUNS_PATH}/{run_id}/completedCompanies"
+
+def get_completed_companies(run_id: str) -> set:
+    """
+    Gets the IDs of the companies a scheduler run has already finished, with a shallow query.
+    """
+    completed = db.reference(_completed_companies_path(run_id)).get(shallow=True)
+    return set(completed.keys()) if completed else set()
+
+def mark_companies_completed(run_id: str, company_ids: list):
+    """
+    Records companies that needed no writes as finished for a scheduler run, in one update.
+    """
+    if company_ids:
+        db.reference(_completed_companies_path(run_id)).update({company_id: True for company_id in company_ids})
+
+def save_scheduler_cursor(run_id: str, next_company_id: str, remaining_companies: int):
+    """
+    Records where an unfinished scheduler run stopped, for the continuation task and for operators.
+    """
+    db.reference(f"{SCHEDULER_RUNS_PATH}/{run_id}").update({
+        'cursor': {'nextCompanyId': next_company_id, 'remainingCompanies': remaining_companies},
+        'updatedAt': datetime.now().isoformat(),
+    })
+
+def complete_scheduler_run(run_id: str):
+    """
+    Marks a scheduler run as finished and clears its cursor.
+    """
+    db.reference(f"{SCHEDULER_RUNS_PATH}/{run_id}").update({
+        'cursor': None,
+        'completedAt': datetime.now().isoformat(),
+    })
+
+def apply_payment_transitions(company_id: str, transitions: list, run_id: str = None) -> bool:
+    """
+    Applies all payment state transitions of one company with a single multi-location update.
+    Each transition is a dict with 'payment_id', 'payment_details', 'source_tracking_node' and
+    'target_tracking_node', and optionally 'tenant_id' (defaults to payment_details['tenantId']).
+    The update writes the destinations, deletes the sources, sets the account payment statuses,
+    maintains the due-date index and applies the summary count/total deltas, aggregated in memory,
+    as server-side increments, so the whole company is one atomic write.
+    If `run_id` is given, the company is marked completed for that scheduler run in the same write,
+    so a continuation or rerun can never apply its transitions twice.
+    Returns True if the update was written.
+    """
+    if not transitions and not run_id:
+        return True
+
+    try:
+        tracking_path = f"{STATISTICS_PATH}/{company_id}/paymentTracking"
+        updates = {}
+        summary_deltas = {}
+
+        for transition in transitions:
+            payment_id = transition['payment_id']
+            payment_details = transition['payment_details']
+            source_tracking_node = transition['source_tracking_node']
+            target_tracking_node = transition['target_tracking_node']
+
+            updates[_relative_path(f"{tracking_path}/{target_tracking_node}/{payment_id}")] = payment_details
+            updates[_relative_path(f"{tracking_path}/{source_tracking_node}/{payment_id}")] = None
+
+            tenant_id = transition.get('tenant_id', payment_details.get('tenantId'))
+            if tenant_id:
+                account_status_path = f"{ACCOUNTS_PATH}/{company_id}/{tenant_id}/payments/{payment_id}/paymentStatus"
+                updates[_relative_path(account_status_path)] = PAYMENT_STATUS_BY_TRACKING_NODE[target_tracking_node]
+            else:
+                log.warning(f"tenant_id not provided for payment {payment_id} in company {company_id}. Account payment status not updated.")
+
+            # Due payments stay in the due-date index; overdue payments are no longer scanned, so they leave it
+            date_key = _due_date_index_key(payment_details.get('dueDate'))
+            if date_key:
+                index_path = _relative_path(f"{PAYMENTS_BY_DUE_DATE_PATH}/{date_key}/{company_id}_{payment_id}")
+                if target_tracking_node in SCHEDULER_TRACKING_NODES:
+                    updates[index_path] = _due_date_index_entry(company_id, payment_id, target_tracking_node)
+                else:
+                    updates[index_path] = None
+
+            amount = float(payment_details.get('amount', 0))
+            for node, sign in ((source_tracking_node, -1), (target_tracking_node, 1)):
+                summary_deltas[f'{node}Count'] = summary_deltas.get(f'{node}Count', 0) + sign
+                summary_deltas[f'{node}Total'] = summary_deltas.get(f'{node}Total', 0) + sign * amount
+
+        # Server-side increments: no summary read, and concurrent writers (e.g. the frontend
+        # recording a payment) cannot overwrite each other's changes
+        for field, delta in summary_deltas.items():
+            if delta:
+                updates[_relative_path(f"{tracking_path}/summary/{field}")] = _server_increment(delta)
+
+        if run_id:
+            updates[_relative_path(f"{_completed_companies_path(run_id)}/{company_id}")] = True
+
+        db.reference(PROPERTY_MANAGEMENT_PATH).update(updates)
+        log.info(f"Applied {len(transitions)} payment transitions for company {company_id} in one update")
+        return True
+    except Exception as e:
+        log.error(f"Error applying {len(transitions)} payment transitions for company {company_id}: {e}")
+        return False
+
 def move_pending_to_due(company_id: str, payment_id: str, payment_details: dict, tenant_id: str):
     """
     Moves a payment from pending to due in Firebase Realtime Database and updates counts and totals.
     """
-    try:
-        pending_ref = db.reference(f"{STATISTICS_PATH}/{company_id}/paymentTracking/pending/{payment_id}")
-        due_ref = db.reference(f"{STATISTICS_PATH}/{company_id}/paymentTracking/due/{payment_id}") # Node name is 'due'
-        
-        if tenant_id: # tenant_id is now passed as an argument
-            account_payment_status_ref = db.reference(f"/HomeHive/PropertyManagement/Accounts/{company_id}/{tenant_id}/payments/{payment_id}/paymentStatus")
-            account_payment_status_ref.set(2) # 2 for due
-        else:
-            log.warning(f"tenant_id not provided for payment {payment_id} in company {company_id}. Account payment status not updated.")
-
-        # Get the amount of the payment being moved
-        amount = float(payment_details.get('amount', 0))
-
-
-        due_ref.set(payment_details)
-        
-        pending_ref.delete()
-
-        # Update summary counts and totals
-        summary_ref = db.reference(f"{STATISTICS_PATH}/{company_id}/paymentTracking/summary")
-        summary_data = summary_ref.get()
-        if summary_data:
-            summary_data['pendingCount'] = summary_data.get('pendingCount', 0) - 1
-            summary_data['pendingTotal'] = summary_data.get('pendingTotal', 0) - amount # Decrement pendingTotal
-            
-            summary_data['dueCount'] = summary_data.get('dueCount', 0) + 1 
-            summary_data['dueTotal'] = summary_data.get('dueTotal', 0) + amount # Increment dueTotal
-            summary_ref.update(summary_data)
-        
+    transition = {
+        'payment_id': payment_id,
+        'payment_details': payment_details,
+        'source_tracking_node': 'pending',
+        'target_tracking_node': 'due',
+        'tenant_id': tenant_id,
+    }
+    if apply_payment_transitions(company_id, [transition]):
         log.info(f"Successfully moved payment {payment_id} to due for company {company_id}")
-    except Exception as e:
-        log.error(f"Error moving payment {payment_id} to due for company {company_id}: {e}")
 
 def move_payment_to_overdue(company_id: str, payment_id: str, payment_details: dict, source_tracking_node: str = "pending"):
     """
     Moves a payment from a specified source tracking node to overdue in Firebase Realtime Database
     and updates counts and totals.
     """
-    try:
-        source_ref = db.reference(f"{STATISTICS_PATH}/{company_id}/paymentTracking/{source_tracking_node}/{payment_id}")
-        overdue_ref = db.reference(f"{STATISTICS_PATH}/{company_id}/paymentTracking/overdue/{payment_id}")
-        
-        overdue_ref.set(payment_details)
-        
-        source_ref.delete()
-        tenant_id = payment_details.get('tenantId', '')
-        if tenant_id:
-            account_payment_status_ref = db.reference(f"/HomeHive/PropertyManagement/Accounts/{company_id}/{tenant_id}/payments/{payment_id}/paymentStatus")
-            account_payment_status_ref.set(3) # 3 for overdue
-        else:
-            log.warning(f"tenant_id not provided for payment {payment_id} in company {company_id}. Account payment status not updated.")
-
-        # Get the amount of the payment being moved
-        amount = float(payment_details.get('amount', 0))
-
-        # Update summary counts and totals
-        summary_ref = db.reference(f"{STATISTICS_PATH}/{company_id}/paymentTracking/summary")
-        summary_data = summary_ref.get()
-        if summary_data:
-            # Decrement source status counts
-            summary_data[f'{source_tracking_node}Count'] = summary_data.get(f'{source_tracking_node}Count', 0) - 1
-            summary_data[f'{source_tracking_node}Total'] = summary_data.get(f'{source_tracking_node}Total', 0) - amount
-            
-            # Increment overdue counts
-            summary_data['overdueCount'] = summary_data.get('overdueCount', 0) + 1
-            summary_data['overdueTotal'] = summary_data.get('overdueTotal', 0) + amount
-            summary_ref.update(summary_data)
-        
+    transition = {
+        'payment_id': payment_id,
+        'payment_details': payment_details,
+        'source_tracking_node': source_tracking_node,
+        'target_tracking_node': 'overdue',
+    }
+    if apply_payment_transitions(company_id, [transition]):
         log.info(f"Successfully moved payment {payment_id} from {source_tracking_node} to overdue for company {company_id}")
-    except Exception as e:
-        log.error(f"Error moving payment {payment_id} from {source_tracking_node} to overdue for company {company_id}: {e}")
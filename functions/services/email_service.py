@@ -1,6 +1,16 @@
 import os
 import boto3
+import hashlib
+import json
 import logging
+import random
+import re
+import threading
+import time
+import uuid
+import weakref
+from botocore.config import Config
+from botocore.exceptions import ClientError, ConnectTimeoutError, EndpointConnectionError
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.application import MIMEApplication
@@ -11,20 +21,99 @@ from .secret_manager_service import access_secret_version
 # Set up a module-level logger
 log = logging.getLogger(__name__)
 
-def send_email(recipient_email: str, subject: str, template_name: str, template_env, context: dict, cc_recipients: list = None) -> bool:
+# HTTP connections each SES client keeps open; covers the notification pipeline and batch workers sending at once
+SES_MAX_POOL_CONNECTIONS = 32
+
+_ses_clients = {}  # (region, credential fingerprint, endpoint URL) -> client
+_ses_clients_lock = threading.Lock()
+
+# Sends per second assumed when the account's MaxSendRate cannot be read: the default SES production rate
+DEFAULT_SES_MAX_SEND_RATE = 14.0
+# How often a limiter re-reads the account quota, which SES raises over time
+SES_QUOTA_REFRESH_SECONDS = 600
+# Attempts per SES call for throttling and connection errors, with full-jitter exponential backoff between them
+SES_SEND_MAX_ATTEMPTS = 5
+SES_RETRY_BASE_DELAY_SECONDS = 0.25
+SES_THROTTLING_ERRORS = ('Throttling', 'ThrottlingException')
+# Only errors where the request never reached SES are retried here. A read timeout or a closed connection can
+# come after SES accepted the email, so those go to the caller, whose task-level dedup key guards the resend
+SES_CONNECTION_ERRORS = (EndpointConnectionError, ConnectTimeoutError)
+
+_send_rate_limiters = weakref.WeakKeyDictionary()  # SES client -> SendRateLimiter
+_send_rate_limiters_lock = threading.Lock()
+
+# SES accepts at most 50 destinations per SendBulkTemplatedEmail call
+BULK_SEND_MAX_DESTINATIONS = 50
+TENANT_SUMMARY_SUBJECT = "Reminder: Upcoming Rental Payments Due - HomeHive"
+
+_registered_templates = set()  # (client id, template name) already created in SES
+_registered_templates_lock = threading.Lock()
+
+_LOGO_PATH = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'templates', 'assets', 'apple-touch-icon.png'))
+# The logo part is serialized with this placeholder payload, which is then swapped for the encoded logo
+_LOGO_PAYLOAD_TOKEN = "HOMEHIVE-LOGO-PAYLOAD"
+_logo_part = None  # (MIMEImage carrying the placeholder, base64-encoded logo bytes)
+_logo_part_lock = threading.Lock()
+
+def _get_logo_part() -> tuple:
+    """Returns the inline logo part and its encoded payload, read from disk and base64-encoded once per process."""
+    global _logo_part
+    if _logo_part is None:
+        with _logo_part_lock:
+            if _logo_part is None:
+                with open(_LOGO_PATH, 'rb') as f:
+                    logo = MIMEImage(f.read(), 'png')
+                logo.add_header('Content-ID', '<logo>')
+                encoded_logo = logo.get_payload().encode('ascii')
+                logo.set_payload(_LOGO_PAYLOAD_TOKEN)
+                _logo_part = (logo, encoded_logo)
+    return _logo_part
+
+def build_mime_message(subject: str, sender_email: str, recipient_email: str, html_body: str, text_body: str, cc_recipients: list = None) -> bytes:
     """
-    Sends an email using a specified template and context.
+    Builds the HomeHive email layout shared by every send: a mixed message holding a related part with the
+    plain text and HTML alternatives and the inline logo (referenced as cid:logo), serialized to bytes for SES.
+    The logo is encoded once per process and spliced into the serialized message, and the multipart
+    boundaries are set up front, so the generator neither re-encodes the logo nor scans it for a boundary.
+    """
+    logo, encoded_logo = _get_logo_part()
+    boundary = uuid.uuid4().hex
+
+    # Create the root message and set the headers.
+    msg = MIMEMultipart('mixed', boundary=f"==mixed-{boundary}")
+    msg['Subject'] = subject
+    msg['From'] = sender_email
+    msg['To'] = recipient_email
+    if cc_recipients:
+        msg['Cc'] = ', '.join(cc_recipients)
+
+    # Create a 'related' part for the HTML and embedded image.
+    msg_related = MIMEMultipart('related', boundary=f"==related-{boundary}")
+    msg.attach(msg_related)
+
+    # Create an 'alternative' part for the plain text and HTML.
+    msg_alternative = MIMEMultipart('alternative', boundary=f"==alternative-{boundary}")
+    msg_related.attach(msg_alternative)
+
+    msg_alternative.attach(MIMEText(text_body, 'plain'))
+    msg_alternative.attach(MIMEText(html_body, 'html'))
+    msg_related.attach(logo)
+    return msg.as_bytes().replace(_LOGO_PAYLOAD_TOKEN.encode('ascii'), encoded_logo, 1)
+
+def build_email(recipient_email: str, subject: str, template_name: str, template_env, context: dict, cc_recipients: list = None) -> dict | None:
+    """
+    Renders an email from a specified template and context.
+    Returns the message ready for send_raw_email, or None if it cannot be sent.
     """
     if not recipient_email:
         log.error("No recipient email provided. Skipping email.")
-        return False
+        return None
 
-    aws_region = "us-east-1"
     sender_email = os.environ.get("SENDER_EMAIL", "noreply@homehive.properties")
 
     if not sender_email:
         log.error("SENDER_EMAIL environment variable not set.")
-        return False
+        return None
     
     # --- Andon Cord / Safety Net ---
     is_testing = os.environ.get("TESTING_MODE", "true").lower() == "true"
@@ -44,69 +133,200 @@ def send_email(recipient_email: str, subject: str, template_name: str, template_
     # This is a generic fallback, you might want to customize it
     text_body = "This is an automated message from HomeHive. Please view the HTML version of this email."
 
-    aws_access_key_id = access_secret_version("AWS_ACCESS_KEY_ID")
-    aws_secret_access_key = access_secret_version("AWS_SECRET_ACCESS_KEY")
-
-    if not aws_access_key_id or not aws_secret_access_key:
-        log.error("Failed to retrieve AWS credentials from Secret Manager.")
-        return False
-
     try:
-        ses_client = boto3.client(
-            'ses',
-            region_name=aws_region,
-            aws_access_key_id=aws_access_key_id,
-            aws_secret_access_key=aws_secret_access_key
-        )
-        
-        msg = MIMEMultipart('mixed')
-        msg['Subject'] = subject
-        msg['From'] = sender_email
-        msg['To'] = recipient_email
-        if cc_recipients:
-            msg['Cc'] = ', '.join(cc_recipients)
-
-        msg_related = MIMEMultipart('related')
-        msg.attach(msg_related)
-        
-        msg_alternative = MIMEMultipart('alternative')
-        msg_related.attach(msg_alternative)
-
-        msg_alternative.attach(MIMEText(text_body, 'plain'))
-        msg_alternative.attach(MIMEText(html_body, 'html'))
-        
-        # Attach the logo
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        logo_path = os.path.normpath(os.path.join(current_dir, '..', 'templates', 'assets', 'apple-touch-icon.png'))
-        with open(logo_path, 'rb') as f:
-            logo_data = f.read()
-        logo = MIMEImage(logo_data, 'png')
-        logo.add_header('Content-ID', '<logo>')
-        msg_related.attach(logo)
+        raw_message = build_mime_message(subject, sender_email, recipient_email, html_body, text_body, cc_recipients=cc_recipients)
         
         destinations = [recipient_email]
         if cc_recipients:
             destinations.extend(cc_recipients)
 
-        ses_client.send_raw_email(
-            Source=sender_email,
-            Destinations=destinations,
-            RawMessage={'Data': msg.as_string()}
-        )
-        
-        log.info(f"Successfully sent email with subject '{subject}' to {recipient_email}")
-        if cc_recipients:
-            log.info(f"CC'd to: {', '.join(cc_recipients)}")
-        return True
+        return {
+            'source': sender_email,
+            'recipient_email': recipient_email,
+            'cc_recipients': cc_recipients or [],
+            'destinations': destinations,
+            'raw_message': raw_message,
+        }
     except Exception as e:
-        log.error(f"An unexpected error occurred while sending email: {e}")
+        log.error(f"An unexpected error occurred while building email: {e}")
+        return None
+
+def send_email(recipient_email: str, subject: str, template_name: str, template_env, context: dict, cc_recipients: list = None) -> bool:
+    """
+    Sends an email using a specified template and context.
+    """
+    aws_region = "us-east-1"
+    message = build_email(recipient_email, subject, template_name, template_env, context, cc_recipients=cc_recipients)
+    if message is None:
+        return False
+
+    ses_client = create_ses_client(aws_region)
+    if ses_client is None:
         return False
 
-def send_tenant_summary_email(tenant_info: dict, template_env, invoice_url: str = None, cc_recipients: list = None) -> bool:
+    return send_raw_email(message, ses_client)
+
+def create_ses_client(aws_region: str = "us-east-1"):
     """
-    Sends a consolidated rent reminder email to the tenant, summarizing multiple due rentals.
+    Returns the instance's SES client for the region and the current AWS credentials from Secret Manager.
+    Clients are kept in a process-wide registry and reused by every send on a warm instance, so the botocore
+    setup and the TLS connections are paid once. When the credentials rotate, the client built with the old
+    ones is dropped. SES_ENDPOINT_URL points the clients at another endpoint, such as a local SES stub.
+    Returns None if the credentials or the client are unavailable.
+    """
+    aws_access_key_id = access_secret_version("AWS_ACCESS_KEY_ID")
+    aws_secret_access_key = access_secret_version("AWS_SECRET_ACCESS_KEY")
+
+    if not aws_access_key_id or not aws_secret_access_key:
+        log.error("Failed to retrieve AWS credentials from Secret Manager.")
+        return None
+
+    endpoint_url = os.environ.get("SES_ENDPOINT_URL")
+    credential_fingerprint = hashlib.sha256(f"{aws_access_key_id}:{aws_secret_access_key}".encode()).hexdigest()[:16]
+    key = (aws_region, credential_fingerprint, endpoint_url)
+    with _ses_clients_lock:
+        if key in _ses_clients:
+            return _ses_clients[key]
+
+        stale_keys = [k for k in _ses_clients if k[0] == aws_region and k[2] == endpoint_url]
+        for stale_key in stale_keys:
+            log.info(f"AWS credentials changed; dropping the SES client for {aws_region}")
+            del _ses_clients[stale_key]
+
+        try:
+            _ses_clients[key] = boto3.client(
+                'ses',
+                region_name=aws_region,
+                aws_access_key_id=aws_access_key_id,
+                aws_secret_access_key=aws_secret_access_key,
+                endpoint_url=endpoint_url,
+                # call_ses retries throttling and connection errors itself, through the rate limiter
+                config=Config(max_pool_connections=SES_MAX_POOL_CONNECTIONS, retries={'mode': 'standard', 'max_attempts': 1}),
+            )
+        except Exception as e:
+            log.error(f"An unexpected error occurred while creating the SES client: {e}")
+            return None
+        return _ses_clients[key]
+
+def clear_ses_clients() -> None:
+    """Drops every cached SES client, e.g. between tests."""
+    with _ses_clients_lock:
+        _ses_clients.clear()
+
+class SendRateLimiter:
+    """
+    A token bucket that keeps an instance's SES sends under the account's sending rate. Each recipient
+    takes a token, and the bucket refills at `rate` tokens per second up to one second's worth.
+    The rate starts at the account's MaxSendRate; a throttling response halves it, and every successful
+    send wins back a twentieth of the maximum, so the instance settles just under what SES accepts.
+    """
+
+    def __init__(self, max_rate: float):
+        self.max_rate = max_rate
+        self.rate = max_rate
+        self.seeded_at = time.monotonic()
+        self._tokens = max(1.0, max_rate)
+        self._refilled_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(max(1.0, self.rate), self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def acquire(self, tokens: int = 1) -> None:
+        """Blocks until `tokens` sends fit in the rate. A call larger than the bucket waits for a full one and goes into debt."""
+        while True:
+            with self._lock:
+                self._refill()
+                needed = min(tokens, max(1.0, self.rate))
+                if self._tokens >= needed:
+                    self._tokens -= tokens
+                    return
+                wait = (needed - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    def on_throttled(self) -> None:
+        with self._lock:
+            self.rate = max(self.max_rate / 64, self.rate / 2)
+            self._tokens = min(self._tokens, 0.0)
+
+    def set_max_rate(self, max_rate: float) -> None:
+        with self._lock:
+            self.max_rate = max_rate
+            self.rate = min(self.rate, max_rate)
+            self.seeded_at = time.monotonic()
+
+def _account_max_send_rate(ses_client) -> float:
+    """Reads the account's MaxSendRate from SES, falling back to DEFAULT_SES_MAX_SEND_RATE."""
+    try:
+        max_send_rate = ses_client.get_send_quota().get('MaxSendRate')
+        if isinstance(max_send_rate, (int, float)) and max_send_rate > 0:
+            return float(max_send_rate)
+        log.warning(f"SES returned no usable MaxSendRate ({max_send_rate}); assuming {DEFAULT_SES_MAX_SEND_RATE}/s")
+    except Exception as e:
+        log.warning(f"Could not read the SES send quota, assuming {DEFAULT_SES_MAX_SEND_RATE}/s: {e}")
+    return DEFAULT_SES_MAX_SEND_RATE
+
+def get_send_rate_limiter(ses_client) -> SendRateLimiter:
+    """
+    Returns the rate limiter shared by every send through `ses_client`, seeded from the account's send
+    quota on first use and re-seeded every SES_QUOTA_REFRESH_SECONDS.
+    """
+    with _send_rate_limiters_lock:
+        limiter = _send_rate_limiters.get(ses_client)
+    if limiter is not None and time.monotonic() - limiter.seeded_at < SES_QUOTA_REFRESH_SECONDS:
+        return limiter
+
+    max_send_rate = _account_max_send_rate(ses_client)
+    with _send_rate_limiters_lock:
+        limiter = _send_rate_limiters.get(ses_client)
+        if limiter is None:
+            limiter = SendRateLimiter(max_send_rate)
+            _send_rate_limiters[ses_client] = limiter
+            log.info(f"SES sends limited to {max_send_rate}/s")
+        else:
+            limiter.set_max_rate(max_send_rate)
+    return limiter
+
+def call_ses(ses_client, operation: str, recipients: int, **kwargs):
+    """
+    Makes one SES send call (e.g. 'send_raw_email') for `recipients` recipients under the client's rate
+    limiter. Throttling responses and failed connections retry only this call, after slowing the limiter
+    and a jittered backoff, so the caller's rendering is not repeated. A daily quota error is not retried,
+    nor is an error the email may have been sent before (see SES_CONNECTION_ERRORS).
+    Returns the SES response; raises the last error once the attempts are used up.
+    """
+    limiter = get_send_rate_limiter(ses_client)
+    for attempt in range(1, SES_SEND_MAX_ATTEMPTS + 1):
+        limiter.acquire(recipients)
+        try:
+            response = getattr(ses_client, operation)(**kwargs)
+            limiter.on_success()
+            return response
+        except ClientError as e:
+            error = e.response.get('Error', {})
+            if error.get('Code') not in SES_THROTTLING_ERRORS or 'daily' in error.get('Message', '').lower() or attempt == SES_SEND_MAX_ATTEMPTS:
+                raise
+            limiter.on_throttled()
+            reason = f"throttled, sending at {limiter.rate:.1f}/s"
+        except SES_CONNECTION_ERRORS as e:
+            if attempt == SES_SEND_MAX_ATTEMPTS:
+                raise
+            reason = f"connection error: {e}"
+        delay = random.uniform(0, SES_RETRY_BASE_DELAY_SECONDS * 2 ** (attempt - 1))
+        log.warning(f"SES {operation} attempt {attempt} {reason}; retrying in {delay:.2f}s")
+        time.sleep(delay)
+
+def build_tenant_summary_email(tenant_info: dict, template_env, invoice_url: str = None, cc_recipients: list = None) -> dict | None:
+    """
+    Renders the consolidated rent reminder email for a tenant, summarizing multiple due rentals.
     Optionally, CCs a list of recipients (e.g., landlord).
-    Returns True if successful, False otherwise.
+    Returns the message ready for send_raw_email, or None if it cannot be sent.
     """
     tenant_id_for_logging = "UNKNOWN_TENANT_IN_EMAIL_SERVICE" # Initialize for logging
     try:
@@ -118,18 +338,17 @@ def send_tenant_summary_email(tenant_info: dict, template_env, invoice_url: str
 
         if not recipient_email:
             log.error(f"No email for tenant {tenant_id_for_logging}. Skipping email.")
-            return False
+            return None
             
-        aws_region = "us-east-1"
         sender_email = os.environ.get("SENDER_EMAIL", "noreply@homehive.properties")
     # ... (rest of the code)
     except Exception as e:
         log.error(f"An unexpected error occurred while sending consolidated email for tenant {tenant_id_for_logging}: {e}")
-        return False
+        return None
 
     if not sender_email:
         log.error("SENDER_EMAIL environment variable not set.")
-        return False
+        return None
     
     # --- Andon Cord / Safety Net ---
     is_testing = os.environ.get("TESTING_MODE", "true").lower() == "true"
@@ -155,73 +374,207 @@ def send_tenant_summary_email(tenant_info: dict, template_env, invoice_url: str
     if invoice_url:
         text_body += f"\nYour consolidated invoice is available here: {invoice_url}\n"
     text_body += "You can also log in to your HomeHive portal to view your statements or make payments: https://your-homehive-portal.com\n\nIf you have already made these payments or have any questions, please disregard this email or contact us directly.\n\nThank you for being a valued tenant.\n\nSincerely,\nThe HomeHive Team\n\n© 2025 HomeHive. All rights reserved.\nThis is an automated message, please do not reply."
-    
-    aws_access_key_id = access_secret_version("AWS_ACCESS_KEY_ID")
-    aws_secret_access_key = access_secret_version("AWS_SECRET_ACCESS_KEY")
-
-    if not aws_access_key_id or not aws_secret_access_key:
-        log.error("Failed to retrieve AWS credentials from Secret Manager.")
-        return False
 
     try:
-        ses_client = boto3.client(
-            'ses',
-            region_name=aws_region,
-            aws_access_key_id=aws_access_key_id,
-            aws_secret_access_key=aws_secret_access_key
-        )
-        
-        subject = "Reminder: Upcoming Rental Payments Due - HomeHive"
+        subject = TENANT_SUMMARY_SUBJECT
 
-        # Create the root message and set the headers.
-        msg = MIMEMultipart('mixed')
-        msg['Subject'] = subject
-        msg['From'] = sender_email
-        msg['To'] = recipient_email
-        if cc_recipients:
-            msg['Cc'] = ', '.join(cc_recipients)
+        raw_message = build_mime_message(subject, sender_email, recipient_email, html_body, text_body, cc_recipients=cc_recipients)
 
-        # Create a 'related' part for the HTML and embedded image.
-        msg_related = MIMEMultipart('related')
-        msg.attach(msg_related)
-        
-        # Create an 'alternative' part for the plain text and HTML.
-        msg_alternative = MIMEMultipart('alternative')
-        msg_related.attach(msg_alternative)
-
-        msg_alternative.attach(MIMEText(text_body, 'plain'))
-        msg_alternative.attach(MIMEText(html_body, 'html'))
-        
-        # Attach the logo
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        logo_path = os.path.normpath(os.path.join(current_dir, '..', 'templates', 'assets', 'apple-touch-icon.png'))
-        with open(logo_path, 'rb') as f:
-            logo_data = f.read()
-        logo = MIMEImage(logo_data, 'png')
-        logo.add_header('Content-ID', '<logo>')
-        msg_related.attach(logo)
-
-
-        
         # Determine all destinations for SES
         destinations = [recipient_email]
         if cc_recipients:
             destinations.extend(cc_recipients)
 
-        ses_client.send_raw_email(
-            Source=sender_email,
-            Destinations=destinations,
-            RawMessage={'Data': msg.as_string()}
+        return {
+            'source': sender_email,
+            'recipient_email': recipient_email,
+            'cc_recipients': cc_recipients or [],
+            'destinations': destinations,
+            'raw_message': raw_message,
+        }
+    except Exception as e:
+        log.error(f"An unexpected error occurred while building consolidated email: {e}")
+        return None
+
+def send_raw_email(message: dict, ses_client) -> bool:
+    """
+    Sends a message built by build_email or build_tenant_summary_email through SES.
+    Returns True if successful, False otherwise.
+    """
+    try:
+        call_ses(
+            ses_client, 'send_raw_email', len(message['destinations']),
+            Source=message['source'],
+            Destinations=message['destinations'],
+            RawMessage={'Data': message['raw_message']}
         )
         
-        log.info(f"Successfully sent consolidated email reminder to {recipient_email}")
-        if cc_recipients:
-            log.info(f"CC'd to: {', '.join(cc_recipients)}")
+        log.info(f"Successfully sent email to {message['recipient_email']}")
+        if message['cc_recipients']:
+            log.info(f"CC'd to: {', '.join(message['cc_recipients'])}")
         return True
     except Exception as e:
-        log.error(f"An unexpected error occurred while sending consolidated email: {e}")
+        log.error(f"An unexpected error occurred while sending email to {message['recipient_email']}: {e}")
         return False
 
+def send_tenant_summary_email(tenant_info: dict, template_env, invoice_url: str = None, cc_recipients: list = None, ses_client=None) -> bool:
+    """
+    Sends a consolidated rent reminder email to the tenant, summarizing multiple due rentals.
+    Optionally, CCs a list of recipients (e.g., landlord).
+    Pass `ses_client` to reuse one client across several emails; otherwise one is created.
+    Returns True if successful, False otherwise.
+    """
+    message = build_tenant_summary_email(tenant_info, template_env, invoice_url=invoice_url, cc_recipients=cc_recipients)
+    if message is None:
+        return False
+
+    if ses_client is None:
+        ses_client = create_ses_client()
+        if ses_client is None:
+            return False
+
+    return send_raw_email(message, ses_client)
+
+def _tenant_summary_template(template_env) -> dict:
+    """
+    Derives the SES template of the tenant reminder from tenant_summary_email.html: the Jinja template is
+    rendered with Handlebars placeholders and its rental row is wrapped in an {{#each}} block. Templated
+    emails cannot carry the inline logo, so it is loaded from EMAIL_LOGO_URL, or left out if that is unset.
+    The template name carries a hash of its content, so a changed template is registered under a new name.
+    """
+    placeholder_rental = {'property_name': '{{property_name}}', 'rent_amount': '{{rent_amount}}', 'dueDate': '{{dueDate}}'}
+    html_part = template_env.get_template('tenant_summary_email.html').render(
+        name='{{name}}', due_rentals=[placeholder_rental], invoice_url='{{invoice_url}}'
+    )
+    html_part = re.sub(r'(<tr>\s*<td>\{\{property_name\}\}.*?</tr>)', r'{{#each due_rentals}}\1{{/each}}', html_part, flags=re.DOTALL)
+    logo_url = os.environ.get("EMAIL_LOGO_URL")
+    if logo_url:
+        html_part = html_part.replace('cid:logo', logo_url)
+    else:
+        html_part = re.sub(r'<img src="cid:logo"[^>]*>', '', html_part)
+
+    text_part = (
+        "Hi {{name}},\n\nThis is a friendly reminder that multiple rent payments are due soon for the following properties:\n\n"
+        "{{#each due_rentals}}- Property: {{property_name}}, Amount: ZMW {{rent_amount}}, Due Date: {{dueDate}}\n{{/each}}"
+        "\nYour consolidated invoice is available here: {{invoice_url}}\n"
+        "You can also log in to your HomeHive portal to view your statements or make payments: https://your-homehive-portal.com\n\nIf you have already made these payments or have any questions, please disregard this email or contact us directly.\n\nThank you for being a valued tenant.\n\nSincerely,\nThe HomeHive Team\n\n© 2025 HomeHive. All rights reserved.\nThis is an automated message, please do not reply."
+    )
+    content_hash = hashlib.sha256(f"{html_part}{text_part}".encode()).hexdigest()[:12]
+    return {
+        'TemplateName': f"HomeHiveTenantSummary-{content_hash}",
+        'SubjectPart': TENANT_SUMMARY_SUBJECT,
+        'HtmlPart': html_part,
+        'TextPart': text_part,
+    }
+
+def register_tenant_summary_template(ses_client, template_env) -> str:
+    """
+    Makes sure the tenant reminder template exists in SES, creating it on first use in the instance.
+    Returns the template name.
+    """
+    template = _tenant_summary_template(template_env)
+    key = (id(ses_client), template['TemplateName'])
+    with _registered_templates_lock:
+        if key in _registered_templates:
+            return template['TemplateName']
+        try:
+            ses_client.create_template(Template=template)
+            log.info(f"Registered SES template {template['TemplateName']}")
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') != 'AlreadyExists':
+                raise
+        _registered_templates.add(key)
+    return template['TemplateName']
+
+def send_bulk_tenant_summary_emails(reminders: list, template_env, ses_client) -> list:
+    """
+    Sends tenant reminders with SES bulk templated sends: up to BULK_SEND_MAX_DESTINATIONS tenants per API
+    call, each with its own replacement data and CCs. `reminders` holds {'tenant_consolidated_info',
+    'invoice_url', 'cc_recipients'} dicts. A reminder SES did not send (the template could not be
+    registered, the call was rejected, or its destination failed) is sent again as its own raw email.
+    Returns True or False per reminder, in order.
+    """
+    sender_email = os.environ.get("SENDER_EMAIL", "noreply@homehive.properties")
+    is_testing = os.environ.get("TESTING_MODE", "true").lower() == "true"
+    results = [False] * len(reminders)
+
+    def send_raw(index):
+        results[index] = send_tenant_summary_email(
+            reminders[index]['tenant_consolidated_info'], template_env, invoice_url=reminders[index]['invoice_url'],
+            cc_recipients=reminders[index].get('cc_recipients'), ses_client=ses_client,
+        )
+
+    bulk_indexes = []
+    for index, reminder in enumerate(reminders):
+        if not reminder['tenant_consolidated_info'].get('tenant_info', {}).get('email'):
+            log.error(f"No email for tenant {reminder['tenant_consolidated_info'].get('tenant_info', {}).get('tenant_id')}. Skipping email.")
+        else:
+            bulk_indexes.append(index)
+    if not bulk_indexes:
+        return results
+
+    try:
+        template_name = register_tenant_summary_template(ses_client, template_env)
+    except Exception as e:
+        log.error(f"An unexpected error occurred while registering the SES template: {e}. Sending the reminders one by one.")
+        for index in bulk_indexes:
+            send_raw(index)
+        return results
+
+    for chunk_start in range(0, len(bulk_indexes), BULK_SEND_MAX_DESTINATIONS):
+        chunk = bulk_indexes[chunk_start:chunk_start + BULK_SEND_MAX_DESTINATIONS]
+        destinations = []
+        for index in chunk:
+            tenant_consolidated_info = reminders[index]['tenant_consolidated_info']
+            tenant_details = tenant_consolidated_info.get('tenant_info', {})
+            cc_recipients = reminders[index].get('cc_recipients') or []
+            # --- Andon Cord / Safety Net ---
+            recipient_email = "info@kactusit.com" if is_testing else tenant_details.get('email')
+            if is_testing and cc_recipients:
+                cc_recipients = [recipient_email]
+            destination = {'ToAddresses': [recipient_email]}
+            if cc_recipients:
+                destination['CcAddresses'] = cc_recipients
+            destinations.append({
+                'Destination': destination,
+                'ReplacementTemplateData': json.dumps({
+                    'name': tenant_details.get('name', 'Tenant'),
+                    'due_rentals': [
+                        {key: rental.get(key, 'N/A') for key in ('property_name', 'rent_amount', 'dueDate')}
+                        for rental in tenant_consolidated_info.get('due_rentals', [])
+                    ],
+                    'invoice_url': reminders[index]['invoice_url'],
+                }),
+            })
+        if is_testing:
+            log.warning(f"TESTING_MODE is active. Redirecting {len(chunk)} bulk reminder emails and their CCs to info@kactusit.com")
+        recipients = sum(len(d['Destination']['ToAddresses']) + len(d['Destination'].get('CcAddresses', [])) for d in destinations)
+        try:
+            response = call_ses(
+                ses_client, 'send_bulk_templated_email', recipients,
+                Source=sender_email,
+                Template=template_name,
+                DefaultTemplateData=json.dumps({'name': 'Tenant', 'due_rentals': [], 'invoice_url': ''}),
+                Destinations=destinations,
+            )
+        except ClientError as e:
+            # SES rejected the whole call, so none of the chunk was sent
+            log.error(f"SES rejected the bulk send of {len(chunk)} reminder emails: {e}. Sending them one by one.")
+            for index in chunk:
+                send_raw(index)
+            continue
+        except Exception as e:
+            # The emails may have gone out before the error, so they are not sent again here
+            log.error(f"An unexpected error occurred while sending {len(chunk)} bulk reminder emails: {e}")
+            continue
+        for index, status in zip(chunk, response.get('Status', [])):
+            results[index] = status.get('Status') == 'Success'
+            if not results[index]:
+                log.error(f"Bulk reminder email for tenant {reminders[index]['tenant_consolidated_info'].get('tenant_info', {}).get('tenant_id')} failed: {status.get('Error')}. Sending it on its own.")
+                send_raw(index)
+        log.info(f"Sent {sum(results[index] for index in chunk)} of {len(chunk)} reminder emails through one bulk send")
+    return results
+
 def send_landlord_summary_email(landlord_email: str, due_rentals_list: list, template_env) -> bool:
     """
     Sends a consolidated rental payment summary email to a landlord.
@@ -255,53 +608,20 @@ def send_landlord_summary_email(landlord_email: str, due_rentals_list: list, tem
         text_body += f"- Tenant: {rental.get('tenant_name')}, Property: {rental.get('property_name')}, Amount: ZMW {rental.get('amount')}, Due Date: {rental.get('due_date')}\n"
     text_body += "\nPlease review these upcoming payments.\n\nSincerely,\nThe HomeHive Team\n\n© 2025 HomeHive. All rights reserved.\nThis is an automated message, please do not reply."
     
-    aws_access_key_id = access_secret_version("AWS_ACCESS_KEY_ID")
-    aws_secret_access_key = access_secret_version("AWS_SECRET_ACCESS_KEY")
-
-    if not aws_access_key_id or not aws_secret_access_key:
-        log.error("Failed to retrieve AWS credentials from Secret Manager.")
+    ses_client = create_ses_client(aws_region)
+    if ses_client is None:
         return False
 
     try:
-        ses_client = boto3.client(
-            'ses',
-            region_name=aws_region,
-            aws_access_key_id=aws_access_key_id,
-            aws_secret_access_key=aws_secret_access_key
-        )
-        
         subject = "Upcoming Rental Payments Due"
 
-        # Create the root message and set the headers.
-        msg = MIMEMultipart('mixed')
-        msg['Subject'] = subject
-        msg['From'] = sender_email
-        msg['To'] = landlord_email
-
-        # Create a 'related' part for the HTML and embedded image.
-        msg_related = MIMEMultipart('related')
-        msg.attach(msg_related)
-        
-        # Create an 'alternative' part for the plain text and HTML.
-        msg_alternative = MIMEMultipart('alternative')
-        msg_related.attach(msg_alternative)
-
-        msg_alternative.attach(MIMEText(text_body, 'plain'))
-        msg_alternative.attach(MIMEText(html_body, 'html'))
-        
-        # Attach the logo
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        logo_path = os.path.normpath(os.path.join(current_dir, '..', 'templates', 'assets', 'apple-touch-icon.png'))
-        with open(logo_path, 'rb') as f:
-            logo_data = f.read()
-        logo = MIMEImage(logo_data, 'png')
-        logo.add_header('Content-ID', '<logo>')
-        msg_related.attach(logo)
+        raw_message = build_mime_message(subject, sender_email, landlord_email, html_body, text_body)
         
-        ses_client.send_raw_email(
+        call_ses(
+            ses_client, 'send_raw_email', 1,
             Source=sender_email,
             Destinations=[landlord_email],
-            RawMessage={'Data': msg.as_string()}
+            RawMessage={'Data': raw_message}
         )
         
         log.info(f"Successfully sent landlord summary email to {landlord_email}")
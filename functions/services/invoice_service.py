@@ -1,5 +1,7 @@
 from fpdf import FPDF, XPos, YPos
 from datetime import datetime
+import hashlib
+import json
 
 class PDF(FPDF):
     def header(self):
@@ -23,6 +25,17 @@ class PDF(FPDF):
         # Page number on the right
         self.cell(0, 10, f'Page {self.page_no()}', border=0, align='R', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
 
+def invoice_content_hash(tenant_info: dict) -> str:
+    """
+    Hashes the inputs of a consolidated invoice: the tenant's details and each due rental's property,
+    amount and due date. Two payloads with the same hash produce the same invoice.
+    """
+    content = {
+        'tenant_info': tenant_info.get('tenant_info', {}),
+        'due_rentals': tenant_info.get('due_rentals', []),
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+
 def create_invoice_pdf(tenant_info: dict) -> tuple[bytes, str]:
     """
     Creates a consolidated rent invoice PDF for the tenant.
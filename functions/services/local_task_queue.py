@@ -0,0 +1,141 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import Flask, request
+
+# Set up a module-level logger
+log = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 4
+
+def _percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+class LocalTaskQueue:
+    """
+    In-process stand-in for the Cloud Tasks queue, for local runs and load tests.
+    Tasks are dispatched to the HTTP functions of this process by `concurrency` worker threads, not
+    before their schedule time; each handler is called with a Flask test request carrying the JSON payload.
+    With `concurrency=0` every task runs synchronously inside submit() (the inline backend).
+    Task names are deduplicated like Cloud Tasks does. Per task, `stats` records how long it waited in
+    the queue past its schedule time and how long its handler took.
+    """
+
+    def __init__(self, resolve_handler, concurrency: int = DEFAULT_CONCURRENCY):
+        self._resolve_handler = resolve_handler
+        self._app = Flask('local-task-queue')
+        self._heap = []
+        self._sequence = itertools.count()
+        self._names = set()
+        self._in_flight = 0
+        self._stopped = False
+        self._condition = threading.Condition()
+        self.stats = []
+        self._workers = [threading.Thread(target=self._work, name=f"local-task-{i}", daemon=True) for i in range(concurrency)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, name: str, target_function: str, payload: dict, schedule_time: datetime = None) -> str:
+        """
+        Queues a task. Returns 'created', or 'duplicate' if a task with this name was already submitted.
+        """
+        with self._condition:
+            if name in self._names:
+                return 'duplicate'
+            self._names.add(name)
+
+            delay = 0.0
+            if schedule_time is not None:
+                delay = max(0.0, (schedule_time - datetime.now(timezone.utc)).total_seconds())
+            task = (time.monotonic() + delay, next(self._sequence), name, target_function, payload)
+            if not self._workers:
+                self._in_flight += 1
+            else:
+                heapq.heappush(self._heap, task)
+                self._condition.notify()
+
+        if not self._workers:
+            self._run(task)
+        return 'created'
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self._stopped and (not self._heap or self._heap[0][0] > time.monotonic()):
+                    self._condition.wait(timeout=self._heap[0][0] - time.monotonic() if self._heap else None)
+                if self._stopped:
+                    return
+                task = heapq.heappop(self._heap)
+                self._in_flight += 1
+            self._run(task)
+
+    def _run(self, task: tuple):
+        due_at, _, name, target_function, payload = task
+        started = time.monotonic()
+        try:
+            handler = self._resolve_handler(target_function)
+            with self._app.test_request_context(method='POST', json=payload):
+                response = handler(request)
+            status = getattr(response, 'status_code', 200)
+        except Exception as e:
+            log.error(f"Local task {name} for {target_function} raised: {e}")
+            status = 500
+        finished = time.monotonic()
+
+        with self._condition:
+            self.stats.append({
+                'name': name,
+                'target_function': target_function,
+                'status': status,
+                'queue_wait': max(0.0, started - due_at),
+                'latency': finished - started,
+                'finished_at': finished,
+            })
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def join(self, timeout: float = None) -> bool:
+        """
+        Waits until every queued task, including ones queued by handlers, has run.
+        Returns False if `timeout` seconds passed first.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self._heap or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(timeout=remaining)
+        return True
+
+    def shutdown(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        for worker in self._workers:
+            worker.join()
+
+    def summary(self) -> dict:
+        """Aggregates the recorded per-task stats: counts, status codes and p50/p95 queue wait and handler latency."""
+        with self._condition:
+            stats = list(self.stats)
+        waits = [s['queue_wait'] for s in stats]
+        latencies = [s['latency'] for s in stats]
+        statuses = {}
+        for s in stats:
+            statuses[s['status']] = statuses.get(s['status'], 0) + 1
+        return {
+            'tasks': len(stats),
+            'statuses': statuses,
+            'queue_wait_p50': _percentile(waits, 0.5),
+            'queue_wait_p95': _percentile(waits, 0.95),
+            'latency_p50': _percentile(latencies, 0.5),
+            'latency_p95': _percentile(latencies, 0.95),
+        }
@@ -0,0 +1,238 @@
+# functions/services/outbox_service.py
+
+import base64
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import firebase_admin.db as db
+
+from constants import OUTBOX_PATH
+from .email_service import send_raw_email
+
+# Set up a module-level logger
+log = logging.getLogger(__name__)
+
+# OUTBOX_BACKEND selects where spooled emails wait for the drainer: the Realtime Database (default) or,
+# for local runs and benchmarks, one JSON file per message under OUTBOX_LOCAL_DIR
+OUTBOX_BACKEND_RTDB = 'rtdb'
+OUTBOX_BACKEND_LOCAL = 'local'
+DEFAULT_OUTBOX_LOCAL_DIR = os.path.join(tempfile.gettempdir(), 'homehive-outbox')
+
+# Messages the drainer reads from the spool at a time, and threads sending them over the shared SES client
+OUTBOX_DRAIN_BATCH_SIZE = 100
+OUTBOX_DRAIN_WORKERS = 8
+# Failed sends of a message before it is parked under failed/ instead of being retried
+OUTBOX_MAX_ATTEMPTS = 5
+
+_outboxes = {}
+_outboxes_lock = threading.Lock()
+# One drain at a time per instance; a second drain task arriving meanwhile leaves the work to the running one
+_drain_lock = threading.Lock()
+
+def outbox_enabled() -> bool:
+    """True when EMAIL_OUTBOX is set, i.e. callers spool their emails instead of sending them to SES themselves."""
+    return os.environ.get('EMAIL_OUTBOX', 'false').lower() == 'true'
+
+class RealtimeDatabaseOutbox:
+    """
+    The spool in the Realtime Database. Messages wait under Outbox/pending/{id} and move to sent/{id}
+    or failed/{id} with their delivery state; the outcomes of a drained batch are one multi-location update.
+    """
+
+    def __init__(self, path: str = OUTBOX_PATH):
+        self.path = path
+
+    def add(self, message_id: str, record: dict) -> bool:
+        if db.reference(f"{self.path}/sent/{message_id}").get(shallow=True) is not None:
+            return False
+        db.reference(f"{self.path}/pending/{message_id}").set(record)
+        return True
+
+    def pending(self, limit: int) -> dict:
+        records = db.reference(f"{self.path}/pending").order_by_key().limit_to_first(limit).get()
+        return dict(records) if records else {}
+
+    def record_deliveries(self, outcomes: dict) -> None:
+        updates = {}
+        for message_id, (node, record) in outcomes.items():
+            updates[f"pending/{message_id}"] = record if node == 'pending' else None
+            if node != 'pending':
+                updates[f"{node}/{message_id}"] = record
+        if updates:
+            db.reference(self.path).update(updates)
+
+class LocalFileOutbox:
+    """
+    A stand-in spool on the local filesystem: one JSON file per message in pending/, sent/ and failed/
+    directories. Files are written under a temporary name and renamed into place, so readers never see
+    a partial message.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        for node in ('pending', 'sent', 'failed'):
+            os.makedirs(os.path.join(directory, node), exist_ok=True)
+
+    def _path(self, node: str, message_id: str) -> str:
+        return os.path.join(self.directory, node, f"{message_id}.json")
+
+    def _write(self, node: str, message_id: str, record: dict) -> None:
+        path = self._path(node, message_id)
+        temporary_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temporary_path, 'w') as f:
+            json.dump(record, f)
+        os.replace(temporary_path, path)
+
+    def add(self, message_id: str, record: dict) -> bool:
+        if os.path.exists(self._path('sent', message_id)):
+            return False
+        self._write('pending', message_id, record)
+        return True
+
+    def pending(self, limit: int) -> dict:
+        file_names = sorted(name for name in os.listdir(os.path.join(self.directory, 'pending')) if name.endswith('.json'))
+        records = {}
+        for file_name in file_names[:limit]:
+            try:
+                with open(os.path.join(self.directory, 'pending', file_name)) as f:
+                    records[file_name[:-len('.json')]] = json.load(f)
+            except FileNotFoundError:
+                continue
+        return records
+
+    def record_deliveries(self, outcomes: dict) -> None:
+        for message_id, (node, record) in outcomes.items():
+            self._write(node, message_id, record)
+            if node != 'pending':
+                try:
+                    os.remove(self._path('pending', message_id))
+                except FileNotFoundError:
+                    pass
+
+def get_outbox():
+    """
+    Returns the process-wide spool selected by OUTBOX_BACKEND, creating it on first use.
+    """
+    backend = os.environ.get('OUTBOX_BACKEND', OUTBOX_BACKEND_RTDB).lower()
+    key = backend
+    if backend == OUTBOX_BACKEND_LOCAL:
+        key = (backend, os.environ.get('OUTBOX_LOCAL_DIR', DEFAULT_OUTBOX_LOCAL_DIR))
+    with _outboxes_lock:
+        if key not in _outboxes:
+            _outboxes[key] = LocalFileOutbox(key[1]) if backend == OUTBOX_BACKEND_LOCAL else RealtimeDatabaseOutbox()
+        return _outboxes[key]
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+def spool_email(message: dict, key: str = None) -> str | None:
+    """
+    Appends a message built for send_raw_email to the outbox, for the drainer to send.
+    `key` is the message's content key: spooling the same key again replaces the waiting message, and a
+    message already sent is not spooled again, so a retried caller does not email twice. Without a key
+    every call spools a new message.
+    Returns the message id, or None if the message could not be spooled.
+    """
+    message_id = hashlib.sha256(key.encode()).hexdigest()[:32] if key else uuid.uuid4().hex
+    raw_message = message['raw_message']
+    if isinstance(raw_message, str):
+        raw_message = raw_message.encode()
+    record = {
+        'source': message['source'],
+        'destinations': message['destinations'],
+        'recipientEmail': message['recipient_email'],
+        'ccRecipients': message.get('cc_recipients') or [],
+        'rawMessage': base64.b64encode(raw_message).decode('ascii'),
+        'attempts': 0,
+        'enqueuedAt': _now(),
+    }
+    try:
+        if get_outbox().add(message_id, record):
+            log.info(f"Spooled email {message_id} to {message['recipient_email']}")
+        else:
+            log.info(f"Email {message_id} to {message['recipient_email']} was already sent; not spooling it again")
+        return message_id
+    except Exception as e:
+        log.error(f"Error spooling email to {message['recipient_email']}: {e}")
+        return None
+
+def _message_from_record(record: dict) -> dict:
+    return {
+        'source': record['source'],
+        'destinations': record['destinations'],
+        'recipient_email': record['recipientEmail'],
+        'cc_recipients': record.get('ccRecipients') or [],
+        'raw_message': base64.b64decode(record['rawMessage']),
+    }
+
+def _send_spooled(record: dict, ses_client) -> bool:
+    try:
+        return send_raw_email(_message_from_record(record), ses_client)
+    except Exception as e:
+        log.error(f"An unexpected error occurred sending spooled email to {record.get('recipientEmail')}: {e}")
+        return False
+
+def _delivery_outcome(record: dict, success: bool) -> tuple:
+    """Returns (node, record): where the message goes after a send attempt, with its delivery state."""
+    attempts = record.get('attempts', 0) + 1
+    if success:
+        delivered = {key: value for key, value in record.items() if key not in ('rawMessage', 'lastError')}
+        return 'sent', {**delivered, 'attempts': attempts, 'sentAt': _now()}
+    record = {**record, 'attempts': attempts, 'lastAttemptAt': _now(), 'lastError': "SES send failed"}
+    if attempts >= OUTBOX_MAX_ATTEMPTS:
+        return 'failed', record
+    return 'pending', record
+
+def drain_outbox(ses_client, deadline: float = None, batch_size: int = OUTBOX_DRAIN_BATCH_SIZE) -> dict:
+    """
+    Sends the spooled emails in batches over one shared SES client, whose rate limiter keeps them within
+    the account's sending rate (see email_service.call_ses), and records each message's delivery state: sent, back to pending with its attempt count,
+    or failed after OUTBOX_MAX_ATTEMPTS. A message that fails is not retried within the same drain.
+    Stops when the spool is empty or at `deadline` (a time.monotonic() value).
+    Returns {'sent', 'retried', 'failed', 'remaining'}; 'remaining' is True if it stopped at the
+    deadline with messages still waiting.
+    """
+    summary = {'sent': 0, 'retried': 0, 'failed': 0, 'remaining': False}
+    if not _drain_lock.acquire(blocking=False):
+        log.info("The outbox is already being drained on this instance")
+        return summary
+
+    try:
+        outbox = get_outbox()
+        retrying = set()
+        with ThreadPoolExecutor(max_workers=OUTBOX_DRAIN_WORKERS, thread_name_prefix="outbox-drain") as executor:
+            while True:
+                # Read past the messages that already failed in this drain, so they do not hide newer ones
+                records = {message_id: record for message_id, record in outbox.pending(batch_size + len(retrying)).items() if message_id not in retrying}
+                if not records:
+                    break
+                if deadline is not None and time.monotonic() >= deadline:
+                    summary['remaining'] = True
+                    break
+
+                sent = executor.map(lambda record: _send_spooled(record, ses_client), records.values())
+                outcomes = {message_id: _delivery_outcome(record, success) for (message_id, record), success in zip(records.items(), sent)}
+                try:
+                    outbox.record_deliveries(outcomes)
+                except Exception as e:
+                    # The batch stays pending and is sent again by a later drain
+                    log.error(f"Error recording the delivery state of {len(outcomes)} outbox messages: {e}")
+                    summary['remaining'] = True
+                    break
+
+                for message_id, (node, _) in outcomes.items():
+                    summary[{'sent': 'sent', 'pending': 'retried', 'failed': 'failed'}[node]] += 1
+                    if node == 'pending':
+                        retrying.add(message_id)
+        log.info(f"Outbox drained: {summary['sent']} sent, {summary['retried']} to retry, {summary['failed']} failed")
+        return summary
+    finally:
+        _drain_lock.release()
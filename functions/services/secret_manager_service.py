@@ -1,5 +1,8 @@
 import os
 import logging
+import threading
+import time
+from concurrent.futures import Future
 from google.cloud import secretmanager
 from google.api_core.exceptions import PermissionDenied
 
@@ -9,11 +12,72 @@ log = logging.getLogger(__name__)
 # Initialize Secret Manager client
 secret_client = secretmanager.SecretManagerServiceClient()
 
+# Secrets stay cached in the instance this long; within the last SECRET_REFRESH_AHEAD_SECONDS of that
+# a read returns the cached value and refreshes it in the background, so warm callers never wait
+SECRET_CACHE_TTL_SECONDS = int(os.environ.get('SECRET_CACHE_TTL_SECONDS', 300))
+SECRET_REFRESH_AHEAD_SECONDS = 60
+# Secrets every email needs, fetched when an instance starts
+PREFETCH_SECRET_IDS = ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY")
+
+_secret_cache = {}  # (secret_id, version_id) -> (value, fetched_at)
+_secret_fetches = {}  # (secret_id, version_id) -> Future of the fetch in flight
+_secret_lock = threading.Lock()
+
 def access_secret_version(secret_id, version_id="latest"):
     """Access the payload for the given secret version if one exists.
     
     The version can be a version number or the string "latest".
+    Values are cached for SECRET_CACHE_TTL_SECONDS, and concurrent callers asking for a secret
+    that is not cached share one request to Secret Manager. Failed reads are not cached.
     """
+    key = (secret_id, version_id)
+    with _secret_lock:
+        cached = _secret_cache.get(key)
+        if cached is not None:
+            value, fetched_at = cached
+            age = time.monotonic() - fetched_at
+            if age < SECRET_CACHE_TTL_SECONDS:
+                if age >= SECRET_CACHE_TTL_SECONDS - SECRET_REFRESH_AHEAD_SECONDS and key not in _secret_fetches:
+                    _start_fetch(key, background=True)
+                return value
+        future = _secret_fetches.get(key)
+        leader = future is None
+        if leader:
+            future = _start_fetch(key)
+    if leader:
+        _run_fetch(key, future)
+    return future.result()
+
+def _start_fetch(key: tuple, background: bool = False) -> Future:
+    """Registers a fetch of `key` as in flight; with `background` it runs on its own thread. Call with _secret_lock held."""
+    future = Future()
+    _secret_fetches[key] = future
+    if background:
+        threading.Thread(target=_run_fetch, args=(key, future), daemon=True, name=f"secret-refresh-{key[0]}").start()
+    return future
+
+def _run_fetch(key: tuple, future: Future) -> None:
+    value = _fetch_secret_version(*key)
+    with _secret_lock:
+        if value is not None:
+            _secret_cache[key] = (value, time.monotonic())
+        _secret_fetches.pop(key, None)
+    future.set_result(value)
+
+def prefetch_secrets(secret_ids=PREFETCH_SECRET_IDS) -> None:
+    """Starts loading the given secrets into the cache in the background, without waiting for them."""
+    with _secret_lock:
+        for secret_id in secret_ids:
+            key = (secret_id, "latest")
+            if key not in _secret_cache and key not in _secret_fetches:
+                _start_fetch(key, background=True)
+
+def clear_secret_cache() -> None:
+    with _secret_lock:
+        _secret_cache.clear()
+
+def _fetch_secret_version(secret_id, version_id="latest"):
+    """Reads a secret version from Secret Manager. Returns None if it cannot be read."""
     try:
         project_id = os.environ.get('GCLOUD_PROJECT') # Firebase automatically sets this
         if not project_id:
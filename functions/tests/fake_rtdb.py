@@ -0,0 +1,132 @@
+import copy
+import threading
+import time
+
+
+class FakeRealtimeDatabase:
+    """
+    A small in-memory stand-in for the Firebase Realtime Database used by the concurrency tests.
+    Each get/set/update is atomic, like on the real server, and update() resolves
+    {'.sv': {'increment': n}} server values. `read_delay` widens the gap between a client's read
+    and its next write, so read-modify-write races show up reliably.
+    """
+
+    def __init__(self, data: dict = None, read_delay: float = 0.0):
+        self._data = copy.deepcopy(data) if data else {}
+        self._lock = threading.Lock()
+        self.read_delay = read_delay
+
+    def reference(self, path: str = '/'):
+        return FakeReference(self, path)
+
+    @staticmethod
+    def _split(path: str) -> list:
+        return [part for part in path.split('/') if part]
+
+    def _get(self, parts: list):
+        node = self._data
+        for part in parts:
+            if not isinstance(node, dict) or part not in node:
+                return None
+            node = node[part]
+        return copy.deepcopy(node)
+
+    def _set(self, parts: list, value):
+        if not parts:
+            self._data = copy.deepcopy(value) if value is not None else {}
+            return
+        node = self._data
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        if value is None:
+            node.pop(parts[-1], None)
+            self._prune(parts[:-1])
+        else:
+            node[parts[-1]] = self._resolve(node.get(parts[-1]), value)
+
+    def _prune(self, parts: list):
+        # Like the server, drop parent nodes left without children
+        while parts and self._get(parts) == {}:
+            parent = self._data
+            for part in parts[:-1]:
+                parent = parent[part]
+            del parent[parts[-1]]
+            parts = parts[:-1]
+
+    @staticmethod
+    def _resolve(current, value):
+        if isinstance(value, dict) and '.sv' in value:
+            return (current or 0) + value['.sv']['increment']
+        return copy.deepcopy(value)
+
+
+class FakeReference:
+    """The subset of firebase_admin.db.Reference used by the services."""
+
+    def __init__(self, database: FakeRealtimeDatabase, path: str):
+        self._database = database
+        self._parts = FakeRealtimeDatabase._split(path)
+
+    def get(self, shallow=False):
+        with self._database._lock:
+            value = self._database._get(self._parts)
+        if self._database.read_delay:
+            time.sleep(self._database.read_delay)
+        if shallow and isinstance(value, dict):
+            return {key: True for key in value}
+        return value
+
+    def set(self, value):
+        with self._database._lock:
+            self._database._set(self._parts, value)
+
+    def delete(self):
+        self.set(None)
+
+    def update(self, value: dict):
+        with self._database._lock:
+            for relative_path, child_value in value.items():
+                self._database._set(self._parts + FakeRealtimeDatabase._split(relative_path), child_value)
+
+    def order_by_key(self):
+        return FakeQuery(self)
+
+    def order_by_child(self, child: str):
+        return FakeQuery(self, child)
+
+
+class FakeQuery:
+    """
+    order_by_key() with limit_to_first(n) and/or end_at(key): children of a node in key order;
+    order_by_child(child) with equal_to(value): the children whose `child` equals the value.
+    """
+
+    def __init__(self, reference: FakeReference, child: str = None):
+        self._reference = reference
+        self._child = child
+        self._limit = None
+        self._end_at = None
+        self._equal_to = None
+
+    def equal_to(self, value):
+        self._equal_to = value
+        return self
+
+    def end_at(self, key: str):
+        self._end_at = key
+        return self
+
+    def limit_to_first(self, limit: int):
+        self._limit = limit
+        return self
+
+    def get(self):
+        value = self._reference.get()
+        if not isinstance(value, dict):
+            return value
+        if self._child is not None:
+            return {key: child for key, child in sorted(value.items()) if isinstance(child, dict) and child.get(self._child) == self._equal_to}
+        keys = [key for key in sorted(value) if self._end_at is None or key <= self._end_at]
+        if self._limit is not None:
+            keys = keys[:self._limit]
+        return {key: value[key] for key in keys}
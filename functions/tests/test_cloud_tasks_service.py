@@ -0,0 +1,158 @@
+import unittest
+import json
+import sys
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch, MagicMock
+
+from google.api_core import exceptions as api_exceptions
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import functions.services.cloud_tasks_service as cloud_tasks_service
+from functions.services.cloud_tasks_service import enqueue_tasks, dispatch_schedule
+
+class TestEnqueueTasks(unittest.TestCase):
+    def setUp(self):
+        cloud_tasks_service._tasks_client = None
+        self.mock_client_class = patch('functions.services.cloud_tasks_service.tasks_v2.CloudTasksClient').start()
+        self.mock_client = self.mock_client_class.return_value
+        self.mock_client.queue_path.return_value = "projects/p/locations/l/queues/q"
+        self.mock_client.task_path.side_effect = lambda project, location, queue, name: f"{self.mock_client.queue_path.return_value}/tasks/{name}"
+        self.mock_client.create_task.side_effect = lambda parent, task: MagicMock(name=task['name'])
+        patch.object(cloud_tasks_service, 'RETRY_BASE_DELAY_SECONDS', 0).start()
+
+    def tearDown(self):
+        patch.stopall()
+        cloud_tasks_service._tasks_client = None
+
+    def test_client_is_created_once_and_results_follow_payload_order(self):
+        payloads = [{'tenant_id': f"tenant_{i}"} for i in range(20)]
+
+        first = enqueue_tasks(payloads, target_function="send_notification_worker", task_name_prefix="send-notification-")
+        enqueue_tasks(payloads[:1], target_function="send_notification_worker")
+
+        self.mock_client_class.assert_called_once()
+        self.assertEqual(len(first), 20)
+        for payload, result in zip(payloads, first):
+            self.assertEqual(result['status'], 'created')
+            self.assertIn(f"/tasks/send-notification-{payload['tenant_id']}-", result['name'])
+        self.assertEqual(self.mock_client.create_task.call_count, 21)
+
+    def test_tasks_are_created_concurrently(self):
+        in_flight, peak = 0, 0
+        lock = threading.Lock()
+        release = threading.Event()
+
+        def slow_create_task(parent, task):
+            nonlocal in_flight, peak
+            with lock:
+                in_flight += 1
+                peak = max(peak, in_flight)
+                if in_flight >= 4:
+                    release.set()
+            release.wait(timeout=2)
+            with lock:
+                in_flight -= 1
+            return MagicMock()
+
+        self.mock_client.create_task.side_effect = slow_create_task
+        enqueue_tasks([{'tenant_id': str(i)} for i in range(8)], target_function="send_notification_worker")
+        self.assertGreaterEqual(peak, 4)
+
+    def test_transient_errors_are_retried_and_permanent_errors_reported(self):
+        calls = {}
+
+        def flaky_create_task(parent, task):
+            tenant = json.loads(task['http_request']['body'])['tenant_id']
+            calls[tenant] = calls.get(tenant, 0) + 1
+            if tenant == 'transient' and calls[tenant] < 3:
+                raise api_exceptions.ServiceUnavailable("try again")
+            if tenant == 'invalid':
+                raise api_exceptions.InvalidArgument("bad task")
+            if tenant == 'down':
+                raise api_exceptions.DeadlineExceeded("timeout")
+            return MagicMock()
+
+        self.mock_client.create_task.side_effect = flaky_create_task
+        results = enqueue_tasks([{'tenant_id': t} for t in ('ok', 'transient', 'invalid', 'down')], target_function="w")
+
+        self.assertEqual([r['status'] for r in results], ['created', 'created', 'failed', 'failed'])
+        self.assertEqual([r['attempts'] for r in results], [1, 3, 1, cloud_tasks_service.ENQUEUE_MAX_ATTEMPTS])
+        self.assertIn("bad task", results[2]['error'])
+        self.assertEqual(calls['invalid'], 1)
+
+    def test_batch_size_groups_payloads_into_batch_tasks(self):
+        payloads = [{'tenant_info': {'tenant_id': f"tenant_{i}"}} for i in range(5)]
+
+        results = enqueue_tasks(payloads, target_function="send_notification_worker", batch_size=2)
+
+        bodies = [json.loads(c.kwargs['task']['http_request']['body']) for c in self.mock_client.create_task.call_args_list]
+        self.assertEqual(self.mock_client.create_task.call_count, 3)
+        self.assertCountEqual([body['batch'] for body in bodies], [payloads[0:2], payloads[2:4], payloads[4:5]])
+        # One result per payload; payloads of the same batch share their task's result
+        self.assertEqual(len(results), 5)
+        self.assertIs(results[0], results[1])
+        self.assertIsNot(results[1], results[2])
+
+    def test_task_key_gives_deterministic_names_and_repeats_are_duplicates(self):
+        created = set()
+
+        def create_task(parent, task):
+            if task['name'] in created:
+                raise api_exceptions.AlreadyExists("409 task exists")
+            created.add(task['name'])
+            return MagicMock()
+
+        self.mock_client.create_task.side_effect = create_task
+        payloads = [{'tenant_id': 't1', 'payment_ids': ['p1']}, {'tenant_id': 't2', 'payment_ids': ['p2']}]
+        task_key = lambda payload: f"2025-12-24:{payload['tenant_id']}:{payload['payment_ids']}"
+
+        first = enqueue_tasks(payloads, target_function="w", task_name_prefix="send-notification-", task_key=task_key)
+        retried = enqueue_tasks(payloads, target_function="w", task_name_prefix="send-notification-", task_key=task_key)
+
+        self.assertEqual([r['status'] for r in first], ['created', 'created'])
+        self.assertEqual([r['status'] for r in retried], ['duplicate', 'duplicate'])
+        self.assertEqual([r['name'] for r in first], [r['name'] for r in retried])
+        self.assertNotEqual(first[0]['name'], first[1]['name'])
+        self.assertRegex(first[0]['name'], r"/tasks/send-notification-[0-9a-f]{32}$")
+
+    def test_dispatch_schedule_paces_by_rate_and_window(self):
+        start = datetime(2025, 12, 24, 1, 0, tzinfo=timezone.utc)
+        offsets = lambda times: [(t - start).total_seconds() for t in times]
+
+        self.assertEqual(offsets(dispatch_schedule(4, start, dispatch_rate=2)), [0, 0.5, 1.0, 1.5])
+        self.assertEqual(offsets(dispatch_schedule(4, start, dispatch_window_seconds=60)), [0, 15, 30, 45])
+        # The rate is kept when the tasks fit in the window, otherwise they are spread over the window
+        self.assertEqual(offsets(dispatch_schedule(4, start, dispatch_rate=1, dispatch_window_seconds=60)), [0, 1, 2, 3])
+        self.assertEqual(offsets(dispatch_schedule(4, start, dispatch_rate=0.01, dispatch_window_seconds=60)), [0, 15, 30, 45])
+
+    def test_staggered_schedule_times_and_dispatch_deadline_are_set_on_tasks(self):
+        start = datetime(2025, 12, 24, 1, 0, tzinfo=timezone.utc)
+        payloads = [{'tenant_id': f"t{i}"} for i in range(3)]
+
+        enqueue_tasks(payloads, target_function="w", schedule_time=start, dispatch_rate=0.5, dispatch_deadline_seconds=120)
+
+        tasks = {json.loads(c.kwargs['task']['http_request']['body'])['tenant_id']: c.kwargs['task'] for c in self.mock_client.create_task.call_args_list}
+        self.assertEqual([tasks[p['tenant_id']]['schedule_time'].ToDatetime(tzinfo=timezone.utc) for p in payloads],
+                         [start, start + timedelta(seconds=2), start + timedelta(seconds=4)])
+        self.assertEqual({task['dispatch_deadline'].seconds for task in tasks.values()}, {120})
+
+    def test_each_payload_can_have_its_own_schedule_time(self):
+        start = datetime(2025, 12, 24, 1, 0, tzinfo=timezone.utc)
+        payloads = [{'tenant_id': f"t{i}"} for i in range(3)]
+        schedule_times = [start + timedelta(days=i) for i in range(3)]
+
+        enqueue_tasks(payloads, target_function="w", schedule_time=schedule_times)
+
+        tasks = {json.loads(c.kwargs['task']['http_request']['body'])['tenant_id']: c.kwargs['task'] for c in self.mock_client.create_task.call_args_list}
+        self.assertEqual([tasks[p['tenant_id']]['schedule_time'].ToDatetime(tzinfo=timezone.utc) for p in payloads], schedule_times)
+
+    def test_empty_payloads_do_not_create_a_client(self):
+        self.assertEqual(enqueue_tasks([], target_function="w"), [])
+        self.mock_client_class.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+import sys
+import os
+import time
+import threading
+from unittest.mock import MagicMock
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from functions.services.data_context import DataContext
+
+class TestDataContext(unittest.TestCase):
+    def _slow_loader(self, value, delay=0.2):
+        def load():
+            time.sleep(delay)
+            return value
+        return MagicMock(side_effect=load)
+
+    def test_prefetch_reads_subtrees_concurrently(self):
+        loaders = {name: self._slow_loader(name) for name in ('statistics', 'tenants', 'companies')}
+        start = time.perf_counter()
+        with DataContext(loaders) as data:
+            data.prefetch('statistics', 'tenants', 'companies')
+            values = [data['statistics'], data['tenants'], data['companies']]
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(values, ['statistics', 'tenants', 'companies'])
+        # Three 200 ms reads overlap instead of taking 600 ms back to back
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual(set(data.timings), {'statistics', 'tenants', 'companies'})
+
+    def test_subtrees_are_loaded_lazily_and_once(self):
+        loaders = {'companies': MagicMock(return_value={'c1': {}}), 'accounts': MagicMock(return_value={'a1': {}})}
+        with DataContext(loaders) as data:
+            data.prefetch('companies')
+            self.assertEqual(data['companies'], {'c1': {}})
+            self.assertEqual(data['companies'], {'c1': {}})
+            loaders['accounts'].assert_not_called()
+            self.assertFalse(data.is_loaded('accounts'))
+
+            self.assertEqual(data['accounts'], {'a1': {}})
+        loaders['companies'].assert_called_once()
+        loaders['accounts'].assert_called_once()
+
+    def test_concurrent_first_access_loads_once(self):
+        loader = self._slow_loader({'t1': {}}, delay=0.05)
+        results = []
+        with DataContext({'tenants': loader}) as data:
+            threads = [threading.Thread(target=lambda: results.append(data['tenants'])) for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(results, [{'t1': {}}] * 5)
+        loader.assert_called_once()
+
+    def test_loader_errors_surface_on_access(self):
+        with DataContext({'statistics': MagicMock(side_effect=RuntimeError("boom"))}) as data:
+            data.prefetch('statistics')
+            with self.assertRaises(RuntimeError):
+                data['statistics']
+        with DataContext({}) as data, self.assertRaises(KeyError):
+            data.get('unknown')
+
+if __name__ == '__main__':
+    unittest.main()
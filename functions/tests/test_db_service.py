@@ -6,8 +6,18 @@ import os
 # Add the project root directory to the Python path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from functions.services.db_service import move_pending_to_due
-from functions.constants import STATISTICS_PATH, ACCOUNTS_PATH
+import threading
+from datetime import date
+
+from functions.services.db_service import (
+    move_pending_to_due, get_payment_tracking, apply_payment_transitions,
+    get_payment_tracking_in_window, sync_due_date_index,
+    get_completed_companies, get_company_contact_emails,
+    get_tenant, get_tenant_payment_tracking,
+)
+import functions.services.db_service as db_service
+from functions.constants import STATISTICS_PATH, ACCOUNTS_PATH, PAYMENTS_BY_DUE_DATE_PATH, PROPERTY_MANAGEMENT_PATH
+from functions.tests.fake_rtdb import FakeRealtimeDatabase
 
 class TestDbService(unittest.TestCase):
 
@@ -33,20 +43,13 @@ class TestDbService(unittest.TestCase):
         }
 
         # Mock the Firebase reference objects and their methods
-        mock_pending_ref = MagicMock()
-        mock_due_ref = MagicMock()
-        mock_account_payment_status_ref = MagicMock()
+        mock_root_ref = MagicMock()
         mock_summary_ref = MagicMock()
 
         # Configure db.reference to return specific mocks based on the path
-        # This is a common pattern when mocking hierarchical APIs
         def mock_reference_side_effect(path):
-            if path == f"{STATISTICS_PATH}/{company_id}/paymentTracking/pending/{payment_id}":
-                return mock_pending_ref
-            elif path == f"{STATISTICS_PATH}/{company_id}/paymentTracking/due/{payment_id}":
-                return mock_due_ref
-            elif path == f"{ACCOUNTS_PATH}/{company_id}/{tenant_id}/payments/{payment_id}/paymentStatus":
-                return mock_account_payment_status_ref
+            if path == PROPERTY_MANAGEMENT_PATH:
+                return mock_root_ref
             elif path == f"{STATISTICS_PATH}/{company_id}/paymentTracking/summary":
                 return mock_summary_ref
             return MagicMock() # Return a default mock for any other paths
@@ -68,37 +71,22 @@ class TestDbService(unittest.TestCase):
         # Call the function under test
         move_pending_to_due(company_id, payment_id, payment_details, tenant_id)
 
-        # Assertions
-        
-        # 1. Assert db.reference calls
-        expected_db_reference_calls = [
-            call(f"{STATISTICS_PATH}/{company_id}/paymentTracking/pending/{payment_id}"),
-            call(f"{STATISTICS_PATH}/{company_id}/paymentTracking/due/{payment_id}"),
-            call(f"{ACCOUNTS_PATH}/{company_id}/{tenant_id}/payments/{payment_id}/paymentStatus"),
-            call(f"{STATISTICS_PATH}/{company_id}/paymentTracking/summary")
-        ]
-        # Using assert_has_calls with any_order=True as the order of calls to db.reference might vary depending on Python version/mock implementation details
-        mock_db_reference.assert_has_calls(expected_db_reference_calls, any_order=True)
-
-        # 2. Assert .set() calls
-        mock_due_ref.set.assert_called_once_with(payment_details)
-        mock_account_payment_status_ref.set.assert_called_once_with(2)
-
-        # 3. Assert .delete() call
-        mock_pending_ref.delete.assert_called_once()
-
-        # 4. Assert summary update call
-        expected_summary_update = {
-            'pendingCount': 0,
-            'pendingTotal': 0,
-            'dueCount': 1,
-            'dueTotal': 8000,
-            'overdueCount': 0,
-            'overdueTotal': 0,
-            "partiallyPaidCount": 0,
-            "partiallyPaidTotal": 0,
-        }
-        mock_summary_ref.update.assert_called_once_with(expected_summary_update)
+        # All writes go out as one multi-location update
+        mock_root_ref.update.assert_called_once_with({
+            f"Statistics/{company_id}/paymentTracking/due/{payment_id}": payment_details,
+            f"Statistics/{company_id}/paymentTracking/pending/{payment_id}": None,
+            f"Accounts/{company_id}/{tenant_id}/payments/{payment_id}/paymentStatus": 2,
+            f"PaymentsByDueDate/20251231/{company_id}_{payment_id}": {
+                'companyId': company_id, 'paymentId': payment_id, 'trackingNode': 'due',
+            },
+            f"Statistics/{company_id}/paymentTracking/summary/pendingCount": {'.sv': {'increment': -1}},
+            f"Statistics/{company_id}/paymentTracking/summary/pendingTotal": {'.sv': {'increment': -8000.0}},
+            f"Statistics/{company_id}/paymentTracking/summary/dueCount": {'.sv': {'increment': 1}},
+            f"Statistics/{company_id}/paymentTracking/summary/dueTotal": {'.sv': {'increment': 8000.0}},
+        })
+        # The summary is never read: deltas are applied server-side
+        mock_summary_ref.get.assert_not_called()
+        mock_summary_ref.update.assert_not_called()
 
     @patch('functions.services.db_service.db.reference')
     def test_move_due_to_overdue(self, mock_db_reference):
@@ -121,18 +109,12 @@ class TestDbService(unittest.TestCase):
             'tenantType': 0
         }
 
-        mock_due_ref = MagicMock()
-        mock_overdue_ref = MagicMock()
-        mock_account_payment_status_ref = MagicMock()
+        mock_root_ref = MagicMock()
         mock_summary_ref = MagicMock()
 
         def mock_reference_side_effect(path):
-            if path == f"{STATISTICS_PATH}/{company_id}/paymentTracking/due/{payment_id}":
-                return mock_due_ref
-            elif path == f"{STATISTICS_PATH}/{company_id}/paymentTracking/overdue/{payment_id}":
-                return mock_overdue_ref
-            elif path == f"{ACCOUNTS_PATH}/{company_id}/{tenant_id}/payments/{payment_id}/paymentStatus":
-                return mock_account_payment_status_ref
+            if path == PROPERTY_MANAGEMENT_PATH:
+                return mock_root_ref
             elif path == f"{STATISTICS_PATH}/{company_id}/paymentTracking/summary":
                 return mock_summary_ref
             return MagicMock()
@@ -153,30 +135,297 @@ class TestDbService(unittest.TestCase):
         from functions.services.db_service import move_payment_to_overdue
         move_payment_to_overdue(company_id, payment_id, payment_details, source_tracking_node='due')
 
-        expected_db_reference_calls = [
-            call(f"{STATISTICS_PATH}/{company_id}/paymentTracking/due/{payment_id}"),
-            call(f"{STATISTICS_PATH}/{company_id}/paymentTracking/overdue/{payment_id}"),
-            call(f"{ACCOUNTS_PATH}/{company_id}/{tenant_id}/payments/{payment_id}/paymentStatus"),
-            call(f"{STATISTICS_PATH}/{company_id}/paymentTracking/summary")
+        mock_root_ref.update.assert_called_once_with({
+            f"Statistics/{company_id}/paymentTracking/overdue/{payment_id}": payment_details,
+            f"Statistics/{company_id}/paymentTracking/due/{payment_id}": None,
+            f"Accounts/{company_id}/{tenant_id}/payments/{payment_id}/paymentStatus": 3, # 3 for overdue
+            f"PaymentsByDueDate/20251223/{company_id}_{payment_id}": None,
+            f"Statistics/{company_id}/paymentTracking/summary/dueCount": {'.sv': {'increment': -1}},
+            f"Statistics/{company_id}/paymentTracking/summary/dueTotal": {'.sv': {'increment': -500.0}},
+            f"Statistics/{company_id}/paymentTracking/summary/overdueCount": {'.sv': {'increment': 1}},
+            f"Statistics/{company_id}/paymentTracking/summary/overdueTotal": {'.sv': {'increment': 500.0}},
+        })
+
+    @patch('functions.services.db_service.db.reference')
+    def test_apply_payment_transitions_batches_a_company_into_one_update(self, mock_db_reference):
+        company_id = "test_company_id"
+        mock_root_ref = MagicMock()
+        mock_summary_ref = MagicMock()
+        mock_db_reference.side_effect = lambda path: mock_root_ref if path == PROPERTY_MANAGEMENT_PATH else mock_summary_ref
+
+        transitions = [
+            {'payment_id': 'p1', 'payment_details': {'amount': 100, 'dueDate': '30/12/2025', 'tenantId': 't1'}, 'source_tracking_node': 'pending', 'target_tracking_node': 'due'},
+            {'payment_id': 'p2', 'payment_details': {'amount': 200, 'dueDate': '01/12/2025', 'tenantId': 't1'}, 'source_tracking_node': 'pending', 'target_tracking_node': 'overdue'},
+            {'payment_id': 'p3', 'payment_details': {'amount': 50, 'dueDate': '02/12/2025', 'tenantId': 't2'}, 'source_tracking_node': 'due', 'target_tracking_node': 'overdue'},
         ]
-        mock_db_reference.assert_has_calls(expected_db_reference_calls, any_order=True)
 
-        mock_overdue_ref.set.assert_called_once_with(payment_details)
-        mock_account_payment_status_ref.set.assert_called_once_with(3) # 3 for overdue
+        self.assertTrue(apply_payment_transitions(company_id, transitions))
 
-        mock_due_ref.delete.assert_called_once()
+        mock_summary_ref.get.assert_not_called()
+        mock_root_ref.update.assert_called_once()
+        updates = mock_root_ref.update.call_args[0][0]
+        summary_prefix = f"Statistics/{company_id}/paymentTracking/summary/"
+        # Deltas are aggregated per company; the due count nets to zero and is not written
+        self.assertEqual({k.removeprefix(summary_prefix): v['.sv']['increment'] for k, v in updates.items() if k.startswith(summary_prefix)}, {
+            'pendingCount': -2, 'pendingTotal': -300.0,
+            'dueTotal': 50.0,
+            'overdueCount': 2, 'overdueTotal': 250.0,
+        })
+        self.assertEqual(updates[f"Accounts/{company_id}/t2/payments/p3/paymentStatus"], 3)
+        self.assertIsNone(updates[f"Statistics/{company_id}/paymentTracking/pending/p2"])
 
-        expected_summary_update = {
-            'pendingCount': 0,
-            'pendingTotal': 0,
-            'dueCount': 0,
-            'dueTotal': 0,
-            'overdueCount': 1,
-            'overdueTotal': 500.0,
-            "partiallyPaidCount": 0,
-            "partiallyPaidTotal": 0,
+    @patch('functions.services.db_service.db.reference')
+    def test_get_payment_tracking_reads_only_pending_and_due(self, mock_db_reference):
+        pending = {'payment_1': {'amount': 100, 'dueDate': '31/12/2025'}}
+        due = {'payment_2': {'amount': 200, 'dueDate': '24/12/2025'}}
+        node_data = {
+            f"{STATISTICS_PATH}/company_1/paymentTracking/pending": pending,
+            f"{STATISTICS_PATH}/company_1/paymentTracking/due": due,
+            f"{STATISTICS_PATH}/company_2/paymentTracking/pending": None,
+            f"{STATISTICS_PATH}/company_2/paymentTracking/due": None,
+        }
+
+        def mock_reference_side_effect(path):
+            ref = MagicMock()
+            if path == STATISTICS_PATH:
+                ref.get.side_effect = lambda shallow=False: {'company_1': True, 'company_2': True} if shallow else self.fail("Full Statistics tree was fetched")
+            else:
+                ref.get.return_value = node_data[path]
+            return ref
+
+        mock_db_reference.side_effect = mock_reference_side_effect
+
+        payment_tracking = get_payment_tracking()
+
+        self.assertEqual(payment_tracking, {
+            'company_1': {'paymentTracking': {'pending': pending, 'due': due}},
+            'company_2': {'paymentTracking': {'pending': {}, 'due': {}}},
+        })
+        requested_paths = {c.args[0] for c in mock_db_reference.call_args_list}
+        self.assertEqual(requested_paths, {STATISTICS_PATH, *node_data.keys()})
+
+    def test_get_payment_tracking_in_window_reads_live_payments_of_indexed_keys(self):
+        pending = {'amount': 100, 'dueDate': '31/12/2025'}
+        due = {'amount': 200, 'dueDate': '20/12/2025'}
+        moved = {'amount': 300, 'dueDate': '25/12/2025'}
+        postponed = {'amount': 400, 'dueDate': '15/01/2026'}
+        tracking_path = f"{STATISTICS_PATH}/company_1/paymentTracking"
+        database = FakeRealtimeDatabase()
+        database.reference(f"{tracking_path}/pending/payment_1").set(pending)
+        database.reference(f"{tracking_path}/due/payment_2").set(due)
+        database.reference(f"{tracking_path}/due/payment_3").set(moved)
+        database.reference(f"{tracking_path}/pending/payment_5").set(postponed)
+        database.reference(PAYMENTS_BY_DUE_DATE_PATH).set({
+            '20251220': {'company_1_payment_2': {'companyId': 'company_1', 'paymentId': 'payment_2', 'trackingNode': 'due'}},
+            '20251225': {
+                # Indexed as pending, but the frontend has since moved it to due
+                'company_1_payment_3': {'companyId': 'company_1', 'paymentId': 'payment_3', 'trackingNode': 'pending'},
+                # Paid and removed from its tracking node, with the index entry left behind
+                'company_1_payment_4': {'companyId': 'company_1', 'paymentId': 'payment_4', 'trackingNode': 'pending'},
+            },
+            # Its due date moved out of the window after it was indexed
+            '20251230': {'company_1_payment_5': {'companyId': 'company_1', 'paymentId': 'payment_5', 'trackingNode': 'pending'}},
+            '20251231': {'company_1_payment_1': {'companyId': 'company_1', 'paymentId': 'payment_1', 'trackingNode': 'pending'}},
+            '20260101': {'company_1_payment_6': {'companyId': 'company_1', 'paymentId': 'payment_6', 'trackingNode': 'pending'}},
+        })
+
+        with patch.object(db_service.db, 'reference', side_effect=database.reference):
+            payment_tracking = get_payment_tracking_in_window(date(2025, 12, 31))
+
+        self.assertEqual(payment_tracking, {
+            'company_1': {'paymentTracking': {'pending': {'payment_1': pending}, 'due': {'payment_2': due, 'payment_3': moved}}},
+        })
+
+    def test_backfill_keeps_entries_written_while_it_runs(self):
+        tracking_path = f"{STATISTICS_PATH}/company_1/paymentTracking"
+        database = FakeRealtimeDatabase()
+        database.reference(PAYMENTS_BY_DUE_DATE_PATH).set({
+            '20251201': {'company_1_gone': {'companyId': 'company_1', 'paymentId': 'gone', 'trackingNode': 'pending'}},
+        })
+        database.reference(f"{tracking_path}/pending/payment_1").set({'amount': 100, 'dueDate': '31/12/2025'})
+
+        def get_payment_tracking():
+            tracking = {'company_1': {'paymentTracking': {'pending': database.reference(f"{tracking_path}/pending").get(), 'due': {}}}}
+            # The frontend creates a payment after the scan, and its trigger indexes it
+            database.reference(f"{PAYMENTS_BY_DUE_DATE_PATH}/20251228/company_1_payment_2").set(
+                {'companyId': 'company_1', 'paymentId': 'payment_2', 'trackingNode': 'pending'}
+            )
+            return tracking
+
+        with patch.object(db_service.db, 'reference', side_effect=database.reference), \
+                patch.object(db_service, 'get_payment_tracking', side_effect=get_payment_tracking):
+            self.assertEqual(db_service.backfill_due_date_index(), 1)
+
+        self.assertEqual(database.reference(PAYMENTS_BY_DUE_DATE_PATH).get(), {
+            '20251228': {'company_1_payment_2': {'companyId': 'company_1', 'paymentId': 'payment_2', 'trackingNode': 'pending'}},
+            '20251231': {'company_1_payment_1': {'companyId': 'company_1', 'paymentId': 'payment_1', 'trackingNode': 'pending'}},
+        })
+
+    @patch('functions.services.db_service.db.reference')
+    def test_sync_due_date_index_moves_entry_when_due_date_changes(self, mock_db_reference):
+        before = {'amount': 100, 'dueDate': '30/12/2025'}
+        after = {'amount': 100, 'dueDate': '31/12/2025'}
+        refs = {}
+        mock_db_reference.side_effect = lambda path: refs.setdefault(path, MagicMock())
+
+        sync_due_date_index('company_1', 'payment_1', 'pending', before, after)
+
+        new_ref = refs[f"{PAYMENTS_BY_DUE_DATE_PATH}/20251231/company_1_payment_1"]
+        new_ref.set.assert_called_once_with({
+            'companyId': 'company_1', 'paymentId': 'payment_1', 'trackingNode': 'pending',
+        })
+
+        # The old entry is removed only if it still belongs to the pending node
+        old_ref = refs[f"{PAYMENTS_BY_DUE_DATE_PATH}/20251230/company_1_payment_1"]
+        transaction_update = old_ref.transaction.call_args[0][0]
+        self.assertIsNone(transaction_update({'trackingNode': 'pending'}))
+        self.assertEqual(transaction_update({'trackingNode': 'due'}), {'trackingNode': 'due'})
+
+    def test_apply_payment_transitions_records_run_completion_in_the_same_write(self):
+        fake_db = FakeRealtimeDatabase({'HomeHive': {'PropertyManagement': {'Statistics': {'company_1': {'paymentTracking': {
+            'pending': {'payment_1': {'amount': 100, 'dueDate': '31/12/2025', 'tenantId': 'tenant_1'}},
+        }}}}}})
+        transition = {
+            'payment_id': 'payment_1', 'payment_details': {'amount': 100, 'dueDate': '31/12/2025', 'tenantId': 'tenant_1'},
+            'source_tracking_node': 'pending', 'target_tracking_node': 'due',
         }
-        mock_summary_ref.update.assert_called_once_with(expected_summary_update)
+
+        with patch('functions.services.db_service.db.reference', side_effect=fake_db.reference):
+            self.assertTrue(apply_payment_transitions('company_1', [transition], run_id='2025-12-24'))
+            # A company with nothing to move is still recorded
+            self.assertTrue(apply_payment_transitions('company_2', [], run_id='2025-12-24'))
+            self.assertEqual(get_completed_companies('2025-12-24'), {'company_1', 'company_2'})
+
+        self.assertIn('payment_1', fake_db.reference(f"{STATISTICS_PATH}/company_1/paymentTracking/due").get())
+
+    def test_tenant_lookups_read_only_that_tenant(self):
+        fake_db = FakeRealtimeDatabase({'HomeHive': {'PropertyManagement': {
+            'Tenants': {'company_1': {
+                'Active': {'tenant_1': {'email': 'tenant1@example.com'}},
+                'InActive': {'tenant_2': {'email': 'tenant2@example.com'}},
+            }},
+            'Statistics': {'company_1': {'paymentTracking': {
+                'pending': {'payment_1': {'tenantId': 'tenant_2'}, 'payment_2': {'tenantId': 'tenant_1'}},
+                'due': {'payment_3': {'tenantId': 'tenant_2'}},
+                'overdue': {'payment_4': {'tenantId': 'tenant_2'}},
+            }}},
+        }}})
+
+        with patch('functions.services.db_service.db.reference', side_effect=fake_db.reference):
+            self.assertEqual(get_tenant('company_1', 'tenant_2'), {'company_1': {'InActive': {'tenant_2': {'email': 'tenant2@example.com'}}}})
+            self.assertEqual(get_tenant('company_1', 'no-such-tenant'), {})
+            self.assertEqual(get_tenant_payment_tracking('company_1', 'tenant_2'), {
+                'pending': {'payment_1': {'tenantId': 'tenant_2'}},
+                'due': {'payment_3': {'tenantId': 'tenant_2'}},
+            })
+
+class TestCompanyContactEmails(unittest.TestCase):
+    def setUp(self):
+        db_service._company_contact_email_cache.clear()
+        self.fake_db = FakeRealtimeDatabase({'HomeHive': {'PropertyManagement': {'Companies': {
+            'company_1': {'contactEmail': 'landlord1@example.com', 'staff': {'s1': {'name': 'Big'}}},
+            'company_2': {'name': 'No Email Ltd'},
+        }}}})
+        self.mock_reference = patch('functions.services.db_service.db.reference', side_effect=self.fake_db.reference).start()
+
+    def tearDown(self):
+        patch.stopall()
+        db_service._company_contact_email_cache.clear()
+
+    def test_reads_only_contact_emails_and_caches_them(self):
+        emails = get_company_contact_emails(['company_1', 'company_2', 'company_1', None])
+
+        self.assertEqual(emails, {'company_1': 'landlord1@example.com', 'company_2': None})
+        self.assertEqual(sorted(c.args[0] for c in self.mock_reference.call_args_list), [
+            '/HomeHive/PropertyManagement/Companies/company_1/contactEmail',
+            '/HomeHive/PropertyManagement/Companies/company_2/contactEmail',
+        ])
+
+        self.mock_reference.reset_mock()
+        self.assertEqual(get_company_contact_emails(['company_1', 'company_2']), emails)
+        self.mock_reference.assert_not_called()
+
+    def test_expired_entries_are_read_again(self):
+        with patch.object(db_service._company_contact_email_cache, 'ttl_seconds', 0):
+            get_company_contact_emails(['company_1'])
+            self.fake_db.reference('/HomeHive/PropertyManagement/Companies/company_1/contactEmail').set('new@example.com')
+
+            self.assertEqual(get_company_contact_emails(['company_1']), {'company_1': 'new@example.com'})
+
+class TestSummaryConcurrency(unittest.TestCase):
+    COMPANY_ID = "test_company_id"
+    NUM_SCHEDULER_WRITERS = 8
+    PAYMENTS_PER_WRITER = 5
+    NUM_FRONTEND_WRITERS = 8
+
+    def setUp(self):
+        num_payments = self.NUM_SCHEDULER_WRITERS * self.PAYMENTS_PER_WRITER
+        self.pending = {
+            f"payment_{i}": {'amount': 100, 'dueDate': '31/12/2025', 'tenantId': f"tenant_{i}"}
+            for i in range(num_payments)
+        }
+        self.fake_db = FakeRealtimeDatabase({
+            'HomeHive': {'PropertyManagement': {'Statistics': {self.COMPANY_ID: {'paymentTracking': {
+                'pending': self.pending,
+                'summary': {'pendingCount': num_payments, 'pendingTotal': 100.0 * num_payments, 'dueCount': 0, 'dueTotal': 0, 'partiallyPaidCount': 0},
+            }}}}}
+        }, read_delay=0.01)
+        self.summary_path = f"{STATISTICS_PATH}/{self.COMPANY_ID}/paymentTracking/summary"
+
+    def _run_in_parallel(self, targets: list):
+        barrier = threading.Barrier(len(targets))
+
+        def run(target):
+            barrier.wait()
+            target()
+
+        threads = [threading.Thread(target=run, args=(target,)) for target in targets]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def _frontend_records_partial_payment(self):
+        # The frontend bumps its own counter in the same summary node while main runs
+        self.fake_db.reference(self.summary_path).update({'partiallyPaidCount': {'.sv': {'increment': 1}}})
+
+    def test_summary_totals_stay_exact_under_parallel_writers(self):
+        payment_ids = list(self.pending)
+        targets = []
+        for writer in range(self.NUM_SCHEDULER_WRITERS):
+            batch = payment_ids[writer * self.PAYMENTS_PER_WRITER:(writer + 1) * self.PAYMENTS_PER_WRITER]
+            transitions = [
+                {'payment_id': payment_id, 'payment_details': self.pending[payment_id], 'source_tracking_node': 'pending', 'target_tracking_node': 'due'}
+                for payment_id in batch
+            ]
+            targets.append(lambda transitions=transitions: self.assertTrue(apply_payment_transitions(self.COMPANY_ID, transitions)))
+        targets.extend([self._frontend_records_partial_payment] * self.NUM_FRONTEND_WRITERS)
+
+        with patch('functions.services.db_service.db.reference', side_effect=self.fake_db.reference):
+            self._run_in_parallel(targets)
+
+        summary = self.fake_db.reference(self.summary_path).get()
+        self.assertEqual(summary, {
+            'pendingCount': 0,
+            'pendingTotal': 0.0,
+            'dueCount': len(payment_ids),
+            'dueTotal': 100.0 * len(payment_ids),
+            'partiallyPaidCount': self.NUM_FRONTEND_WRITERS,
+        })
+        tracking = self.fake_db.reference(f"{STATISTICS_PATH}/{self.COMPANY_ID}/paymentTracking").get()
+        self.assertFalse(tracking.get('pending'))
+        self.assertEqual(set(tracking['due']), set(payment_ids))
+
+    def test_stand_in_exposes_read_modify_write_races(self):
+        # Control: the previous get-then-update summary maintenance loses increments on this stand-in
+        def read_modify_write():
+            ref = self.fake_db.reference(self.summary_path)
+            summary = ref.get()
+            ref.update({'dueCount': summary['dueCount'] + 1})
+
+        self._run_in_parallel([read_modify_write] * self.NUM_SCHEDULER_WRITERS)
+
+        self.assertLess(self.fake_db.reference(self.summary_path).get()['dueCount'], self.NUM_SCHEDULER_WRITERS)
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,7 +1,12 @@
 import unittest
 from unittest.mock import patch, MagicMock
 from main import send_email_worker
-from services.email_service import send_email
+from services.email_service import send_email, create_ses_client, clear_ses_clients, send_bulk_tenant_summary_emails
+from botocore.exceptions import ClientError, EndpointConnectionError, ReadTimeoutError
+from email import message_from_bytes
+import builtins
+import services.email_service as email_service
+import os
 from utils.template_renderer import template_env
 import json
 
@@ -19,6 +24,8 @@ class MockRequest:
         return self._args_data
 
 class TestEmail(unittest.TestCase):
+    def setUp(self):
+        clear_ses_clients()
 
     @patch('services.email_service.boto3.client')
     @patch('services.email_service.access_secret_version')
@@ -79,5 +86,198 @@ class TestEmail(unittest.TestCase):
         self.assertEqual(response.data, b"Email sent successfully.")
         mock_send_email.assert_called_once()
 
+class TestSesClientRegistry(unittest.TestCase):
+    def setUp(self):
+        clear_ses_clients()
+        self.credentials = {"AWS_ACCESS_KEY_ID": "key-1", "AWS_SECRET_ACCESS_KEY": "secret-1"}
+        patch('services.email_service.access_secret_version', side_effect=lambda secret_id: self.credentials[secret_id]).start()
+        self.mock_boto_client = patch('services.email_service.boto3.client', side_effect=lambda *args, **kwargs: MagicMock()).start()
+
+    def tearDown(self):
+        patch.stopall()
+        clear_ses_clients()
+
+    def test_client_is_reused_across_sends(self):
+        first = create_ses_client()
+
+        self.assertIs(create_ses_client(), first)
+        self.mock_boto_client.assert_called_once()
+        self.assertEqual(self.mock_boto_client.call_args.kwargs['config'].max_pool_connections, 32)
+
+    def test_rotated_credentials_get_a_new_client(self):
+        first = create_ses_client()
+        self.credentials["AWS_SECRET_ACCESS_KEY"] = "secret-2"
+
+        second = create_ses_client()
+
+        self.assertIsNot(second, first)
+        self.assertEqual(self.mock_boto_client.call_args.kwargs['aws_secret_access_key'], "secret-2")
+        self.assertIs(create_ses_client(), second)
+        self.assertEqual(self.mock_boto_client.call_count, 2)
+
+    def test_regions_have_their_own_clients(self):
+        self.assertIsNot(create_ses_client("us-east-1"), create_ses_client("eu-west-1"))
+
+class TestBulkTemplatedSend(unittest.TestCase):
+    def setUp(self):
+        self.ses_client = MagicMock()
+        self.ses_client.get_send_quota.return_value = {'MaxSendRate': 1000.0}
+        self.ses_client.send_bulk_templated_email.side_effect = lambda **kwargs: {'Status': [{'Status': 'Success'} for _ in kwargs['Destinations']]}
+        patch.dict(os.environ, {"TESTING_MODE": "false"}).start()
+
+    def tearDown(self):
+        patch.stopall()
+
+    def _reminder(self, i, cc_recipients=None):
+        return {
+            'tenant_consolidated_info': {
+                'tenant_info': {'tenant_id': f"tenant_{i}", 'name': f"Tenant {i}", 'email': f"tenant{i}@example.com"},
+                'due_rentals': [{'property_name': 'Unit 1', 'rent_amount': 1000, 'dueDate': '31/12/2025'}],
+            },
+            'invoice_url': f"https://example.com/get_invoice?tenantId=tenant_{i}",
+            'cc_recipients': cc_recipients or [],
+        }
+
+    def test_reminders_are_sent_fifty_per_call_with_one_template(self):
+        results = send_bulk_tenant_summary_emails([self._reminder(i) for i in range(120)], template_env, self.ses_client)
+
+        self.assertEqual(results, [True] * 120)
+        self.ses_client.create_template.assert_called_once()
+        calls = self.ses_client.send_bulk_templated_email.call_args_list
+        self.assertEqual([len(c.kwargs['Destinations']) for c in calls], [50, 50, 20])
+        first = calls[0].kwargs['Destinations'][0]
+        self.assertEqual(first['Destination'], {'ToAddresses': ['tenant0@example.com']})
+        self.assertEqual(json.loads(first['ReplacementTemplateData'])['name'], "Tenant 0")
+        self.assertEqual(calls[0].kwargs['Template'], self.ses_client.create_template.call_args.kwargs['Template']['TemplateName'])
+        self.ses_client.send_raw_email.assert_not_called()
+
+    def test_cc_recipients_are_sent_in_the_bulk_destination(self):
+        reminders = [self._reminder(0), self._reminder(1, cc_recipients=['landlord@example.com'])]
+
+        results = send_bulk_tenant_summary_emails(reminders, template_env, self.ses_client)
+
+        self.assertEqual(results, [True, True])
+        self.ses_client.send_bulk_templated_email.assert_called_once()
+        destinations = self.ses_client.send_bulk_templated_email.call_args.kwargs['Destinations']
+        self.assertEqual([d['Destination'] for d in destinations], [
+            {'ToAddresses': ['tenant0@example.com']},
+            {'ToAddresses': ['tenant1@example.com'], 'CcAddresses': ['landlord@example.com']},
+        ])
+        self.ses_client.send_raw_email.assert_not_called()
+
+    def test_existing_template_and_failed_destinations(self):
+        self.ses_client.create_template.side_effect = ClientError({'Error': {'Code': 'AlreadyExists'}}, 'CreateTemplate')
+        self.ses_client.send_bulk_templated_email.side_effect = None
+        self.ses_client.send_bulk_templated_email.return_value = {'Status': [{'Status': 'Success'}, {'Status': 'MessageRejected', 'Error': 'rejected'}]}
+        self.ses_client.send_raw_email.side_effect = ClientError({'Error': {'Code': 'MessageRejected'}}, 'SendRawEmail')
+
+        results = send_bulk_tenant_summary_emails([self._reminder(0), self._reminder(1)], template_env, self.ses_client)
+
+        self.assertEqual(results, [True, False])
+        # Only the failed destination is tried again on its own
+        self.ses_client.send_raw_email.assert_called_once()
+        self.assertEqual(self.ses_client.send_raw_email.call_args.kwargs['Destinations'], ['tenant1@example.com'])
+
+    def test_rejected_bulk_call_falls_back_to_raw_sends(self):
+        self.ses_client.send_bulk_templated_email.side_effect = ClientError({'Error': {'Code': 'MessageRejected', 'Message': 'rejected'}}, 'SendBulkTemplatedEmail')
+
+        results = send_bulk_tenant_summary_emails([self._reminder(0), self._reminder(1, cc_recipients=['landlord@example.com'])], template_env, self.ses_client)
+
+        self.assertEqual(results, [True, True])
+        self.assertEqual([c.kwargs['Destinations'] for c in self.ses_client.send_raw_email.call_args_list],
+                         [['tenant0@example.com'], ['tenant1@example.com', 'landlord@example.com']])
+
+class TestSendRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.ses_client = MagicMock()
+        self.ses_client.get_send_quota.return_value = {'Max24HourSend': 200000.0, 'SentLast24Hours': 0.0, 'MaxSendRate': 40.0}
+        self.mock_random = patch.object(email_service, 'random').start()
+        self.mock_random.uniform.return_value = 0
+        self.message = {
+            'source': "noreply@example.com",
+            'recipient_email': "tenant@example.com",
+            'cc_recipients': [],
+            'destinations': ["tenant@example.com"],
+            'raw_message': b"email",
+        }
+
+    def tearDown(self):
+        patch.stopall()
+
+    def _error(self, code, message):
+        return ClientError({'Error': {'Code': code, 'Message': message}}, 'SendRawEmail')
+
+    def test_limiter_is_seeded_from_the_send_quota(self):
+        limiter = email_service.get_send_rate_limiter(self.ses_client)
+
+        self.assertEqual(limiter.rate, 40.0)
+        self.assertIs(email_service.get_send_rate_limiter(self.ses_client), limiter)
+        self.ses_client.get_send_quota.assert_called_once()
+
+    def test_throttled_send_retries_only_the_ses_call_and_slows_down(self):
+        self.ses_client.send_raw_email.side_effect = [
+            self._error('Throttling', 'Maximum sending rate exceeded.'),
+            self._error('Throttling', 'Maximum sending rate exceeded.'),
+            {'MessageId': 'message-1'},
+        ]
+
+        self.assertTrue(email_service.send_raw_email(self.message, self.ses_client))
+
+        self.assertEqual(self.ses_client.send_raw_email.call_count, 3)
+        limiter = email_service.get_send_rate_limiter(self.ses_client)
+        # Halved twice, then one success wins back a twentieth of the maximum
+        self.assertEqual(limiter.rate, 40.0 / 4 + 40.0 / 20)
+
+    def test_daily_quota_and_other_errors_are_not_retried(self):
+        self.ses_client.send_raw_email.side_effect = self._error('Throttling', 'Daily message quota exceeded.')
+        self.assertFalse(email_service.send_raw_email(self.message, self.ses_client))
+        self.assertEqual(self.ses_client.send_raw_email.call_count, 1)
+
+        self.ses_client.send_raw_email.reset_mock()
+        self.ses_client.send_raw_email.side_effect = self._error('MessageRejected', 'Email address is not verified.')
+        self.assertFalse(email_service.send_raw_email(self.message, self.ses_client))
+        self.assertEqual(self.ses_client.send_raw_email.call_count, 1)
+
+    def test_persistent_throttling_gives_up_after_max_attempts(self):
+        self.ses_client.send_raw_email.side_effect = self._error('Throttling', 'Maximum sending rate exceeded.')
+
+        self.assertFalse(email_service.send_raw_email(self.message, self.ses_client))
+        self.assertEqual(self.ses_client.send_raw_email.call_count, email_service.SES_SEND_MAX_ATTEMPTS)
+
+    def test_connection_failures_are_retried_but_read_timeouts_are_not(self):
+        self.ses_client.send_raw_email.side_effect = [EndpointConnectionError(endpoint_url="https://email.us-east-1.amazonaws.com"), {'MessageId': 'message-1'}]
+        self.assertTrue(email_service.send_raw_email(self.message, self.ses_client))
+        self.assertEqual(self.ses_client.send_raw_email.call_count, 2)
+
+        # SES may already have accepted the email, so it is not sent again
+        self.ses_client.send_raw_email.reset_mock()
+        self.ses_client.send_raw_email.side_effect = ReadTimeoutError(endpoint_url="https://email.us-east-1.amazonaws.com")
+        self.assertFalse(email_service.send_raw_email(self.message, self.ses_client))
+        self.assertEqual(self.ses_client.send_raw_email.call_count, 1)
+
+class TestMimeBuilder(unittest.TestCase):
+    def setUp(self):
+        email_service._logo_part = None
+
+    def test_logo_is_read_once_and_shared_by_messages(self):
+        with patch('builtins.open', side_effect=builtins.open) as mock_open:
+            first = email_service.build_mime_message("Subject 1", "noreply@example.com", "a@example.com", "<p>one</p>", "one", cc_recipients=["cc@example.com"])
+            second = email_service.build_mime_message("Subject 2", "noreply@example.com", "b@example.com", "<p>two</p>", "two")
+
+        self.assertEqual(mock_open.call_count, 1)
+        self.assertIsInstance(first, bytes)
+        parsed = message_from_bytes(first)
+        self.assertEqual(parsed['Cc'], "cc@example.com")
+        self.assertEqual([part.get_content_type() for part in parsed.walk()], [
+            'multipart/mixed', 'multipart/related', 'multipart/alternative', 'text/plain', 'text/html', 'image/png',
+        ])
+        logos = [part for message in (first, second) for part in message_from_bytes(message).walk() if part.get_content_type() == 'image/png']
+        self.assertEqual(logos[0]['Content-ID'], '<logo>')
+        with open(email_service._LOGO_PATH, 'rb') as f:
+            logo_data = f.read()
+        self.assertEqual(logos[0].get_payload(decode=True), logo_data)
+        self.assertEqual(logos[1].get_payload(decode=True), logo_data)
+        self.assertEqual(message_from_bytes(second)['Subject'], "Subject 2")
+
 if __name__ == '__main__':
     unittest.main()
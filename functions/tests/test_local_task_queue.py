@@ -0,0 +1,107 @@
+import unittest
+import sys
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+from firebase_functions import https_fn
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import functions.services.cloud_tasks_service as cloud_tasks_service
+from functions.services.cloud_tasks_service import enqueue_tasks
+from functions.services.local_task_queue import LocalTaskQueue
+
+class TestLocalTaskQueue(unittest.TestCase):
+    def setUp(self):
+        self.received = []
+        self.lock = threading.Lock()
+
+    def handler(self, req):
+        with self.lock:
+            self.received.append(req.get_json())
+        return https_fn.Response("ok", status=200)
+
+    def test_tasks_are_run_with_their_payload_and_recorded(self):
+        local_queue = LocalTaskQueue(lambda target: self.handler, concurrency=4)
+        try:
+            for i in range(10):
+                self.assertEqual(local_queue.submit(f"task-{i}", "worker", {'n': i}), 'created')
+            self.assertTrue(local_queue.join(timeout=5))
+        finally:
+            local_queue.shutdown()
+
+        self.assertEqual(sorted(p['n'] for p in self.received), list(range(10)))
+        summary = local_queue.summary()
+        self.assertEqual(summary['tasks'], 10)
+        self.assertEqual(summary['statuses'], {200: 10})
+        self.assertTrue(all(s['target_function'] == "worker" for s in local_queue.stats))
+
+    def test_duplicate_names_are_dropped(self):
+        local_queue = LocalTaskQueue(lambda target: self.handler, concurrency=0)
+
+        self.assertEqual(local_queue.submit("task-a", "worker", {'n': 1}), 'created')
+        self.assertEqual(local_queue.submit("task-a", "worker", {'n': 2}), 'duplicate')
+
+        self.assertEqual(self.received, [{'n': 1}])
+
+    def test_scheduled_task_waits_for_its_schedule_time(self):
+        local_queue = LocalTaskQueue(lambda target: self.handler, concurrency=1)
+        try:
+            start = time.monotonic()
+            local_queue.submit("later", "worker", {'n': 1}, datetime.now(timezone.utc) + timedelta(seconds=0.2))
+            self.assertTrue(local_queue.join(timeout=5))
+        finally:
+            local_queue.shutdown()
+
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+        self.assertEqual(self.received, [{'n': 1}])
+
+    def test_failing_handler_is_recorded_as_500(self):
+        def failing_handler(req):
+            raise RuntimeError("boom")
+        local_queue = LocalTaskQueue(lambda target: failing_handler, concurrency=0)
+
+        local_queue.submit("task-a", "worker", {})
+
+        self.assertEqual(local_queue.summary()['statuses'], {500: 1})
+
+class TestEnqueueTasksLocalBackend(unittest.TestCase):
+    def setUp(self):
+        self.received = []
+        cloud_tasks_service._local_task_queues.clear()
+        patch.object(cloud_tasks_service, '_resolve_local_handler', lambda target: lambda req: self.received.append((target, req.get_json()))).start()
+        self.mock_client_class = patch('functions.services.cloud_tasks_service.tasks_v2.CloudTasksClient').start()
+
+    def tearDown(self):
+        patch.stopall()
+        for local_queue in cloud_tasks_service._local_task_queues.values():
+            local_queue.shutdown()
+        cloud_tasks_service._local_task_queues.clear()
+
+    @patch.dict(os.environ, {'TASK_BACKEND': 'inline'})
+    def test_inline_backend_calls_handler_without_cloud_tasks(self):
+        results = enqueue_tasks([{'tenant_id': 't1'}, {'tenant_id': 't1'}], "send_notification_worker", task_key=lambda payload: payload['tenant_id'])
+
+        self.assertEqual([r['status'] for r in results], ['created', 'duplicate'])
+        self.assertEqual(self.received, [("send_notification_worker", {'tenant_id': 't1'})])
+        self.mock_client_class.assert_not_called()
+
+    @patch.dict(os.environ, {'TASK_BACKEND': 'memory', 'TASK_QUEUE_CONCURRENCY': '3'})
+    def test_memory_backend_runs_batches_on_worker_threads(self):
+        payloads = [{'tenant_id': f"t{i}"} for i in range(5)]
+
+        results = enqueue_tasks(payloads, "send_notification_worker", batch_size=2)
+        local_queue = cloud_tasks_service.get_local_task_queue('memory')
+        self.assertTrue(local_queue.join(timeout=5))
+
+        self.assertEqual(len(results), 5)
+        self.assertEqual(len(local_queue._workers), 3)
+        self.assertEqual(sorted(len(payload['batch']) for _, payload in self.received), [1, 2, 2])
+        self.mock_client_class.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,6 +6,7 @@ import copy
 import sys
 import os
 import json
+import threading
 from unittest.mock import patch, MagicMock, ANY, call
 from freezegun import freeze_time
 
@@ -16,8 +17,20 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 # Now we can import from main
 from functions.main import (
     main as notification_handler,
+    process_companies_worker,
+    continue_scheduler_run,
+    schedule_pending_payment_transitions,
+    payment_transition_worker,
+    tenant_reminder_worker,
+    send_notification_worker,
+    process_statistics,
+    _send_tenant_notification,
+    get_invoice,
+    drain_outbox_worker,
 )
+import functions.main as main_module
 from functions.logic.notification_logic import (
+    classify_payments,
     get_due_rentals_by_tenant, 
     _flatten_tenants, get_due_rentals_by_landlord, 
     get_payments_to_move_to_due, 
@@ -25,7 +38,8 @@ from functions.logic.notification_logic import (
 )
 from functions.services.email_service import (
     send_tenant_summary_email, 
-    send_landlord_summary_email
+    send_landlord_summary_email,
+    clear_ses_clients,
 )
 from functions.utils.template_renderer import template_env
 class MockEvent:
@@ -386,6 +400,49 @@ class TestHelperFunctions(unittest.TestCase):
                     self.assertNotIn("Tenant A Old", rental['tenant_name'])
                     self.assertNotIn("Tenant C Wrong Date", rental['tenant_name'])
 
+    def test_classify_payments_fills_every_bucket_in_one_pass(self):
+        mock_today = date(2025, 12, 24)
+        mock_companies_data = {"company_id_1": {"contactEmail": "landlord1@example.com"}}
+        mock_tenants_data = {"company_id_1": {"active": {"tenant_id_1": {"email": "tenant1@example.com", "idNumber": "123"}}}}
+        mock_statistics_data = {
+            "company_id_1": {
+                "paymentTracking": {
+                    "pending": {
+                        "payment_in_window": {"amount": 1000, "dueDate": "31/12/2025", "paymentType": 0, "tenantId": "tenant_id_1", "tenantName": "Tenant 1", "propertyName": "Property A"},
+                        "payment_non_rental_in_window": {"amount": 300, "dueDate": "27/12/2025", "paymentType": 1, "tenantId": "tenant_id_1", "tenantName": "Tenant 1", "propertyName": "Property A"},
+                        "payment_past": {"amount": 200, "dueDate": "23/12/2025", "paymentType": 0, "tenantId": "tenant_id_1", "tenantName": "Tenant 1", "propertyName": "Property B"},
+                        "payment_later": {"amount": 400, "dueDate": "01/01/2026", "paymentType": 0, "tenantId": "tenant_id_1", "tenantName": "Tenant 1", "propertyName": "Property C"},
+                        "payment_bad_date": {"amount": 50, "dueDate": "not a date", "paymentType": 0, "tenantId": "tenant_id_1"},
+                    },
+                    "due": {
+                        "payment_due_past": {"amount": 700, "dueDate": "20/12/2025", "paymentType": 0, "tenantId": "tenant_id_1"},
+                        "payment_due_today": {"amount": 800, "dueDate": "24/12/2025", "paymentType": 0, "tenantId": "tenant_id_1"},
+                    }
+                }
+            }
+        }
+
+        classification = classify_payments(mock_statistics_data, mock_tenants_data, 7, companies=mock_companies_data, today=mock_today)
+
+        self.assertEqual([p['payment_id'] for p in classification['pending_to_due']], ['payment_in_window', 'payment_non_rental_in_window'])
+        self.assertEqual([p['payment_id'] for p in classification['pending_to_overdue']], ['payment_past'])
+        self.assertEqual([p['payment_id'] for p in classification['due_to_overdue']], ['payment_due_past'])
+        self.assertEqual(list(classification['tenant_reminders']), ['tenant_id_1'])
+        self.assertEqual([r['payment_id'] for r in classification['tenant_reminders']['tenant_id_1']['due_rentals']], ['payment_in_window'])
+        self.assertEqual(classification['landlord_digest'], {
+            'landlord1@example.com': [{'tenant_name': 'Tenant 1', 'property_name': 'Property A', 'amount': 1000, 'due_date': '31/12/2025'}]
+        })
+        self.assertEqual(classification['company_totals'], {
+            'company_id_1': {'pending_to_due': 1300.0, 'pending_to_overdue': 200.0, 'due_to_overdue': 700.0}
+        })
+
+        # The thin views return the matching buckets
+        with patch('functions.logic.notification_logic.date') as mock_date:
+            mock_date.today.return_value = mock_today
+            mock_date.side_effect = lambda *args, **kw: date(*args, **kw)
+            self.assertEqual(get_payments_to_move_from_due_to_overdue(mock_statistics_data), classification['due_to_overdue'])
+            self.assertEqual(get_due_rentals_by_tenant(mock_statistics_data, mock_tenants_data, 7), classification['tenant_reminders'])
+
 
 class TestMainIntegration(unittest.TestCase):
     @classmethod
@@ -413,17 +470,17 @@ class TestMainIntegration(unittest.TestCase):
 
         self.patch_enqueue = patch('functions.main.enqueue_tasks')
         self.patch_get_tenants = patch('functions.main.get_all_tenants')
-        self.patch_get_statistics = patch('functions.main.get_all_statistics')
+        self.patch_get_statistics = patch('functions.main.get_payment_tracking')
         self.patch_get_companies = patch('functions.main.get_all_companies') # Add mock for get_all_companies
-        self.patch_move_pending_to_due = patch('functions.main.move_pending_to_due')
-        self.patch_get_payments_to_move_to_due = patch('functions.main.get_payments_to_move_to_due')
+        self.patch_apply_payment_transitions = patch('functions.main.apply_payment_transitions')
+        self.patch_classify_payments = patch('functions.main.classify_payments')
         
         self.mock_enqueue = self.patch_enqueue.start()
         self.mock_get_tenants = self.patch_get_tenants.start()
         self.mock_get_statistics = self.patch_get_statistics.start()
         self.mock_get_companies = self.patch_get_companies.start() # Start the mock
-        self.mock_move_pending_to_due = self.patch_move_pending_to_due.start()
-        self.mock_get_payments_to_move_to_due = self.patch_get_payments_to_move_to_due.start()
+        self.mock_apply_payment_transitions = self.patch_apply_payment_transitions.start()
+        self.mock_classify_payments = self.patch_classify_payments.start()
 
 
     def tearDown(self):
@@ -441,6 +498,9 @@ class TestMainIntegration(unittest.TestCase):
 
 
 class TestNotificationWorker(unittest.TestCase):
+    def setUp(self):
+        clear_ses_clients()
+
     @patch.dict(os.environ, {
         "SENDER_EMAIL": "test@example.com", 
         "TESTING_MODE": "false" # Explicitly disable testing mode
@@ -532,7 +592,7 @@ class TestNotificationWorker(unittest.TestCase):
             self.assertEqual(call_args['Destinations'], ['landlord@example.com'])
             
             # Verify subject and body content (simplified check)
-            raw_message = call_args['RawMessage']['Data']
+            raw_message = call_args['RawMessage']['Data'].decode()
             self.assertIn("Subject: Upcoming Rental Payments Due", raw_message)
             self.assertIn("mock_landlord_html_body", raw_message)
             mock_template_env.get_template.assert_called_with('landlord_reminder_email.html')
@@ -573,13 +633,17 @@ class TestEndtoEnd(unittest.TestCase):
         self.mock_db_reference.return_value = mock_ref_instance
 
         self.patch_get_tenants = patch('functions.main.get_all_tenants')
-        self.patch_get_statistics = patch('functions.main.get_all_statistics')
+        self.patch_get_statistics = patch('functions.main.get_payment_tracking')
         self.patch_get_companies = patch('functions.main.get_all_companies') 
         self.patch_get_accounts = patch('functions.main.get_all_accounts')
         self.patch_enqueue = patch('functions.main.enqueue_tasks')
         self.patch_send_landlord_summary_email = patch('functions.main.send_landlord_summary_email')
         self.patch_template_env = patch('functions.main.template_env')
-        self.patch_move_pending_to_due = patch('functions.main.move_pending_to_due')
+        self.patch_apply_payment_transitions = patch('functions.main.apply_payment_transitions')
+        self.mock_get_completed_companies = patch('functions.main.get_completed_companies', return_value=set()).start()
+        self.mock_mark_companies_completed = patch('functions.main.mark_companies_completed').start()
+        self.mock_save_scheduler_cursor = patch('functions.main.save_scheduler_cursor').start()
+        self.mock_complete_scheduler_run = patch('functions.main.complete_scheduler_run').start()
 
         self.mock_get_tenants = self.patch_get_tenants.start()
         self.mock_get_statistics = self.patch_get_statistics.start()
@@ -588,7 +652,7 @@ class TestEndtoEnd(unittest.TestCase):
         self.mock_enqueue = self.patch_enqueue.start()
         self.mock_send_landlord_summary_email = self.patch_send_landlord_summary_email.start()
         self.mock_template_env = self.patch_template_env.start()
-        self.mock_move_pending_to_due = self.patch_move_pending_to_due.start()
+        self.mock_apply_payment_transitions = self.patch_apply_payment_transitions.start()
 
         self.app = Flask(__name__)
 
@@ -620,10 +684,13 @@ class TestEndtoEnd(unittest.TestCase):
             self.mock_template_env.return_value = MagicMock()
             
             notification_handler(MockEvent())
+            # Accounts are only loaded on demand and nothing in the run needs them
+            self.mock_get_accounts.assert_not_called()
             self.mock_enqueue.assert_called_once_with(
                 mock_grouped_rentals,
                 target_function="send_notification_worker",
-                task_name_prefix="send-notification-"
+                task_name_prefix="send-notification-",
+                task_key=ANY,
             )
             # self.mock_send_landlord_summary_email.assert_called_once_with(
             #     "support@wachilamaka.co.zm", 
@@ -637,30 +704,33 @@ class TestEndtoEnd(unittest.TestCase):
             #     ], 
             #     self.mock_template_env
             # )
-            self.mock_move_pending_to_due.assert_called_once_with(
+            self.mock_apply_payment_transitions.assert_called_once_with(
                 company_id, 
-                payment_id,
-                {
-                    'accountId': 'mjm2dme0g7lj9ukzmw8', 
-                    'amount': 8000, 
-                    'dueDate': '31/12/2025', 
-                    'lastUpdated': '2025-12-25T23:19:26.783Z', 
-                    'parentPropertyId': 'mcdy0kf4sfvxvub1rke', 
-                    'paymentId': '1766704766379fg6fze94e', 
-                    'paymentStatus': 1, 
-                    'paymentType': 0, 
-                    'propertyId': '1758235072928lyvinkkspd', 
-                    'propertyName': 'Big 4 - Unit 1', 
-                    'tenantId': 'mjm2dme0g7lj9ukzmw8', 
-                    'tenantName': 'Khondwani Sikasote',
-                    'tenantType': 0
-                },
-                tenant_id
+                [{
+                    'payment_id': payment_id,
+                    'payment_details': {
+                        'accountId': 'mjm2dme0g7lj9ukzmw8', 
+                        'amount': 8000, 
+                        'dueDate': '31/12/2025', 
+                        'lastUpdated': '2025-12-25T23:19:26.783Z', 
+                        'parentPropertyId': 'mcdy0kf4sfvxvub1rke', 
+                        'paymentId': '1766704766379fg6fze94e', 
+                        'paymentStatus': 1, 
+                        'paymentType': 0, 
+                        'propertyId': '1758235072928lyvinkkspd', 
+                        'propertyName': 'Big 4 - Unit 1', 
+                        'tenantId': 'mjm2dme0g7lj9ukzmw8', 
+                        'tenantName': 'Khondwani Sikasote',
+                        'tenantType': 0
+                    },
+                    'source_tracking_node': 'pending',
+                    'target_tracking_node': 'due',
+                }],
+                run_id="2025-12-24",
             )
 
-    @patch('functions.main.move_payment_to_overdue')
     @freeze_time("2025-12-24")
-    def test_main_move_to_overdue(self, mock_move_payment_to_overdue):
+    def test_main_move_to_overdue(self):
         with self.app.app_context():
             statistics_data = copy.deepcopy(self.full_db_data["HomeHive"]["PropertyManagement"]["Statistics"])
             tenant_id = "mjm2dme0g7lj9ukzmw8"
@@ -681,16 +751,19 @@ class TestEndtoEnd(unittest.TestCase):
             
             notification_handler(MockEvent())
 
-            mock_move_payment_to_overdue.assert_called_once_with(
+            self.mock_apply_payment_transitions.assert_called_once_with(
                 company_id,
-                payment_id_pending,
-                {'accountId': 'mjm2dme0g7lj9ukzmw8', 'amount': 8000, 'dueDate': '23/12/2025', 'lastUpdated': '2025-12-25T23:19:26.783Z', 'parentPropertyId': 'mcdy0kf4sfvxvub1rke', 'paymentId': '1766704766379fg6fze94e', 'paymentStatus': 1, 'paymentType': 0, 'propertyId': '1758235072928lyvinkkspd', 'propertyName': 'Big 4 - Unit 1', 'tenantId': 'mjm2dme0g7lj9ukzmw8', 'tenantName': 'Khondwani Sikasote', 'tenantType': 0},
-                source_tracking_node='pending'
+                [{
+                    'payment_id': payment_id_pending,
+                    'payment_details': {'accountId': 'mjm2dme0g7lj9ukzmw8', 'amount': 8000, 'dueDate': '23/12/2025', 'lastUpdated': '2025-12-25T23:19:26.783Z', 'parentPropertyId': 'mcdy0kf4sfvxvub1rke', 'paymentId': '1766704766379fg6fze94e', 'paymentStatus': 1, 'paymentType': 0, 'propertyId': '1758235072928lyvinkkspd', 'propertyName': 'Big 4 - Unit 1', 'tenantId': 'mjm2dme0g7lj9ukzmw8', 'tenantName': 'Khondwani Sikasote', 'tenantType': 0},
+                    'source_tracking_node': 'pending',
+                    'target_tracking_node': 'overdue',
+                }],
+                run_id="2025-12-24",
             )
     
-    @patch('functions.main.move_payment_to_overdue')
     @freeze_time("2025-12-24")
-    def test_main_move_from_due_to_overdue(self, mock_move_payment_to_overdue):
+    def test_main_move_from_due_to_overdue(self):
         with self.app.app_context():
             statistics_data = copy.deepcopy(self.full_db_data["HomeHive"]["PropertyManagement"]["Statistics"])
             tenant_id = "mjm2dme0g7lj9ukzmw8"
@@ -730,13 +803,684 @@ class TestEndtoEnd(unittest.TestCase):
             
             notification_handler(MockEvent())
 
-            mock_move_payment_to_overdue.assert_called_once_with(
+            self.mock_apply_payment_transitions.assert_called_once_with(
                 company_id,
-                payment_id_pending,
-                {'accountId': 'mjm2dme0g7lj9ukzmw8', 'amount': 8000, 'dueDate': '23/12/2025', 'lastUpdated': '2025-12-25T23:19:26.783Z', 'parentPropertyId': 'mcdy0kf4sfvxvub1rke', 'paymentId': '1766704766379fg6fze94e', 'paymentStatus': 1, 'paymentType': 0, 'propertyId': '1758235072928lyvinkkspd', 'propertyName': 'Big 4 - Unit 1', 'tenantId': 'mjm2dme0g7lj9ukzmw8', 'tenantName': 'Khondwani Sikasote', 'tenantType': 0},
-                source_tracking_node='due'
+                [{
+                    'payment_id': payment_id_pending,
+                    'payment_details': {'accountId': 'mjm2dme0g7lj9ukzmw8', 'amount': 8000, 'dueDate': '23/12/2025', 'lastUpdated': '2025-12-25T23:19:26.783Z', 'parentPropertyId': 'mcdy0kf4sfvxvub1rke', 'paymentId': '1766704766379fg6fze94e', 'paymentStatus': 1, 'paymentType': 0, 'propertyId': '1758235072928lyvinkkspd', 'propertyName': 'Big 4 - Unit 1', 'tenantId': 'mjm2dme0g7lj9ukzmw8', 'tenantName': 'Khondwani Sikasote', 'tenantType': 0},
+                    'source_tracking_node': 'due',
+                    'target_tracking_node': 'overdue',
+                }],
+                run_id="2025-12-24",
             )
 
+class TestFanOut(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        json_file_path = os.path.join(current_dir, 'test_db.json')
+        with open(json_file_path, 'r') as f:
+            cls.full_db_data = json.load(f)
+        cls.app = Flask(__name__)
+
+    def setUp(self):
+        self.mock_get_company_ids = patch('functions.main.get_company_ids').start()
+        self.mock_get_statistics = patch('functions.main.get_payment_tracking').start()
+        self.mock_get_tenants = patch('functions.main.get_all_tenants').start()
+        self.mock_get_tenants_for_companies = patch('functions.main.get_tenants_for_companies').start()
+        self.mock_enqueue = patch('functions.main.enqueue_tasks').start()
+        self.mock_apply_payment_transitions = patch('functions.main.apply_payment_transitions').start()
+
+    def tearDown(self):
+        patch.stopall()
+
+    @patch.dict(os.environ, {"SCHEDULER_FANOUT_BATCH_SIZE": "2"})
+    def test_main_enqueues_one_task_per_batch_of_companies(self):
+        self.mock_get_company_ids.return_value = ["c1", "c2", "c3", "c4", "c5"]
+
+        with self.app.app_context():
+            notification_handler(MockEvent())
+
+        self.mock_enqueue.assert_called_once_with(
+            [{'company_ids': ["c1", "c2"]}, {'company_ids': ["c3", "c4"]}, {'company_ids': ["c5"]}],
+            target_function="process_companies_worker",
+            task_name_prefix="process-companies-",
+            task_key=ANY,
+        )
+        # The coordinator reads no payment or tenant data itself
+        self.mock_get_statistics.assert_not_called()
+        self.mock_get_tenants.assert_not_called()
+        self.mock_apply_payment_transitions.assert_not_called()
+
+    @freeze_time("2025-12-24")
+    def test_worker_processes_only_its_shard(self):
+        company_id = "-OTi3TKQ16jieuDen2Pv"
+        payment_id = "1766704766379fg6fze94e"
+        statistics = {company_id: copy.deepcopy(self.full_db_data["HomeHive"]["PropertyManagement"]["Statistics"][company_id])}
+        statistics[company_id]['paymentTracking']['pending'][payment_id]['dueDate'] = "31/12/2025"
+        tenants = {company_id: self.full_db_data["HomeHive"]["PropertyManagement"]["Tenants"][company_id]}
+        self.mock_get_statistics.return_value = statistics
+        self.mock_get_tenants_for_companies.return_value = tenants
+
+        with self.app.test_request_context(json={'company_ids': [company_id]}):
+            from flask import request
+            response = process_companies_worker(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.mock_get_statistics.assert_called_once_with([company_id])
+        self.mock_get_tenants_for_companies.assert_called_once_with([company_id])
+        self.mock_get_tenants.assert_not_called()
+        self.mock_enqueue.assert_called_once()
+        self.assertEqual(self.mock_enqueue.call_args.kwargs['target_function'], "send_notification_worker")
+        self.mock_apply_payment_transitions.assert_called_once()
+        self.assertEqual(self.mock_apply_payment_transitions.call_args[0][0], company_id)
+
+    def test_worker_rejects_empty_shard(self):
+        with self.app.test_request_context(json={}):
+            from flask import request
+            response = process_companies_worker(request)
+        self.assertEqual(response.status_code, 400)
+
+class TestSchedulerRunBudget(unittest.TestCase):
+    COMPANY_ID = "-OTi3TKQ16jieuDen2Pv"
+    PAYMENT_ID = "1766704766379fg6fze94e"
+
+    @classmethod
+    def setUpClass(cls):
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        json_file_path = os.path.join(current_dir, 'test_db.json')
+        with open(json_file_path, 'r') as f:
+            cls.full_db_data = json.load(f)
+        cls.app = Flask(__name__)
+
+    def setUp(self):
+        statistics = copy.deepcopy(self.full_db_data["HomeHive"]["PropertyManagement"]["Statistics"])
+        statistics[self.COMPANY_ID]['paymentTracking']['pending'][self.PAYMENT_ID]['dueDate'] = "31/12/2025"
+        patch('functions.main.get_payment_tracking', return_value=statistics).start()
+        patch('functions.main.get_all_tenants', return_value=self.full_db_data["HomeHive"]["PropertyManagement"]["Tenants"]).start()
+        patch('functions.main.get_all_companies', return_value=self.full_db_data["HomeHive"]["PropertyManagement"]["Companies"]).start()
+        self.mock_get_completed_companies = patch('functions.main.get_completed_companies', return_value=set()).start()
+        self.mock_mark_companies_completed = patch('functions.main.mark_companies_completed').start()
+        self.mock_save_scheduler_cursor = patch('functions.main.save_scheduler_cursor').start()
+        self.mock_complete_scheduler_run = patch('functions.main.complete_scheduler_run').start()
+        self.mock_enqueue = patch('functions.main.enqueue_tasks').start()
+        self.mock_apply_payment_transitions = patch('functions.main.apply_payment_transitions').start()
+        self.company_ids = list(statistics)
+
+    def tearDown(self):
+        patch.stopall()
+
+    @freeze_time("2025-12-24")
+    def test_run_within_budget_records_every_company(self):
+        with self.app.app_context():
+            notification_handler(MockEvent())
+
+        self.mock_apply_payment_transitions.assert_called_once_with(self.COMPANY_ID, ANY, run_id="2025-12-24")
+        # Companies with nothing to do are recorded together in one write
+        self.mock_mark_companies_completed.assert_called_once_with("2025-12-24", [cid for cid in self.company_ids if cid != self.COMPANY_ID])
+        self.mock_complete_scheduler_run.assert_called_once_with("2025-12-24")
+        self.mock_save_scheduler_cursor.assert_not_called()
+
+    @freeze_time("2025-12-24")
+    @patch.dict(os.environ, {"SCHEDULER_TIME_BUDGET_SECONDS": "10"})
+    def test_exhausted_budget_saves_cursor_and_enqueues_continuation(self):
+        # The first company always starts; the clock has passed the deadline before the second
+        with patch('functions.main.time') as mock_time, self.app.app_context():
+            mock_time.monotonic.side_effect = [0] + [100] * 10
+            notification_handler(MockEvent())
+
+        self.assertEqual(self.company_ids[0], self.COMPANY_ID)
+        self.mock_apply_payment_transitions.assert_called_once_with(self.COMPANY_ID, ANY, run_id="2025-12-24")
+        self.mock_save_scheduler_cursor.assert_called_once_with("2025-12-24", self.company_ids[1], len(self.company_ids) - 1)
+        self.mock_enqueue.assert_called_with([{'run_id': "2025-12-24", 'sequence': 1}], target_function="continue_scheduler_run", task_name_prefix="continue-scheduler-run-", task_key=ANY)
+        self.assertEqual(self.mock_enqueue.call_args.kwargs['task_key']({'run_id': "2025-12-24", 'sequence': 1}), "2025-12-24:1")
+        self.mock_complete_scheduler_run.assert_not_called()
+
+    @freeze_time("2025-12-24")
+    @patch.dict(os.environ, {"SCHEDULER_TIME_BUDGET_SECONDS": "10"})
+    def test_continuation_whose_load_used_the_budget_still_makes_progress(self):
+        # Loading the data already took the whole budget
+        with patch('functions.main.time') as mock_time, self.app.test_request_context(json={'run_id': "2025-12-24", 'sequence': 3}):
+            mock_time.monotonic.side_effect = [0] + [100] * 10
+            from flask import request
+            response = continue_scheduler_run(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.mock_apply_payment_transitions.assert_called_once_with(self.COMPANY_ID, ANY, run_id="2025-12-24")
+        self.mock_save_scheduler_cursor.assert_called_once_with("2025-12-24", self.company_ids[1], len(self.company_ids) - 1)
+        # The next continuation is named after its own place in the chain, not after the running task
+        payload = self.mock_enqueue.call_args.args[0][0]
+        self.assertEqual(payload, {'run_id': "2025-12-24", 'sequence': 4})
+        self.assertEqual(self.mock_enqueue.call_args.kwargs['task_key'](payload), "2025-12-24:4")
+
+    @freeze_time("2025-12-24")
+    @patch.dict(os.environ, {"SCHEDULER_TIME_BUDGET_SECONDS": "10"})
+    def test_failed_continuation_enqueue_fails_the_step(self):
+        self.mock_enqueue.side_effect = lambda payloads, **kwargs: [{'name': 'task', 'status': 'failed', 'attempts': 4, 'error': 'unavailable'} for _ in payloads]
+
+        with patch('functions.main.time') as mock_time, self.app.test_request_context(json={'run_id': "2025-12-24", 'sequence': 1}):
+            mock_time.monotonic.side_effect = [0] + [100] * 10
+            from flask import request
+            response = continue_scheduler_run(request)
+
+        self.assertEqual(response.status_code, 500)
+        self.mock_complete_scheduler_run.assert_not_called()
+
+    @freeze_time("2025-12-24")
+    def test_continuation_of_a_finished_run_completes_it(self):
+        self.mock_get_completed_companies.return_value = set(self.company_ids)
+
+        with self.app.test_request_context(json={'run_id': "2025-12-24", 'sequence': 2}):
+            from flask import request
+            response = continue_scheduler_run(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.mock_complete_scheduler_run.assert_called_once_with("2025-12-24")
+        self.mock_apply_payment_transitions.assert_not_called()
+        self.mock_enqueue.assert_not_called()
+
+    @freeze_time("2025-12-24")
+    def test_reminder_task_keys_are_stable_across_reruns(self):
+        keys = []
+        for _ in range(2):
+            self.mock_enqueue.reset_mock()
+            with self.app.app_context():
+                notification_handler(MockEvent())
+            reminders, kwargs = self.mock_enqueue.call_args.args[0], self.mock_enqueue.call_args.kwargs
+            keys.append([kwargs['task_key'](tenant_data) for tenant_data in reminders])
+
+        self.assertEqual(keys[0], keys[1])
+        self.assertEqual(keys[0], [f"2025-12-24:mjm2dme0g7lj9ukzmw8:{self.PAYMENT_ID}"])
+
+    @freeze_time("2025-12-24 01:00:00")
+    @patch.dict(os.environ, {"REMINDER_DISPATCH_RATE": "0.5"})
+    def test_reminder_pacing_continues_across_companies(self):
+        payment = copy.deepcopy(self.full_db_data["HomeHive"]["PropertyManagement"]["Statistics"][self.COMPANY_ID]['paymentTracking']['pending'][self.PAYMENT_ID])
+        payment['dueDate'] = "31/12/2025"
+        tenant = self.full_db_data["HomeHive"]["PropertyManagement"]["Tenants"][self.COMPANY_ID]['Active'][payment['tenantId']]
+        statistics, tenants = {}, {}
+        for company_id in ("company_a", "company_b"):
+            tenant_ids = [f"{company_id}_tenant_{i}" for i in range(3)]
+            statistics[company_id] = {'paymentTracking': {'pending': {
+                f"{tenant_id}_payment": {**payment, 'tenantId': tenant_id} for tenant_id in tenant_ids
+            }}}
+            tenants[company_id] = {'Active': {tenant_id: tenant for tenant_id in tenant_ids}}
+
+        process_statistics(statistics, tenants, 7)
+
+        starts = [c.kwargs['schedule_time'] for c in self.mock_enqueue.call_args_list]
+        self.assertEqual([c.kwargs['dispatch_rate'] for c in self.mock_enqueue.call_args_list], [0.5, 0.5])
+        # The second company's reminders start after the first company's three at 0.5/s
+        self.assertEqual(starts[1] - starts[0], timedelta(seconds=6))
+
+    @freeze_time("2025-12-24")
+    def test_continuation_skips_completed_companies(self):
+        self.mock_get_completed_companies.return_value = {self.COMPANY_ID}
+
+        with self.app.test_request_context(json={'run_id': "2025-12-24"}):
+            from flask import request
+            response = continue_scheduler_run(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.mock_get_completed_companies.assert_called_once_with("2025-12-24")
+        # The completed company's reminder and transitions are not repeated
+        self.mock_apply_payment_transitions.assert_not_called()
+        self.mock_enqueue.assert_not_called()
+        self.mock_complete_scheduler_run.assert_called_once_with("2025-12-24")
+
+# The undecorated trigger body, called with a stand-in db_fn event
+on_pending_write = schedule_pending_payment_transitions.__wrapped__
+
+class TestEventDrivenTransitions(unittest.TestCase):
+    COMPANY_ID = "-OTi3TKQ16jieuDen2Pv"
+    PAYMENT_ID = "1766704766379fg6fze94e"
+
+    @classmethod
+    def setUpClass(cls):
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        json_file_path = os.path.join(current_dir, 'test_db.json')
+        with open(json_file_path, 'r') as f:
+            cls.full_db_data = json.load(f)
+        cls.app = Flask(__name__)
+
+    def setUp(self):
+        self.payment = copy.deepcopy(self.full_db_data["HomeHive"]["PropertyManagement"]["Statistics"][self.COMPANY_ID]['paymentTracking']['pending'][self.PAYMENT_ID])
+        self.payment['dueDate'] = "31/12/2025"
+        self.mock_enqueue = patch('functions.main.enqueue_tasks').start()
+        self.mock_get_payment = patch('functions.main.get_payment_tracking_for_payment').start()
+        self.mock_get_tenants_for_companies = patch('functions.main.get_tenants_for_companies', return_value={
+            self.COMPANY_ID: self.full_db_data["HomeHive"]["PropertyManagement"]["Tenants"][self.COMPANY_ID],
+        }).start()
+        self.mock_apply_payment_transitions = patch('functions.main.apply_payment_transitions').start()
+
+    def tearDown(self):
+        patch.stopall()
+
+    def _write_event(self, before, after):
+        event = MagicMock()
+        event.params = {'companyId': self.COMPANY_ID, 'paymentId': self.PAYMENT_ID}
+        event.data.before = before
+        event.data.after = after
+        return event
+
+    def _call_worker(self, payload):
+        with self.app.test_request_context(json=payload):
+            from flask import request
+            return payment_transition_worker(request)
+
+    @freeze_time("2025-12-05 08:00:00")
+    @patch.dict(os.environ, {"EVENT_DRIVEN_TRANSITIONS": "true"})
+    def test_new_pending_payment_schedules_its_transition_moments(self):
+        on_pending_write(self._write_event(None, self.payment))
+
+        self.mock_enqueue.assert_called_once_with(
+            [
+                {'company_id': self.COMPANY_ID, 'payment_id': self.PAYMENT_ID, 'moment': "2025-12-24T00:00:00+02:00", 'rearm': False},
+                {'company_id': self.COMPANY_ID, 'payment_id': self.PAYMENT_ID, 'moment': "2026-01-01T00:00:00+02:00", 'rearm': False},
+            ],
+            target_function="payment_transition_worker",
+            task_name_prefix="payment-transition-",
+            schedule_time=ANY,
+            task_key=ANY,
+        )
+        schedule_times = self.mock_enqueue.call_args.kwargs['schedule_time']
+        self.assertEqual([t.isoformat() for t in schedule_times], ["2025-12-24T00:00:00+02:00", "2026-01-01T00:00:00+02:00"])
+
+    @patch.dict(os.environ, {"EVENT_DRIVEN_TRANSITIONS": "true"})
+    def test_task_keys_do_not_depend_on_when_the_payment_is_planned(self):
+        with freeze_time("2025-12-26 08:00:00"):
+            on_pending_write(self._write_event(None, self.payment))
+        with freeze_time("2025-12-27 09:30:00"):
+            on_pending_write(self._write_event(None, self.payment))
+
+        first, second = self.mock_enqueue.call_args_list
+        task_key = first.kwargs['task_key']
+        self.assertEqual([task_key(p) for p in first.args[0]], [task_key(p) for p in second.args[0]])
+
+    @patch.dict(os.environ, {"EVENT_DRIVEN_TRANSITIONS": "true"})
+    def test_writes_that_keep_the_due_date_or_delete_the_payment_schedule_nothing(self):
+        on_pending_write(self._write_event(self.payment, {**self.payment, 'lastUpdated': 'later'}))
+        on_pending_write(self._write_event(self.payment, None))
+        self.mock_enqueue.assert_not_called()
+
+    def test_trigger_is_disabled_by_default(self):
+        on_pending_write(self._write_event(None, self.payment))
+        self.mock_enqueue.assert_not_called()
+
+    @freeze_time("2025-12-23 22:00:01") # 00:00:01 on 24/12 in Johannesburg
+    def test_worker_moves_payment_on_local_due_window_start(self):
+        self.mock_get_payment.return_value = {'pending': {self.PAYMENT_ID: self.payment}}
+        self.mock_enqueue.return_value = [{'status': 'created'}]
+
+        response = self._call_worker({'company_id': self.COMPANY_ID, 'payment_id': self.PAYMENT_ID, 'rearm': False})
+
+        self.assertEqual(response.status_code, 200)
+        self.mock_apply_payment_transitions.assert_called_once_with(self.COMPANY_ID, [{
+            'payment_id': self.PAYMENT_ID,
+            'payment_details': self.payment,
+            'source_tracking_node': 'pending',
+            'target_tracking_node': 'due',
+        }])
+        # The reminder is scheduled per tenant and due date; no tenants are loaded for the move
+        self.mock_get_tenants_for_companies.assert_not_called()
+        self.mock_enqueue.assert_called_once_with(
+            [{'company_id': self.COMPANY_ID, 'tenant_id': self.payment['tenantId'], 'due_date': "2025-12-31"}],
+            target_function="tenant_reminder_worker",
+            task_name_prefix="tenant-reminder-",
+            task_key=ANY,
+        )
+
+    @freeze_time("2025-12-23 22:00:01")
+    def test_payments_due_together_share_one_tenant_reminder(self):
+        self.mock_enqueue.return_value = [{'status': 'created'}]
+        keys = []
+        for payment_id in (self.PAYMENT_ID, "second-payment"):
+            self.mock_get_payment.return_value = {'pending': {payment_id: {**self.payment, 'paymentId': payment_id}}}
+            self._call_worker({'company_id': self.COMPANY_ID, 'payment_id': payment_id, 'rearm': False})
+            payloads, kwargs = self.mock_enqueue.call_args.args[0], self.mock_enqueue.call_args.kwargs
+            keys.append(kwargs['task_key'](payloads[0]))
+
+        self.assertEqual(keys[0], keys[1])
+        self.assertEqual(keys[0], f"{self.COMPANY_ID}:{self.payment['tenantId']}:2025-12-31")
+
+    @freeze_time("2025-12-23 22:00:01")
+    def test_failed_reminder_enqueue_fails_the_task(self):
+        self.mock_get_payment.return_value = {'pending': {self.PAYMENT_ID: self.payment}}
+        self.mock_enqueue.return_value = [{'status': 'failed', 'error': 'unavailable'}]
+
+        response = self._call_worker({'company_id': self.COMPANY_ID, 'payment_id': self.PAYMENT_ID, 'rearm': False})
+
+        self.assertEqual(response.status_code, 500)
+        # The payment stays pending, so the retry schedules the reminder again
+        self.mock_apply_payment_transitions.assert_not_called()
+
+    def test_tenant_reminder_consolidates_the_tenants_payments_due_that_day(self):
+        tenant_id = self.payment['tenantId']
+        tenant = self.full_db_data["HomeHive"]["PropertyManagement"]["Tenants"][self.COMPANY_ID]['Active'][tenant_id]
+        second = {**self.payment, 'paymentId': "second-payment", 'propertyName': "Big 4 - Unit 2"}
+        payment_tracking = {
+            'pending': {"second-payment": second, 'later': {**self.payment, 'dueDate': "31/01/2026"}, 'levy': {**self.payment, 'paymentType': 1}},
+            'due': {self.PAYMENT_ID: self.payment},
+        }
+        with patch('functions.main.get_tenant', return_value={self.COMPANY_ID: {'Active': {tenant_id: tenant}}}) as mock_get_tenant, \
+             patch('functions.main.get_tenant_payment_tracking', return_value=payment_tracking), \
+             patch('functions.main.get_company_contact_emails', return_value={}), \
+             patch('functions.main._send_tenant_notification', return_value=(200, "Email sent successfully.")) as mock_send, \
+             self.app.test_request_context(json={'company_id': self.COMPANY_ID, 'tenant_id': tenant_id, 'due_date': "2025-12-31"}):
+            from flask import request
+            response = tenant_reminder_worker(request)
+
+        self.assertEqual(response.status_code, 200)
+        mock_get_tenant.assert_called_once_with(self.COMPANY_ID, tenant_id)
+        self.mock_get_tenants_for_companies.assert_not_called()
+        mock_send.assert_called_once()
+        reminder = mock_send.call_args.args[0]
+        self.assertEqual(reminder['tenant_info']['email'], tenant['email'])
+        self.assertEqual(sorted(r['payment_id'] for r in reminder['due_rentals']), sorted(["second-payment", self.PAYMENT_ID]))
+
+    def test_worker_ignores_paid_or_moved_payments(self):
+        self.mock_get_payment.return_value = {}
+
+        response = self._call_worker({'company_id': self.COMPANY_ID, 'payment_id': self.PAYMENT_ID, 'rearm': False})
+
+        self.assertEqual(response.status_code, 200)
+        self.mock_apply_payment_transitions.assert_not_called()
+        self.mock_enqueue.assert_not_called()
+
+    @freeze_time("2025-11-01 08:00:00")
+    def test_rearm_task_reschedules_a_payment_still_outside_the_window(self):
+        self.mock_get_payment.return_value = {'pending': {self.PAYMENT_ID: self.payment}}
+
+        self._call_worker({'company_id': self.COMPANY_ID, 'payment_id': self.PAYMENT_ID, 'rearm': True})
+
+        self.mock_apply_payment_transitions.assert_not_called()
+        self.assertEqual([t.isoformat() for t in self.mock_enqueue.call_args.kwargs['schedule_time']], ["2025-12-01T10:00:00+02:00"])
+
+    @freeze_time("2025-12-26 08:00:00")
+    @patch.dict(os.environ, {"EVENT_DRIVEN_TRANSITIONS": "true"})
+    def test_weekly_rebuild_rearms_all_payments_in_one_enqueue(self):
+        due_payment = {**self.payment, 'dueDate': "29/12/2025"}
+        payment_tracking = {self.COMPANY_ID: {'paymentTracking': {
+            'pending': {self.PAYMENT_ID: self.payment, 'later': {**self.payment, 'dueDate': "20/01/2026"}},
+            'due': {'due-payment': due_payment},
+        }}}
+        self.mock_enqueue.side_effect = lambda payloads, **kwargs: [{'status': 'created'} for _ in payloads]
+
+        with patch('functions.main.backfill_due_date_index', return_value=3), \
+             patch('functions.main.get_payment_tracking', return_value=payment_tracking), self.app.app_context():
+            main_module.rebuild_due_date_index(MockEvent())
+
+        self.mock_enqueue.assert_called_once()
+        payloads = self.mock_enqueue.call_args.args[0]
+        schedule_times = self.mock_enqueue.call_args.kwargs['schedule_time']
+        self.assertEqual([(p['payment_id'], p['moment'], t.isoformat()) for p, t in zip(payloads, schedule_times)], [
+            # The passed window start runs now; the due payment only needs its overdue moment
+            (self.PAYMENT_ID, "2025-12-24T00:00:00+02:00", "2025-12-26T10:00:00+02:00"),
+            (self.PAYMENT_ID, "2026-01-01T00:00:00+02:00", "2026-01-01T00:00:00+02:00"),
+            ('later', "2026-01-13T00:00:00+02:00", "2026-01-13T00:00:00+02:00"),
+            ('later', "2026-01-21T00:00:00+02:00", "2026-01-21T00:00:00+02:00"),
+            ('due-payment', "2025-12-30T00:00:00+02:00", "2025-12-30T00:00:00+02:00"),
+        ])
+
+    @patch.dict(os.environ, {"EVENT_DRIVEN_TRANSITIONS": "true"})
+    def test_main_skips_the_daily_scan(self):
+        with patch('functions.main.run_scheduler') as mock_run_scheduler, self.app.app_context():
+            notification_handler(MockEvent())
+        mock_run_scheduler.assert_not_called()
+
+    @patch.dict(os.environ, {"EVENT_DRIVEN_TRANSITIONS": "true", "SCHEDULER_FANOUT_BATCH_SIZE": "2"})
+    def test_main_skips_the_fan_out_too(self):
+        with patch('functions.main.fan_out_companies') as mock_fan_out_companies, self.app.app_context():
+            notification_handler(MockEvent())
+        mock_fan_out_companies.assert_not_called()
+
+class TestBatchedNotifications(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.mock_get_contact_emails = patch('functions.main.get_company_contact_emails', return_value={}).start()
+        self.mock_create_ses_client = patch('functions.main.create_ses_client').start()
+        self.mock_send_tenant_notification = patch('functions.main._send_tenant_notification').start()
+        self.mock_enqueue = patch('functions.main.enqueue_tasks', return_value=[{'status': 'created'}]).start()
+        self.batch = [{'tenant_info': {'tenant_id': tenant_id}, 'due_rentals': [{'company_id': f"company-{tenant_id}"}]} for tenant_id in ('ok', 'flaky', 'bad')]
+        statuses = {'ok': (200, "Email sent successfully."), 'flaky': (500, "Failed to send email."), 'bad': (400, "Missing idNumber for tenant.")}
+        self.mock_send_tenant_notification.side_effect = lambda info, companies, ses_client=None: statuses[info['tenant_info']['tenant_id']]
+
+    def tearDown(self):
+        patch.stopall()
+
+    def _call_worker(self, payload):
+        with self.app.test_request_context(json=payload):
+            from flask import request
+            return send_notification_worker(request)
+
+    def test_batch_shares_lookups_and_retries_only_failed_tenants(self):
+        response = self._call_worker({'batch': self.batch})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['status'] for r in json.loads(response.get_data())], [200, 500, 400])
+        # The lookup runs in the background and the mocked sends never wait on it
+        self.mock_send_tenant_notification.call_args.args[1].result()
+        self.mock_get_contact_emails.assert_called_once()
+        self.assertEqual(list(self.mock_get_contact_emails.call_args.args[0]), ["company-ok", "company-flaky", "company-bad"])
+        self.mock_create_ses_client.assert_called_once()
+        for c in self.mock_send_tenant_notification.call_args_list:
+            self.assertIs(c.kwargs['ses_client'], self.mock_create_ses_client.return_value)
+        # Only the tenant with a retryable failure is sent again; bad payloads are not retried
+        self.mock_enqueue.assert_called_once_with(
+            [{'batch': [self.batch[1]], 'attempt': 2}],
+            target_function="send_notification_worker",
+            task_name_prefix="send-notification-retry-",
+            task_key=ANY,
+        )
+
+    @patch.dict(os.environ, {"BULK_EMAIL_SENDING": "true"})
+    def test_bulk_mode_stores_invoices_then_sends_one_bulk_request(self):
+        batch = [
+            {'tenant_info': {'tenant_id': f"tenant_{i}", 'idNumber': f"id_{i}"}, 'due_rentals': [{'company_id': 'company_1', 'payment_id': f"payment_{i}"}]}
+            for i in range(3)
+        ]
+        batch.append({'tenant_info': {'tenant_id': 'no_id'}, 'due_rentals': []})
+        self.mock_get_contact_emails.return_value = {'company_1': 'landlord@example.com'}
+        mock_store_invoice = patch('functions.main._store_invoice', side_effect=lambda path, info: info['tenant_info']['tenant_id'] != 'tenant_1').start()
+        mock_send_bulk = patch('functions.main.send_bulk_tenant_summary_emails', side_effect=lambda reminders, env, client: [True] * len(reminders)).start()
+
+        response = self._call_worker({'batch': batch})
+
+        self.assertEqual([r['status'] for r in json.loads(response.get_data())], [200, 500, 200, 400])
+        self.assertEqual(mock_store_invoice.call_count, 3)
+        self.mock_send_tenant_notification.assert_not_called()
+        reminders = mock_send_bulk.call_args.args[0]
+        self.assertEqual([r['tenant_consolidated_info']['tenant_info']['tenant_id'] for r in reminders], ['tenant_0', 'tenant_2'])
+        self.assertEqual(reminders[0]['cc_recipients'], ['landlord@example.com'])
+        self.assertIn("paymentId=payment_0", reminders[0]['invoice_url'])
+
+    def test_batch_gives_up_after_max_attempts(self):
+        response = self._call_worker({'batch': self.batch, 'attempt': 3})
+
+        self.assertEqual(response.status_code, 200)
+        self.mock_enqueue.assert_not_called()
+
+    def test_single_tenant_payload_still_supported(self):
+        response = self._call_worker(self.batch[1])
+
+        self.assertEqual(response.status_code, 500)
+        self.mock_create_ses_client.assert_not_called()
+        self.mock_enqueue.assert_not_called()
+
+class TestInvoiceFastPath(unittest.TestCase):
+    def setUp(self):
+        self.tenant_info = {
+            'tenant_info': {'tenant_id': 'tenant_1', 'name': 'Test Tenant', 'email': 'tenant@example.com', 'idNumber': '12345678'},
+            'due_rentals': [{'dueDate': '31/12/2025', 'rent_amount': 1000, 'property_name': 'Unit 1', 'payment_id': 'payment_1', 'company_id': 'company_1'}],
+        }
+        self.mock_ref = MagicMock()
+        patch('functions.main.db.reference', return_value=self.mock_ref).start()
+        self.mock_create_invoice_pdf = patch('functions.main.create_invoice_pdf', return_value=(b'pdf', 'INV-1')).start()
+        self.mock_upload = patch('functions.main.upload_to_storage', return_value="Tenants/12345678/invoices/INV-1.pdf").start()
+        self.mock_build_email = patch('functions.main.build_tenant_summary_email', return_value={'raw_message': 'email'}).start()
+        self.mock_create_ses_client = patch('functions.main.create_ses_client').start()
+        self.mock_send_email = patch('functions.main.send_raw_email', return_value=True).start()
+
+    def tearDown(self):
+        patch.stopall()
+
+    def test_new_invoice_is_rendered_once_and_stored_with_its_hash(self):
+        self.mock_ref.get.return_value = None
+
+        status, _ = _send_tenant_notification(self.tenant_info, {'company_1': 'landlord@example.com'})
+
+        self.assertEqual(status, 200)
+        self.mock_create_invoice_pdf.assert_called_once_with(self.tenant_info)
+        self.mock_upload.assert_called_once()
+        stored = self.mock_ref.set.call_args.args[0]
+        self.assertEqual(stored['cloudStoragePath'], "Tenants/12345678/invoices/INV-1.pdf")
+        self.assertEqual(len(stored['contentHash']), 64)
+        self.assertEqual(self.mock_build_email.call_args.kwargs['cc_recipients'], ['landlord@example.com'])
+        self.mock_send_email.assert_called_once_with({'raw_message': 'email'}, self.mock_create_ses_client.return_value)
+
+    def test_matching_invoice_skips_render_and_upload(self):
+        self.mock_ref.get.return_value = None
+        _send_tenant_notification(self.tenant_info, {})
+        self.mock_ref.get.return_value = self.mock_ref.set.call_args.args[0]
+        self.mock_create_invoice_pdf.reset_mock()
+        self.mock_upload.reset_mock()
+        self.mock_ref.set.reset_mock()
+
+        status, _ = _send_tenant_notification(copy.deepcopy(self.tenant_info), {})
+
+        self.assertEqual(status, 200)
+        self.mock_create_invoice_pdf.assert_not_called()
+        self.mock_upload.assert_not_called()
+        self.mock_ref.set.assert_not_called()
+        self.assertEqual(self.mock_send_email.call_count, 2)
+
+    def test_changed_amount_renders_a_new_invoice(self):
+        self.mock_ref.get.return_value = None
+        _send_tenant_notification(self.tenant_info, {})
+        self.mock_ref.get.return_value = self.mock_ref.set.call_args.args[0]
+        changed = copy.deepcopy(self.tenant_info)
+        changed['due_rentals'][0]['rent_amount'] = 1200
+
+        _send_tenant_notification(changed, {})
+
+        self.assertEqual(self.mock_create_invoice_pdf.call_count, 2)
+        self.assertNotEqual(self.mock_ref.set.call_args.args[0]['contentHash'], self.mock_ref.get.return_value['contentHash'])
+
+    def test_invoice_email_and_ses_client_are_prepared_concurrently(self):
+        # Each stage waits for the other two; run one after another they would break the barrier
+        barrier = threading.Barrier(3, timeout=5)
+        def stage(result):
+            def run(*args, **kwargs):
+                barrier.wait()
+                return result
+            return run
+        self.mock_ref.get.return_value = None
+        self.mock_upload.side_effect = stage("Tenants/12345678/invoices/INV-1.pdf")
+        self.mock_build_email.side_effect = stage({'raw_message': 'email'})
+        self.mock_create_ses_client.side_effect = stage(MagicMock())
+
+        with self.assertLogs('functions.main', level='INFO') as logs:
+            status, _ = _send_tenant_notification(self.tenant_info, {})
+
+        self.assertEqual(status, 200)
+        self.assertFalse(barrier.broken)
+        timings_log = next(line for line in logs.output if "Notification stages" in line)
+        for stage_name in ('invoice=', 'email=', 'ses_client=', 'send=', 'total='):
+            self.assertIn(stage_name, timings_log)
+
+    def test_email_is_not_sent_when_the_invoice_upload_fails(self):
+        self.mock_ref.get.return_value = None
+        self.mock_upload.return_value = None
+
+        status, _ = _send_tenant_notification(self.tenant_info, {})
+
+        self.assertEqual(status, 500)
+        self.mock_send_email.assert_not_called()
+
+    @patch.dict(os.environ, {"LAZY_INVOICE_GENERATION": "true"})
+    def test_lazy_mode_stores_only_the_inputs(self):
+        self.mock_ref.get.return_value = None
+
+        status, _ = _send_tenant_notification(self.tenant_info, {})
+
+        self.assertEqual(status, 200)
+        self.mock_create_invoice_pdf.assert_not_called()
+        self.mock_upload.assert_not_called()
+        stored = self.mock_ref.set.call_args.args[0]
+        self.assertEqual(stored['invoiceInputs'], self.tenant_info)
+        self.assertNotIn('cloudStoragePath', stored)
+        self.mock_send_email.assert_called_once()
+
+    def test_get_invoice_renders_lazy_invoice_on_first_request(self):
+        self.mock_ref.get.return_value = {'invoiceInputs': self.tenant_info, 'contentHash': 'abc'}
+        mock_bucket = patch('functions.main.storage.bucket').start()
+
+        with Flask(__name__).test_request_context(query_string={'companyId': 'company_1', 'tenantId': 'tenant_1', 'paymentId': 'payment_1'}):
+            from flask import request
+            response = get_invoice(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_data(), b'pdf')
+        self.mock_create_invoice_pdf.assert_called_once_with(self.tenant_info)
+        self.mock_ref.set.assert_called_once_with({
+            'cloudStoragePath': "Tenants/12345678/invoices/INV-1.pdf",
+            'invoice_number': 'INV-1',
+            'contentHash': 'abc',
+            'created_at': ANY,
+        })
+        mock_bucket.assert_not_called()
+
+class TestEmailOutbox(unittest.TestCase):
+    def setUp(self):
+        self.tenant_info = {
+            'tenant_info': {'tenant_id': 'tenant_1', 'name': 'Test Tenant', 'email': 'tenant@example.com', 'idNumber': '12345678'},
+            'due_rentals': [{'dueDate': '31/12/2025', 'rent_amount': 1000, 'property_name': 'Unit 1', 'payment_id': 'payment_1', 'company_id': 'company_1'}],
+        }
+        patch.dict(os.environ, {'EMAIL_OUTBOX': 'true'}).start()
+        patch('functions.main.db.reference').start()
+        patch('functions.main.create_invoice_pdf', return_value=(b'pdf', 'INV-1')).start()
+        patch('functions.main.upload_to_storage', return_value="Tenants/12345678/invoices/INV-1.pdf").start()
+        patch('functions.main.build_tenant_summary_email', return_value={'raw_message': b'email'}).start()
+        self.mock_create_ses_client = patch('functions.main.create_ses_client').start()
+        self.mock_send_email = patch('functions.main.send_raw_email', return_value=True).start()
+        self.mock_spool = patch('functions.main.spool_email', return_value='message_1').start()
+        self.mock_enqueue = patch('functions.main.enqueue_tasks', return_value=[{'status': 'created'}]).start()
+        main_module._kicked_outbox_window = None
+
+    def tearDown(self):
+        patch.stopall()
+
+    @freeze_time("2025-12-24 10:00:03")
+    def test_reminder_is_spooled_and_a_drain_is_scheduled(self):
+        self.assertEqual(_send_tenant_notification(self.tenant_info, {}), (200, "Email sent successfully."))
+        self.assertEqual(_send_tenant_notification(self.tenant_info, {}), (200, "Email sent successfully."))
+
+        self.assertEqual(self.mock_spool.call_args.args, ({'raw_message': b'email'}, "2025-12-24:tenant_1:payment_1"))
+        self.mock_create_ses_client.assert_not_called()
+        self.mock_send_email.assert_not_called()
+        # Both spools fall in the same window, so they share one drain task at its end
+        self.mock_enqueue.assert_called_once()
+        self.assertEqual(self.mock_enqueue.call_args.kwargs['target_function'], "drain_outbox_worker")
+        self.assertEqual(self.mock_enqueue.call_args.kwargs['schedule_time'].isoformat(), "2025-12-24T10:00:10+00:00")
+
+    def test_failed_spool_is_retryable(self):
+        self.mock_spool.return_value = None
+
+        self.assertEqual(_send_tenant_notification(self.tenant_info, {}), (500, "Failed to send email."))
+        self.mock_enqueue.assert_not_called()
+
+    def test_drain_worker_enqueues_another_drain_when_out_of_time(self):
+        mock_drain = patch('functions.main.drain_outbox', return_value={'sent': 100, 'retried': 0, 'failed': 0, 'remaining': True}).start()
+
+        with Flask(__name__).test_request_context(json={'window': 1}):
+            from flask import request
+            response = drain_outbox_worker(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.get_data())['sent'], 100)
+        self.assertIs(mock_drain.call_args.args[0], self.mock_create_ses_client.return_value)
+        self.mock_enqueue.assert_called_once()
+
 if __name__ == '__main__':
     unittest.main()
 
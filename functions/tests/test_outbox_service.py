@@ -0,0 +1,125 @@
+import unittest
+import sys
+import os
+import base64
+import shutil
+import tempfile
+from unittest.mock import patch, MagicMock
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import functions.services.outbox_service as outbox_service
+from functions.services.outbox_service import spool_email, drain_outbox, LocalFileOutbox, OUTBOX_MAX_ATTEMPTS
+from functions.constants import OUTBOX_PATH
+from functions.tests.fake_rtdb import FakeRealtimeDatabase
+
+def build_message(recipient_email: str) -> dict:
+    return {
+        'source': "noreply@example.com",
+        'recipient_email': recipient_email,
+        'cc_recipients': [],
+        'destinations': [recipient_email],
+        'raw_message': f"Subject: Reminder\n\nHi {recipient_email}".encode(),
+    }
+
+class TestRealtimeDatabaseOutbox(unittest.TestCase):
+    def setUp(self):
+        self.database = FakeRealtimeDatabase()
+        patch.object(outbox_service.db, 'reference', side_effect=self.database.reference).start()
+        patch.dict(os.environ, {'OUTBOX_BACKEND': 'rtdb'}).start()
+        outbox_service._outboxes.clear()
+        self.mock_send = patch.object(outbox_service, 'send_raw_email', return_value=True).start()
+
+    def tearDown(self):
+        patch.stopall()
+        outbox_service._outboxes.clear()
+
+    def outbox(self, node: str) -> dict:
+        return self.database.reference(f"{OUTBOX_PATH}/{node}").get() or {}
+
+    def test_drain_sends_spooled_emails_and_records_delivery(self):
+        message_ids = [spool_email(build_message(f"tenant{i}@example.com")) for i in range(5)]
+        self.assertEqual(len(self.outbox('pending')), 5)
+        self.mock_send.assert_not_called()
+
+        ses_client = MagicMock()
+        summary = drain_outbox(ses_client, batch_size=2)
+
+        self.assertEqual(summary, {'sent': 5, 'retried': 0, 'failed': 0, 'remaining': False})
+        self.assertEqual(self.mock_send.call_count, 5)
+        self.assertTrue(all(c.args[1] is ses_client for c in self.mock_send.call_args_list))
+        sent_message = self.mock_send.call_args_list[0].args[0]
+        self.assertIsInstance(sent_message['raw_message'], bytes)
+        self.assertEqual(self.outbox('pending'), {})
+        sent = self.outbox('sent')
+        self.assertEqual(set(sent), set(message_ids))
+        self.assertEqual(sent[message_ids[0]]['attempts'], 1)
+        self.assertIn('sentAt', sent[message_ids[0]])
+        self.assertNotIn('rawMessage', sent[message_ids[0]])
+
+    def test_keyed_email_is_not_spooled_again_once_sent(self):
+        message_id = spool_email(build_message("tenant@example.com"), key="2025-12-24:tenant1:payment1")
+        self.assertEqual(spool_email(build_message("tenant@example.com"), key="2025-12-24:tenant1:payment1"), message_id)
+        self.assertEqual(len(self.outbox('pending')), 1)
+
+        drain_outbox(MagicMock())
+        spool_email(build_message("tenant@example.com"), key="2025-12-24:tenant1:payment1")
+
+        self.assertEqual(self.outbox('pending'), {})
+        self.assertEqual(self.mock_send.call_count, 1)
+
+    def test_failed_sends_are_retried_by_later_drains_then_parked(self):
+        failing_id = spool_email(build_message("bounce@example.com"))
+        spool_email(build_message("tenant@example.com"))
+        self.mock_send.side_effect = lambda message, ses_client: message['recipient_email'] != "bounce@example.com"
+
+        summary = drain_outbox(MagicMock())
+
+        self.assertEqual(summary, {'sent': 1, 'retried': 1, 'failed': 0, 'remaining': False})
+        pending = self.outbox('pending')
+        self.assertEqual(list(pending), [failing_id])
+        self.assertEqual(pending[failing_id]['attempts'], 1)
+        self.assertEqual(base64.b64decode(pending[failing_id]['rawMessage']), b"Subject: Reminder\n\nHi bounce@example.com")
+
+        for _ in range(OUTBOX_MAX_ATTEMPTS - 1):
+            drain_outbox(MagicMock())
+
+        self.assertEqual(self.outbox('pending'), {})
+        self.assertEqual(self.outbox('failed')[failing_id]['attempts'], OUTBOX_MAX_ATTEMPTS)
+        self.assertEqual(self.mock_send.call_count, OUTBOX_MAX_ATTEMPTS + 1)
+
+    def test_drain_stops_at_the_deadline(self):
+        spool_email(build_message("tenant@example.com"))
+
+        summary = drain_outbox(MagicMock(), deadline=0)
+
+        self.assertEqual(summary, {'sent': 0, 'retried': 0, 'failed': 0, 'remaining': True})
+        self.mock_send.assert_not_called()
+
+class TestLocalFileOutbox(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        patch.dict(os.environ, {'OUTBOX_BACKEND': 'local', 'OUTBOX_LOCAL_DIR': self.directory}).start()
+        outbox_service._outboxes.clear()
+        self.mock_send = patch.object(outbox_service, 'send_raw_email', return_value=True).start()
+
+    def tearDown(self):
+        patch.stopall()
+        outbox_service._outboxes.clear()
+        shutil.rmtree(self.directory)
+
+    def test_spool_and_drain_through_files(self):
+        message_id = spool_email(build_message("tenant@example.com"), key="receipt-1")
+        self.assertIsInstance(outbox_service.get_outbox(), LocalFileOutbox)
+        self.assertEqual(os.listdir(os.path.join(self.directory, 'pending')), [f"{message_id}.json"])
+
+        summary = drain_outbox(MagicMock())
+
+        self.assertEqual(summary['sent'], 1)
+        self.assertEqual(os.listdir(os.path.join(self.directory, 'pending')), [])
+        self.assertEqual(os.listdir(os.path.join(self.directory, 'sent')), [f"{message_id}.json"])
+        self.assertEqual(self.mock_send.call_args.args[0]['raw_message'], b"Subject: Reminder\n\nHi tenant@example.com")
+
+if __name__ == '__main__':
+    unittest.main()
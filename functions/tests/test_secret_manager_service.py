@@ -0,0 +1,85 @@
+import unittest
+import sys
+import os
+import threading
+import time
+from unittest.mock import patch, MagicMock
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import functions.services.secret_manager_service as secret_manager_service
+from functions.services.secret_manager_service import access_secret_version, prefetch_secrets, clear_secret_cache
+
+class TestSecretCache(unittest.TestCase):
+    def setUp(self):
+        clear_secret_cache()
+        self.mock_client = patch.object(secret_manager_service, 'secret_client').start()
+        self.calls = []
+        def access(request):
+            self.calls.append(request['name'])
+            time.sleep(0.05)
+            response = MagicMock()
+            response.payload.data = f"value-{len(self.calls)}".encode()
+            return response
+        self.mock_client.access_secret_version.side_effect = access
+        self.now = 1000.0
+        self.mock_time = patch.object(secret_manager_service, 'time').start()
+        self.mock_time.monotonic.side_effect = lambda: self.now
+
+    def tearDown(self):
+        patch.stopall()
+        clear_secret_cache()
+
+    def test_warm_reads_come_from_the_cache(self):
+        self.assertEqual(access_secret_version("AWS_ACCESS_KEY_ID"), "value-1")
+        self.assertEqual(access_secret_version("AWS_ACCESS_KEY_ID"), "value-1")
+
+        self.assertEqual(len(self.calls), 1)
+
+    def test_concurrent_callers_share_one_request(self):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(access_secret_version("AWS_SECRET_ACCESS_KEY"))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ["value-1"] * 8)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_expired_secret_is_read_again(self):
+        access_secret_version("AWS_ACCESS_KEY_ID")
+        self.now += secret_manager_service.SECRET_CACHE_TTL_SECONDS
+
+        self.assertEqual(access_secret_version("AWS_ACCESS_KEY_ID"), "value-2")
+
+    def test_secret_near_expiry_is_refreshed_in_the_background(self):
+        access_secret_version("AWS_ACCESS_KEY_ID")
+        self.now += secret_manager_service.SECRET_CACHE_TTL_SECONDS - secret_manager_service.SECRET_REFRESH_AHEAD_SECONDS + 1
+
+        # The caller gets the cached value straight away
+        self.assertEqual(access_secret_version("AWS_ACCESS_KEY_ID"), "value-1")
+        for _ in range(100):
+            if ("AWS_ACCESS_KEY_ID", "latest") not in secret_manager_service._secret_fetches:
+                break
+            threading.Event().wait(0.01)
+        self.now += secret_manager_service.SECRET_REFRESH_AHEAD_SECONDS
+        self.assertEqual(access_secret_version("AWS_ACCESS_KEY_ID"), "value-2")
+        self.assertEqual(len(self.calls), 2)
+
+    def test_failed_read_is_not_cached(self):
+        self.mock_client.access_secret_version.side_effect = [Exception("unavailable"), MagicMock(**{'payload.data': b"value"})]
+
+        self.assertIsNone(access_secret_version("AWS_ACCESS_KEY_ID"))
+        self.assertEqual(access_secret_version("AWS_ACCESS_KEY_ID"), "value")
+
+    def test_prefetch_loads_the_email_secrets(self):
+        prefetch_secrets()
+        for secret_id in secret_manager_service.PREFETCH_SECRET_IDS:
+            access_secret_version(secret_id)
+
+        self.assertEqual(sorted(name.split('/')[3] for name in self.calls), ["AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"])
+
+if __name__ == '__main__':
+    unittest.main()
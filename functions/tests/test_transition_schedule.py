@@ -0,0 +1,57 @@
+import unittest
+import sys
+import os
+from datetime import datetime, timedelta
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from functions.logic.transition_schedule import (
+    get_transition_moments, plan_transition_tasks, SCHEDULER_TIMEZONE, MAX_SCHEDULE_AHEAD,
+)
+
+class TestTransitionSchedule(unittest.TestCase):
+    def test_moments_are_local_midnights_of_the_window_start_and_the_day_after_due(self):
+        moments = get_transition_moments({'dueDate': '31/12/2025'}, 7)
+        self.assertEqual(moments, [
+            datetime(2025, 12, 24, tzinfo=SCHEDULER_TIMEZONE),
+            datetime(2026, 1, 1, tzinfo=SCHEDULER_TIMEZONE),
+        ])
+        # Midnight in Johannesburg is 22:00 UTC the previous day
+        self.assertEqual(moments[0].utcoffset(), timedelta(hours=2))
+
+    def test_unparseable_due_date_has_no_moments(self):
+        self.assertEqual(get_transition_moments({'dueDate': '31/02/2025'}, 7), [])
+        self.assertEqual(get_transition_moments({}, 7), [])
+
+    def test_only_the_latest_passed_moment_runs_now(self):
+        now = datetime(2025, 12, 26, 10, 0, tzinfo=SCHEDULER_TIMEZONE)
+        tasks = plan_transition_tasks({'dueDate': '31/12/2025'}, 7, now)
+        self.assertEqual(tasks, [
+            {'moment': datetime(2025, 12, 24, tzinfo=SCHEDULER_TIMEZONE), 'schedule_time': now, 'rearm': False},
+            {'moment': datetime(2026, 1, 1, tzinfo=SCHEDULER_TIMEZONE), 'schedule_time': datetime(2026, 1, 1, tzinfo=SCHEDULER_TIMEZONE), 'rearm': False},
+        ])
+
+        overdue_tasks = plan_transition_tasks({'dueDate': '20/12/2025'}, 7, now)
+        self.assertEqual(overdue_tasks, [{'moment': datetime(2025, 12, 21, tzinfo=SCHEDULER_TIMEZONE), 'schedule_time': now, 'rearm': False}])
+
+    def test_due_payments_only_need_the_overdue_moment(self):
+        now = datetime(2025, 12, 26, 10, 0, tzinfo=SCHEDULER_TIMEZONE)
+        tasks = plan_transition_tasks({'dueDate': '31/12/2025'}, 7, now, tracking_node='due')
+        self.assertEqual(tasks, [
+            {'moment': datetime(2026, 1, 1, tzinfo=SCHEDULER_TIMEZONE), 'schedule_time': datetime(2026, 1, 1, tzinfo=SCHEDULER_TIMEZONE), 'rearm': False},
+        ])
+
+    def test_moments_beyond_the_horizon_are_replaced_by_one_rearm_task(self):
+        now = datetime(2025, 12, 1, 10, 0, tzinfo=SCHEDULER_TIMEZONE)
+        tasks = plan_transition_tasks({'dueDate': '05/01/2026'}, 7, now)
+        self.assertEqual(tasks, [
+            {'moment': datetime(2025, 12, 29, tzinfo=SCHEDULER_TIMEZONE), 'schedule_time': datetime(2025, 12, 29, tzinfo=SCHEDULER_TIMEZONE), 'rearm': False},
+            {'moment': datetime(2026, 1, 6, tzinfo=SCHEDULER_TIMEZONE), 'schedule_time': now + MAX_SCHEDULE_AHEAD, 'rearm': True},
+        ])
+
+        far_tasks = plan_transition_tasks({'dueDate': '01/06/2026'}, 7, now)
+        self.assertEqual(far_tasks, [{'moment': datetime(2026, 5, 25, tzinfo=SCHEDULER_TIMEZONE), 'schedule_time': now + MAX_SCHEDULE_AHEAD, 'rearm': True}])
+
+if __name__ == '__main__':
+    unittest.main()
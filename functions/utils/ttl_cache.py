@@ -0,0 +1,46 @@
+import threading
+import time
+
+class TTLCache:
+    """
+    A small thread-safe cache whose entries expire `ttl_seconds` after they were stored.
+    Kept at module level, it lives as long as the warm function instance and is shared by its invocations.
+    Entries may hold None, so lookups report hits explicitly instead of relying on a sentinel value.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, keys) -> tuple[dict, list]:
+        """
+        Returns (hits, misses): the fresh cached values of `keys` as a dict, and the keys that have none.
+        """
+        now = time.monotonic()
+        hits, misses = {}, []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] > now:
+                    hits[key] = entry[0]
+                else:
+                    misses.append(key)
+        return hits, misses
+
+    def set_many(self, values: dict) -> None:
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            if len(self._entries) + len(values) > self.max_entries:
+                # Drop expired entries first, then the oldest ones if that is not enough
+                self._entries = {key: entry for key, entry in self._entries.items() if entry[1] > time.monotonic()}
+                while self._entries and len(self._entries) + len(values) > self.max_entries:
+                    del self._entries[next(iter(self._entries))]
+            for key, value in values.items():
+                self._entries.pop(key, None)
+                self._entries[key] = (value, expires_at)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()